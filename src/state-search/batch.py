@@ -0,0 +1,416 @@
+import argparse
+import contextlib
+import hashlib
+import json
+import multiprocessing
+import os
+import signal
+import sys
+import time as clock
+
+from batch_expansion import BatchExpander
+from cafe import TEMPLATE_CACHE_SIZE
+from checkpoint import SearchCheckpoint
+from external_memory import external_A_star
+from heuristics import HEURISTICS, get_heuristic
+from instrumentation import SearchMonitor
+from layouts import read_layout
+from multi_robot import MULTI_HEURISTICS, MultiCafe, get_multi_heuristic
+from parallel_search import HDA_star
+from scenarios import build_instance, read_scenarios
+from search_algorithm import (
+  BFS,
+  GBFS,
+  UCS,
+  A_star,
+  ARA_star,
+  IDA_star,
+  SMA_star,
+  batch_A_star,
+  canonical_state,
+)
+
+ALGORITHMS = (
+  "astar",
+  "greedy",
+  "ucs",
+  "bfs",
+  "idastar",
+  "smastar",
+  "arastar",
+  "batchastar",
+  "externalastar",
+  "hdastar",
+)
+
+# Visited table keys: everything but the clock, or the time-shift invariant `Cafe.relative_state`
+KEYINGS = ("absolute", "relative")
+
+# States expanded at once by batchastar, unless --batch-size says otherwise
+DEFAULT_BATCH_SIZE = 256
+
+
+class SolveTimeout(Exception):
+  """Raised inside a worker when a scenario runs out of time."""
+
+
+def raise_timeout(signum, frame):
+  raise SolveTimeout
+
+
+def init_worker():
+  """Lets the parent handle Ctrl+C and arms the per-scenario alarm handler."""
+
+  signal.signal(signal.SIGINT, signal.SIG_IGN)
+  if hasattr(signal, "SIGALRM"):
+    signal.signal(signal.SIGALRM, raise_timeout)
+
+
+def search(options, cafe, initial_state, stats, monitor=None, checkpoint=None):
+  """Runs the chosen search algorithm, returns (total time, visited, path).
+
+  With a `SearchMonitor`, the successor generation and the heuristic are timed and the counters
+  sampled while searching. A `SearchCheckpoint` is used by A* and UCS, which resume from it.
+  """
+
+  algorithm = options["algorithm"]
+  progress = None
+
+  # A multi-robot café merges states that only differ by a permutation of identical robots
+  canonical = getattr(cafe, "canonical_state", canonical_state)
+  if options["keying"] == "relative":
+    if isinstance(cafe, MultiCafe):
+      raise ValueError("relative keying only applies to single-robot cafés")
+    canonical = cafe.relative_state
+
+  if monitor is not None:
+    monitor.attach(cafe)
+    progress = monitor.progress
+
+  if algorithm == "ucs":
+    return UCS(
+      initial_state,
+      cafe.goal,
+      cafe.get_next_states,
+      stats,
+      canonical_state=canonical,
+      progress=progress,
+      checkpoint=checkpoint,
+    )
+  if algorithm == "bfs":
+    return BFS(
+      initial_state,
+      cafe.goal,
+      cafe.get_next_states,
+      stats,
+      canonical_state=canonical,
+      progress=progress,
+    )
+
+  if isinstance(cafe, MultiCafe):
+    # Single-robot heuristics have no multi-robot version, the multi-robot bound stands in
+    name = options["heuristic"] if options["heuristic"] in MULTI_HEURISTICS else "critical_path"
+    heuristic = get_multi_heuristic(name, cafe)
+  else:
+    heuristic = get_heuristic(options["heuristic"], cafe, initial_state)
+  if monitor is not None:
+    heuristic = monitor.wrap_heuristic(heuristic)
+
+  # Block expansion with NumPy, the critical path is then computed on the arrays too
+  if algorithm == "batchastar":
+    if isinstance(cafe, MultiCafe):
+      raise ValueError("batchastar only expands single-robot cafés")
+    expander = BatchExpander(cafe, None if options["heuristic"] == "critical_path" else heuristic)
+    return batch_A_star(
+      initial_state,
+      cafe.goal,
+      expander,
+      heuristic,
+      stats,
+      canonical_state=canonical,
+      batch_size=options["batch_size"],
+      progress=progress,
+    )
+
+  # Disk-backed mode: frontier buckets, closed table and search tree in `disk_dir`
+  if algorithm == "externalastar":
+    return external_A_star(
+      initial_state,
+      cafe.goal,
+      cafe.get_next_states,
+      heuristic,
+      stats,
+      canonical_state=canonical,
+      directory=options["disk_dir"],
+      progress=progress,
+    )
+
+  if algorithm == "greedy":
+    return GBFS(
+      initial_state,
+      cafe.goal,
+      cafe.get_next_states,
+      heuristic,
+      stats,
+      canonical_state=canonical,
+      progress=progress,
+    )
+
+  # Parallel mode: states hashed to `search_workers` processes, all CPUs by default
+  if algorithm == "hdastar":
+    return HDA_star(
+      initial_state,
+      cafe.goal,
+      cafe.get_next_states,
+      heuristic,
+      n_workers=options["search_workers"],
+      stats=stats,
+      canonical_state=canonical,
+    )
+
+  # Anytime mode: the best plan found within the budget, its bound is in the stats
+  if algorithm == "arastar":
+    return ARA_star(
+      initial_state,
+      cafe.goal,
+      cafe.get_next_states,
+      heuristic,
+      stats,
+      canonical_state=canonical,
+      time_budget=options["budget"],
+    )
+
+  # Memory-bounded modes: `memory` caps the transposition table or the nodes in memory
+  if algorithm == "idastar":
+    return IDA_star(
+      initial_state,
+      cafe.goal,
+      cafe.get_next_states,
+      heuristic,
+      stats,
+      canonical_state=canonical,
+      table_size=options["memory"],
+      progress=progress,
+    )
+  if algorithm == "smastar":
+    return SMA_star(
+      initial_state,
+      cafe.goal,
+      cafe.get_next_states,
+      heuristic,
+      stats,
+      canonical_state=canonical,
+      max_nodes=options["memory"],
+      progress=progress,
+    )
+
+  return A_star(
+    initial_state,
+    cafe.goal,
+    cafe.get_next_states,
+    heuristic,
+    stats,
+    canonical_state=canonical,
+    weight=options["weight"],
+    progress=progress,
+    checkpoint=checkpoint,
+  )
+
+
+def scenario_name(scenario):
+  """Returns the file name stem of a scenario: its id, or a hash of its content without one."""
+
+  name = scenario.get("id")
+  if name is None:
+    name = hashlib.sha256(json.dumps(scenario, sort_keys=True).encode()).hexdigest()[:16]
+
+  return name
+
+
+def checkpoint_of(scenario, options):
+  """Returns the checkpoint of a scenario in the checkpoint directory, named after its id."""
+
+  if not options["checkpoint_dir"]:
+    return None
+
+  name = scenario_name(scenario)
+
+  return SearchCheckpoint(
+    os.path.join(options["checkpoint_dir"], f"{name}.ckpt"), options["checkpoint_interval"]
+  )
+
+
+def solve_scenario(job):
+  """Solves one scenario in a worker and returns its result record."""
+
+  scenario, options = job
+  result = {"id": scenario.get("id"), "status": "error"}
+  stats = {}
+  monitor = SearchMonitor() if options["profile"] or options["stats_out"] else None
+  time_start = clock.perf_counter()
+
+  # 1. Arm the alarm, it interrupts the search wherever it is ---------------------------
+  timeout = options["timeout"]
+  if timeout and hasattr(signal, "setitimer"):
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+
+  try:
+    cafe, initial_state = build_instance(
+      scenario,
+      options["partial_order_reduction"],
+      options["macro_actions"],
+      options["template_cache_size"],
+    )
+    total_time, visited, path = search(
+      options, cafe, initial_state, stats, monitor, checkpoint_of(scenario, options)
+    )
+
+    # 2. Record the plan with readable steps ------------------------------------------
+    if path is None:
+      result["status"] = "unsolvable"
+    else:
+      if options["macro_actions"]:
+        path = cafe.expand_macros(path)
+      result.update(
+        status="solved",
+        cost=total_time,
+        plan=[cafe.describe_step(step) for step in path],
+      )
+  except SolveTimeout:
+    result["status"] = "timeout"
+  except Exception as error:
+    result["error"] = f"{type(error).__name__}: {error}"
+  finally:
+    if timeout and hasattr(signal, "setitimer"):
+      signal.setitimer(signal.ITIMER_REAL, 0)
+
+  result.update(stats)
+  result["elapsed"] = round(clock.perf_counter() - time_start, 6)
+
+  if monitor is not None:
+    monitor.finish(stats)
+    if options["profile"]:
+      result["profile"] = monitor.report()
+    if options["stats_out"]:
+      os.makedirs(options["stats_out"], exist_ok=True)
+      name = f"{scenario_name(scenario)}.{options['stats_format']}"
+      monitor.export(os.path.join(options["stats_out"], name))
+  return result
+
+
+def main():
+  parser = argparse.ArgumentParser(
+    description="Solves a batch of café scenarios in parallel and streams the results as JSONL."
+  )
+  parser.add_argument("source", help="directory of .json/.jsonl files, a file, or - for stdin")
+  parser.add_argument("--out", default="-", help="JSONL output file, stdout by default")
+  parser.add_argument("--workers", type=int, default=None, help="worker processes, all CPUs")
+  parser.add_argument("--timeout", type=float, default=60.0, help="seconds per scenario, 0 = none")
+  parser.add_argument("--algorithm", choices=ALGORITHMS, default="astar")
+  parser.add_argument(
+    "--heuristic",
+    choices=sorted(HEURISTICS),
+    default="max",
+    help="multi-robot cafés use critical_path for the single-robot heuristics",
+  )
+  parser.add_argument("--weight", type=float, default=1.0, help="A* heuristic weight")
+  parser.add_argument("--budget", type=float, default=None, help="ARA* time budget [s]")
+  parser.add_argument(
+    "--memory", type=int, default=1_000_000, help="IDA* table size or SMA* node cap"
+  )
+  parser.add_argument(
+    "--batch-size",
+    type=int,
+    default=DEFAULT_BATCH_SIZE,
+    help="states expanded at once by batchastar",
+  )
+  parser.add_argument(
+    "--search-workers", type=int, default=None, help="processes of one hdastar search, all CPUs"
+  )
+  parser.add_argument("--disk-dir", help="directory of the externalastar files, the temp dir")
+  parser.add_argument(
+    "--checkpoint-dir", help="resumable A*/UCS runs, one checkpoint file per scenario"
+  )
+  parser.add_argument(
+    "--checkpoint-interval", type=float, default=60.0, help="seconds between checkpoints"
+  )
+  parser.add_argument(
+    "--keying", choices=KEYINGS, default="absolute", help="visited keys, relative = time-shifted"
+  )
+  parser.add_argument("--layout", help="JSON layout file for scenarios without their own layout")
+  parser.add_argument("--por", action="store_true", help="enable partial-order reduction")
+  parser.add_argument(
+    "--macros", action="store_true", help="waiter delivery runs as single actions"
+  )
+  parser.add_argument(
+    "--template-cache",
+    type=int,
+    default=TEMPLATE_CACHE_SIZE,
+    help="action templates cached per robot, 0 = none",
+  )
+  parser.add_argument(
+    "--profile",
+    action="store_true",
+    help="add phase timings, template cache hit rates and progress samples to results",
+  )
+  parser.add_argument(
+    "--stats-out", help="directory of the search reports, one file per scenario named after its id"
+  )
+  parser.add_argument(
+    "--stats-format",
+    choices=("json", "csv"),
+    default="json",
+    help="full report, or the progress samples only",
+  )
+  args = parser.parse_args()
+
+  options = {
+    "algorithm": args.algorithm,
+    "heuristic": args.heuristic,
+    "weight": args.weight,
+    "memory": args.memory,
+    "budget": args.budget,
+    "batch_size": args.batch_size,
+    "disk_dir": args.disk_dir,
+    "search_workers": args.search_workers,
+    "keying": args.keying,
+    "checkpoint_dir": args.checkpoint_dir,
+    "checkpoint_interval": args.checkpoint_interval,
+    "timeout": args.timeout,
+    "partial_order_reduction": args.por,
+    "macro_actions": args.macros,
+    "profile": args.profile,
+    "stats_out": args.stats_out,
+    "stats_format": args.stats_format,
+    "template_cache_size": args.template_cache,
+  }
+
+  counts = {}
+
+  # Scenarios are read lazily and results are written as soon as each one finishes
+  defaults = {"layout": read_layout(args.layout)} if args.layout else {}
+  jobs = (({**defaults, **scenario}, options) for scenario in read_scenarios(args.source))
+  output = contextlib.nullcontext(sys.stdout) if args.out == "-" else open(args.out, "w")  # noqa: SIM115
+
+  # HDA* starts its own processes, which the daemonic pool workers cannot: one scenario at a time
+  if args.algorithm == "hdastar":
+    if hasattr(signal, "SIGALRM"):
+      signal.signal(signal.SIGALRM, raise_timeout)
+    pool = contextlib.nullcontext()
+    results = map(solve_scenario, jobs)
+  else:
+    pool = multiprocessing.Pool(args.workers, initializer=init_worker)
+    results = pool.imap_unordered(solve_scenario, jobs)
+
+  with output as out, pool:
+    for result in results:
+      out.write(json.dumps(result) + "\n")
+      out.flush()
+      counts[result["status"]] = counts.get(result["status"], 0) + 1
+
+  summary = ", ".join(f"{status}: {count}" for status, count in sorted(counts.items()))
+  print(f"Scenarios: {sum(counts.values())} ({summary})", file=sys.stderr)
+
+
+if __name__ == "__main__":
+  main()
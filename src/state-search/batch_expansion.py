@@ -0,0 +1,384 @@
+from cafe import (
+  CLEANING,
+  DELIVERING,
+  IDLE,
+  MOVING,
+  PICKING_UP,
+  RETURN_TRAY,
+  TAKE_TRAY,
+  TRAY_CAPACITY,
+)
+from deadlines import DeadlineCafe
+from heuristics import CriticalPath
+
+try:
+  import numpy as np
+except ImportError:  # `BatchExpander` needs NumPy, the rest of the search does not
+  np = None
+
+# Locations that fit the int64 bitmasks of the vectorized critical path, sign bit excluded
+MASK_LOCATIONS = 63
+
+
+class BatchExpander:
+  """Vectorized `Cafe.get_next_states` over blocks of packed states, for `batch_A_star`.
+
+  The keys are wider than 64 bits, so a block of keys is unpacked once into field arrays (codes,
+  location, tray, dirty tables and one count matrix per drink field) through their bytes. The
+  events, the applicable tasks of both robots, the finish times and the heuristic of every
+  successor are then computed with array operations, and only the successor keys are packed back
+  into integers. `heuristic` is any state heuristic, called once per successor; by default the
+  critical path bound is computed on the arrays, unless the layout has more than `MASK_LOCATIONS`
+  locations: their bitmasks would overflow, so `CriticalPath` is called per successor instead.
+  Partial-order reduction, hot drink deadlines and macro-actions are not supported.
+  """
+
+  def __init__(self, cafe, heuristic=None):
+    if np is None:
+      raise ImportError("BatchExpander needs NumPy")
+    if cafe.partial_order_reduction:
+      raise ValueError("BatchExpander does not support partial-order reduction")
+    if isinstance(cafe, DeadlineCafe):
+      raise ValueError("BatchExpander does not support hot drink deadlines")
+    if cafe.macro_actions:
+      raise ValueError("BatchExpander does not support macro-actions")
+
+    self.cafe = cafe
+    self.heuristic = heuristic
+
+    n_locations = len(cafe.locations)
+    n_drinks = len(cafe.drinks)
+
+    # Static data as arrays ------------------------------------------------------------------------
+    self.n_bytes = (cafe.key_bits + 7) // 8
+    self.location_range = np.arange(n_locations)
+    self.count_weights = 1 << np.arange(cafe.count_bits)
+    self.drink_location = np.array(cafe.drink_location)
+    self.make_cost = np.array(cafe.make_cost)
+    self.clean_cost = np.array(cafe.clean_cost)
+    self.travel_time = np.array(cafe.travel_time)
+    self.b_duration = np.array([0.0, *cafe.make_cost])
+
+    self.w_operation = np.array([operation for operation, _ in cafe.w_actions])
+    self.w_argument = np.array([argument or 0 for _, argument in cafe.w_actions])
+
+    # Code columns of each waiter operation, in the order of their argument
+    self.move_codes = np.array(cafe.move_codes)
+    self.pickup_codes = np.array([cafe.w_codes[(PICKING_UP, d)] for d in range(n_drinks)])
+    self.deliver_codes = np.array([cafe.w_codes[(DELIVERING, d)] for d in range(n_drinks)])
+    self.clean_codes = np.array([cafe.w_codes[(CLEANING, i)] for i in range(n_locations)])
+
+    # Drinks at each location, to mark the locations of carried drinks
+    self.drinks_at = self.drink_location[None, :] == self.location_range[:, None]
+
+    # Critical path bound, its spanning trees are computed and cached when a batch first needs them
+    self.critical_path_bound = CriticalPath(cafe)
+    self.tail = np.array(self.critical_path_bound.tail)
+    if heuristic is None and n_locations > MASK_LOCATIONS:
+      self.heuristic = self.critical_path_bound
+
+  # Encoding ---------------------------------------------------------------------------------------
+  def unpack(self, keys):
+    """Returns the (n, key_bits) bit matrix of a list of keys."""
+
+    n_bytes = self.n_bytes
+    buffer = b"".join(key.to_bytes(n_bytes, "little") for key in keys)
+    octets = np.frombuffer(buffer, dtype=np.uint8).reshape(len(keys), n_bytes)
+
+    return np.unpackbits(octets, axis=1, bitorder="little")[:, : self.cafe.key_bits]
+
+  def pack(self, bits):
+    """Returns the list of keys of an (n, key_bits) bit matrix."""
+
+    n_bytes = self.n_bytes
+    buffer = np.packbits(bits, axis=1, bitorder="little").tobytes()
+
+    return [
+      int.from_bytes(buffer[start : start + n_bytes], "little")
+      for start in range(0, len(buffer), n_bytes)
+    ]
+
+  def field(self, bits, shift, width):
+    """Returns the integer values of a bit field."""
+
+    return bits[:, shift : shift + width].astype(np.int64) @ (1 << np.arange(width))
+
+  def count_field(self, bits, shift):
+    """Returns the (n, n_drinks) counts of a count field starting at `shift`."""
+
+    cafe = self.cafe
+    width = len(cafe.drinks) * cafe.count_bits
+    counts = bits[:, shift : shift + width].reshape(len(bits), len(cafe.drinks), cafe.count_bits)
+
+    return counts.astype(np.int64) @ self.count_weights
+
+  def decode(self, keys):
+    """Returns the field arrays of a list of keys."""
+
+    cafe = self.cafe
+    bits = self.unpack(keys)
+    n_locations = len(cafe.locations)
+
+    return {
+      "b_code": self.field(bits, 0, cafe.w_shift),
+      "w_code": self.field(bits, cafe.w_shift, cafe.location_shift - cafe.w_shift),
+      "location": self.field(bits, cafe.location_shift, cafe.tray_shift - cafe.location_shift),
+      "tray": bits[:, cafe.tray_shift].astype(bool),
+      "clean": bits[:, cafe.clean_shift : cafe.clean_shift + n_locations].astype(bool),
+      "orders": self.count_field(bits, cafe.orders_shifts[0]),
+      "prepared": self.count_field(bits, cafe.prepared_shifts[0]),
+      "inventory": self.count_field(bits, cafe.inventory_shifts[0]),
+    }
+
+  def encode(self, fields):
+    """Returns the keys of field arrays, with zero action codes."""
+
+    cafe = self.cafe
+    n = len(fields["location"])
+    n_locations = len(cafe.locations)
+    bits = np.zeros((n, cafe.key_bits), dtype=np.uint8)
+
+    width = cafe.tray_shift - cafe.location_shift
+    bits[:, cafe.location_shift : cafe.tray_shift] = (
+      fields["location"][:, None] >> np.arange(width)
+    ) & 1
+    bits[:, cafe.tray_shift] = fields["tray"]
+    bits[:, cafe.clean_shift : cafe.clean_shift + n_locations] = fields["clean"]
+
+    width = len(cafe.drinks) * cafe.count_bits
+    for name, shifts in (
+      ("orders", cafe.orders_shifts),
+      ("prepared", cafe.prepared_shifts),
+      ("inventory", cafe.inventory_shifts),
+    ):
+      counts = (fields[name][:, :, None] >> np.arange(cafe.count_bits)) & 1
+      bits[:, shifts[0] : shifts[0] + width] = counts.reshape(n, width)
+
+    return self.pack(bits)
+
+  # Expansion --------------------------------------------------------------------------------------
+  def __call__(self, states):
+    """Expands a block of states.
+
+    Returns the parallel lists (parent positions in `states`, successors, plan steps, heuristic
+    values) of every successor, each step being the `(time, barista task, waiter task)` of
+    `Cafe.get_next_states`.
+    """
+
+    cafe = self.cafe
+    time, keys, b_finish_time, w_finish_time = zip(*states, strict=True)
+    time, b_finish_time, w_finish_time = map(np.array, (time, b_finish_time, w_finish_time))
+    fields = self.decode(keys)
+
+    # 1-2. Advance the clock to the next event and apply its effects
+    next_event_time = self.advance_events(fields, time, b_finish_time, w_finish_time)
+
+    # 3. Tasks of both robots, busy robots keep their current one ---------------
+    b_ok, b_end = self.barista_tasks(fields, next_event_time, b_finish_time)
+    w_ok, w_end = self.waiter_tasks(fields, next_event_time, w_finish_time)
+
+    # 4. Every combination of tasks, with its key and heuristic value -----------
+    parents, b_codes, w_codes = np.nonzero(b_ok[:, :, None] & w_ok[:, None, :])
+    b_ends = b_end[parents, b_codes]
+    w_ends = w_end[parents, w_codes]
+
+    base_keys = self.encode(fields)
+    low_bits = (b_codes | (w_codes << cafe.w_shift)).tolist()
+    parent_list = parents.tolist()
+
+    next_keys = [base_keys[p] | low for p, low in zip(parent_list, low_bits, strict=True)]
+    times = next_event_time[parents].tolist()
+    b_tasks = list(zip(b_codes.tolist(), b_ends.tolist(), strict=True))
+    w_tasks = list(zip(w_codes.tolist(), w_ends.tolist(), strict=True))
+
+    successors = [
+      (t, key, b_task[1], w_task[1])
+      for t, key, b_task, w_task in zip(times, next_keys, b_tasks, w_tasks, strict=True)
+    ]
+    steps = list(zip(times, b_tasks, w_tasks, strict=True))
+
+    if self.heuristic is not None:
+      h_values = [self.heuristic(successor) for successor in successors]
+    else:
+      h_values = self.critical_path(
+        fields, parents, b_codes, w_codes, next_event_time[parents], b_ends, w_ends
+      ).tolist()
+
+    return parent_list, successors, steps, h_values
+
+  def advance_events(self, fields, time, b_finish_time, w_finish_time):
+    """Vectorized `Cafe.advance_events`, updates the fields and returns the event times."""
+
+    b_code, w_code = fields["b_code"], fields["w_code"]
+    rows = np.arange(len(time))
+
+    # 1. Find the time of the next event -----------------------------------------
+    b_event = np.where((b_code != 0) | (b_finish_time > time), b_finish_time, np.inf)
+    w_event = np.where((w_code != 0) | (w_finish_time > time), w_finish_time, np.inf)
+    next_event_time = np.minimum(b_event, w_event)
+    next_event_time = np.where(np.isinf(next_event_time), time, next_event_time)
+
+    # 2. Update world state based on events that just finished -------------------
+    # Barista finishes making a drink
+    done = (b_finish_time == next_event_time) & (b_code != 0)
+    drinks = b_code[done] - 1
+    fields["orders"][rows[done], drinks] -= 1
+    fields["prepared"][rows[done], drinks] += 1
+
+    # Waiter finishes its action
+    done = w_finish_time == next_event_time
+    operation = np.where(done, self.w_operation[w_code], IDLE)
+    argument = self.w_argument[w_code]
+    self.finish_waiter_actions(fields, rows, operation, argument)
+
+    return next_event_time
+
+  def finish_waiter_actions(self, fields, rows, operation, argument):
+    """Vectorized `Cafe.finish_waiter_action` on the given rows of the fields."""
+
+    fields["location"][rows] = np.where(operation == MOVING, argument, fields["location"][rows])
+    fields["tray"][rows] = np.where(
+      operation == TAKE_TRAY, True, np.where(operation == RETURN_TRAY, False, fields["tray"][rows])
+    )
+
+    picked = operation == PICKING_UP
+    fields["prepared"][rows[picked], argument[picked]] -= 1
+    fields["inventory"][rows[picked], argument[picked]] += 1
+
+    delivered = operation == DELIVERING
+    fields["inventory"][rows[delivered], argument[delivered]] -= 1
+
+    cleaned = operation == CLEANING
+    fields["clean"][rows[cleaned], argument[cleaned]] = False
+
+  def barista_tasks(self, fields, next_event_time, b_finish_time):
+    """Returns the (n, barista codes) masks of possible tasks and their finish times."""
+
+    orders = fields["orders"]
+    free = b_finish_time <= next_event_time
+
+    # Barista can make drinks, or idle if there is nothing else to do
+    ok = np.concatenate([(orders == 0).all(axis=1)[:, None], orders > 0], axis=1)
+    end = next_event_time[:, None] + self.b_duration[None, :]
+
+    # A busy barista keeps its task
+    busy = ~free
+    ok[busy] = False
+    ok[busy, fields["b_code"][busy]] = True
+    end[busy] = b_finish_time[busy, None]
+
+    return ok, end
+
+  def waiter_tasks(self, fields, next_event_time, w_finish_time):
+    """Returns the (n, waiter codes) masks of possible tasks and their finish times."""
+
+    cafe = self.cafe
+    n = len(next_event_time)
+    location, tray, clean = fields["location"], fields["tray"], fields["clean"]
+    prepared, inventory = fields["prepared"], fields["inventory"]
+
+    inventory_size = inventory.sum(axis=1)
+    any_prepared = (prepared > 0).any(axis=1)
+    any_clean = clean.any(axis=1)
+    at_bar = location == 0
+    empty = inventory_size == 0
+    here = self.location_range[None, :] == location[:, None]
+
+    ok = np.zeros((n, len(cafe.w_actions)), dtype=bool)
+    duration = np.zeros((n, len(cafe.w_actions)))
+
+    # Waiter can take or return the tray
+    take, give_back = cafe.w_codes[(TAKE_TRAY, True)], cafe.w_codes[(RETURN_TRAY, False)]
+    ok[:, take] = at_bar & empty & ~tray
+    ok[:, give_back] = at_bar & empty & tray
+    duration[:, take] = cafe.time_to_take_tray
+    duration[:, give_back] = cafe.time_to_return_tray
+
+    # Waiter can pickup drinks from the bar
+    room = (~tray & empty) | (tray & (inventory_size < TRAY_CAPACITY))
+    ok[:, self.pickup_codes] = (at_bar & room)[:, None] & (prepared > 0)
+    duration[:, self.pickup_codes] = cafe.time_to_pickup
+
+    # Waiter can deliver drinks if he is at the right table
+    ok[:, self.deliver_codes] = (inventory > 0) & (
+      self.drink_location[None, :] == location[:, None]
+    )
+    duration[:, self.deliver_codes] = cafe.time_to_deliver
+
+    # Waiter can clean dirty tables
+    ok[:, self.clean_codes] = clean & here & (~tray & empty)[:, None]
+    duration[:, self.clean_codes] = self.clean_cost[None, :]
+
+    # Waiter can walk to the bar, the tables of carried drinks and the dirty tables
+    relevant = ((inventory > 0).astype(np.int64) @ self.drinks_at.T.astype(np.int64)) > 0
+    relevant |= clean
+    relevant[:, 0] = True
+    ok[:, self.move_codes] = relevant & ~here
+    duration[:, self.move_codes] = self.travel_time[tray.astype(np.int64), location]
+
+    # Waiter can idle if there is nothing else to do
+    idle = cafe.w_codes[(IDLE, None)]
+    ok[:, idle] = ~tray & ~any_prepared & empty & ~any_clean
+
+    end = next_event_time[:, None] + duration
+
+    # A busy waiter keeps its task
+    busy = w_finish_time > next_event_time
+    ok[busy] = False
+    ok[busy, fields["w_code"][busy]] = True
+    end[busy] = w_finish_time[busy, None]
+
+    return ok, end
+
+  # Heuristic --------------------------------------------------------------------------------------
+  def critical_path(self, fields, parents, b_codes, w_codes, time, b_ends, w_ends):
+    """Vectorized `CriticalPath` of the successors, from the fields of their parents."""
+
+    cafe = self.cafe
+
+    # Barista: remaining work plus the fastest delivery of the last drink
+    orders = fields["orders"][parents]
+    pending_orders = orders > 0
+    barista = orders @ self.make_cost
+    barista += np.where(b_codes > 0, b_ends - time - self.b_duration[b_codes], 0.0)
+    barista += np.where(pending_orders, self.tail[None, :], np.inf).min(axis=1)
+    barista = np.where(pending_orders.any(axis=1), barista, 0.0)
+
+    # Waiter: remaining actions plus a spanning tree over the places still to visit
+    successor_fields = {
+      name: fields[name][parents].copy()
+      for name in ("location", "tray", "clean", "prepared", "inventory")
+    }
+    rows = np.arange(len(parents))
+    operation = self.w_operation[w_codes]
+    self.finish_waiter_actions(successor_fields, rows, operation, self.w_argument[w_codes])
+
+    location, tray, clean = (successor_fields[name] for name in ("location", "tray", "clean"))
+    pending = orders + successor_fields["prepared"]
+    inventory = successor_fields["inventory"]
+
+    waiter = np.where(w_codes > 0, w_ends - time, 0.0)
+    waiter += pending.sum(axis=1) * (cafe.time_to_pickup + cafe.time_to_deliver)
+    waiter += inventory.sum(axis=1) * cafe.time_to_deliver
+    waiter += clean @ self.clean_cost
+
+    drink_bits = 1 << self.drink_location
+    required = tray | (pending > 0).any(axis=1)
+    required = required.astype(np.int64)
+    required |= np.bitwise_or.reduce(
+      np.where((pending > 0) | (inventory > 0), drink_bits, 0), axis=1
+    )
+    required |= clean.astype(np.int64) @ (1 << self.location_range)
+    waiter += self.spanning_trees(location, required & ~(1 << location))
+
+    return np.maximum(barista, waiter)
+
+  def spanning_trees(self, starts, required):
+    """Returns the spanning tree walking times of (start, required locations) pairs, computing
+    each distinct pair of the batch once through the cache of `CriticalPath.spanning_tree`."""
+
+    pairs, inverse = np.unique(np.stack([starts, required]), axis=1, return_inverse=True)
+    spanning_tree = self.critical_path_bound.spanning_tree
+    trees = np.array([spanning_tree(int(start), int(mask)) for start, mask in pairs.T])
+
+    return trees[inverse.reshape(-1)]
@@ -0,0 +1,276 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import sys
+import time as clock
+
+from batch import ALGORITHMS, DEFAULT_BATCH_SIZE, KEYINGS, search
+from constants import LOCATIONS_DISTANCE
+from heuristics import HEURISTICS
+from instances import random_scenario
+from instrumentation import SearchMonitor
+from scenarios import build_instance
+
+try:
+  import resource
+except ImportError:  # Not available on Windows
+  resource = None
+
+DEFAULT_TABLES = len({location for pair in LOCATIONS_DISTANCE for location in pair}) - 1
+
+# Algorithm specs: "bfs", "ucs" or "<algorithm>:<heuristic>" for the other `batch.ALGORITHMS`
+DEFAULT_ALGORITHMS = ("bfs", "ucs", "greedy:max", *(f"astar:{name}" for name in HEURISTICS))
+
+
+def parse_algorithm(spec, memory=1_000_000, keying="absolute"):
+  """Returns the `batch.search` options of an algorithm spec, with the visited keys of `keying`
+  (see `batch.KEYINGS`)."""
+
+  algorithm, _, heuristic = spec.partition(":")
+
+  if algorithm not in ALGORITHMS:
+    raise ValueError(f"Unknown algorithm {algorithm}")
+  if algorithm not in ("bfs", "ucs") and heuristic not in HEURISTICS:
+    raise ValueError(f"Unknown heuristic {heuristic!r} in {spec}")
+
+  return {
+    "algorithm": algorithm,
+    "heuristic": heuristic or None,
+    "weight": 1.0,
+    "memory": memory,
+    "budget": None,
+    "batch_size": DEFAULT_BATCH_SIZE,
+    "disk_dir": None,  # externalastar works in a fresh directory under the system temp dir
+    "keying": keying,
+    "search_workers": None,  # hdastar uses every CPU
+  }
+
+
+def generate_instances(orders, hot_ratios, dirty, tables, seeds, base_seed):
+  """Yields (instance id, size, scenario) for every combination, smallest first.
+
+  Each instance has its own seeded generator, so an id always names the same scenario.
+  """
+
+  for n_orders in orders:
+    for n_tables in tables:
+      for n_dirty in dirty:
+        for hot_ratio in hot_ratios:
+          for seed in range(seeds):
+            instance_id = (
+              f"o{n_orders}-t{n_tables or DEFAULT_TABLES}-d{n_dirty}-h{hot_ratio}-s{seed}"
+            )
+            rng = random.Random(f"{base_seed}:{instance_id}")
+            scenario = random_scenario(rng, n_orders, hot_ratio, n_dirty, n_tables or None)
+            scenario["id"] = instance_id
+            size = (n_orders, n_tables or DEFAULT_TABLES, n_dirty)
+            yield instance_id, size, scenario
+
+
+def run_one(scenario, spec, keying, stats_out, connection):
+  """Solves one instance in a fresh process and reports its measurements.
+
+  With a `stats_out` path, the run is monitored and its `SearchMonitor` export written there.
+  """
+
+  cafe, initial_state = build_instance(scenario)
+  stats = {}
+  monitor = SearchMonitor() if stats_out else None
+
+  time_start = clock.perf_counter()
+  total_time, _, path = search(
+    parse_algorithm(spec, keying=keying), cafe, initial_state, stats, monitor
+  )
+  elapsed = clock.perf_counter() - time_start
+
+  if monitor is not None:
+    monitor.finish(stats)
+    monitor.export(stats_out)
+
+  connection.send(
+    {
+      "cost": total_time if path is not None else None,
+      "time": elapsed,
+      "expanded": stats["expanded"],
+      "generated": stats["generated"],
+      "visited": stats["visited"],
+      # Kilobytes on Linux, bytes on macOS
+      "peak_rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else None,
+    }
+  )
+
+
+def run_benchmark(
+  instances, algorithms, timeout, keying="absolute", stats_out=None, stats_format="json"
+):
+  """Runs every algorithm on every instance and returns the list of run records.
+
+  Every run gets its own spawned process, so peak RSS is measured per run and a run that exceeds
+  the timeout is killed. An algorithm is not run on instances at least as large, in every size
+  dimension, as one it already timed out on. With `stats_out`, each run also writes its
+  `SearchMonitor` export there, as <instance>-<algorithm>.<stats_format>.
+  """
+
+  context = multiprocessing.get_context("spawn")
+  if stats_out:
+    os.makedirs(stats_out, exist_ok=True)
+  timed_out = {spec: [] for spec in algorithms}
+  runs = []
+
+  for instance_id, size, scenario in instances:
+    for spec in algorithms:
+      record = {"instance": instance_id, "algorithm": spec, "size": list(size)}
+
+      # 1. Skip sizes past the point where the algorithm stopped scaling ------------------------
+      if any(all(a >= b for a, b in zip(size, limit, strict=True)) for limit in timed_out[spec]):
+        runs.append({**record, "status": "skipped"})
+        continue
+
+      # 2. Run in a separate process and wait at most `timeout` seconds -------------------------
+      receiver, sender = context.Pipe(duplex=False)
+      stats_path = None
+      if stats_out:
+        stats_path = os.path.join(
+          stats_out, f"{instance_id}-{spec.replace(':', '-')}.{stats_format}"
+        )
+      # Not daemonic, so hdastar can start its workers, the run is always ended below
+      process = context.Process(target=run_one, args=(scenario, spec, keying, stats_path, sender))
+      process.start()
+      sender.close()
+
+      try:
+        if not receiver.poll(timeout):
+          record["status"] = "timeout"
+          timed_out[spec].append(size)
+        else:
+          record.update(receiver.recv(), status="solved")
+      except EOFError:
+        # The process died without sending anything, its traceback went to stderr
+        record["status"] = "error"
+      finally:
+        process.terminate()
+        process.join()
+        receiver.close()
+
+      if record["status"] == "solved" and record["cost"] is None:
+        record["status"] = "unsolvable"
+
+      runs.append(record)
+      print(format_run(record), file=sys.stderr)
+
+  return runs
+
+
+def format_run(record):
+  """Formats a run record as a table row."""
+
+  if record["status"] not in ("solved", "unsolvable"):
+    return f"{record['instance']:<24} | {record['algorithm']:<24} | {record['status']}"
+
+  return (
+    f"{record['instance']:<24} | {record['algorithm']:<24} | {record['time']:>9.4f} s"
+    f" | {record['expanded']:>9} exp | {record['generated']:>10} gen"
+    f" | {record['visited']:>9} vis | {record['peak_rss'] or 0:>9} rss"
+  )
+
+
+def compare(runs, baseline, tolerance, min_time=0.05):
+  """Returns the regressions of the runs against the baseline runs.
+
+  Expansion counts are deterministic, so any increase is a regression, while times only count
+  when slower than the baseline by more than `tolerance` (a fraction) and more than `min_time`
+  seconds, so timer noise on tiny instances is ignored.
+  """
+
+  previous = {(run["instance"], run["algorithm"]): run for run in baseline}
+  regressions = []
+
+  for run in runs:
+    old = previous.get((run["instance"], run["algorithm"]))
+    if old is None or old["status"] != "solved":
+      continue
+
+    name = f"{run['instance']} {run['algorithm']}"
+
+    if run["status"] != "solved":
+      regressions.append(f"{name}: {run['status']}, solved in baseline")
+      continue
+
+    if run["cost"] != old["cost"]:
+      regressions.append(f"{name}: cost {old['cost']} -> {run['cost']}")
+    if run["expanded"] > old["expanded"]:
+      regressions.append(f"{name}: expanded {old['expanded']} -> {run['expanded']}")
+    if run["time"] > max(old["time"] * (1 + tolerance), old["time"] + min_time):
+      regressions.append(f"{name}: time {old['time']:.4f} -> {run['time']:.4f} s")
+
+  return regressions
+
+
+def parse_list(kind):
+  """Returns an argparse type for comma-separated values."""
+
+  return lambda text: [kind(value) for value in text.split(",")]
+
+
+def main():
+  parser = argparse.ArgumentParser(
+    description="Benchmarks the search algorithms on seeded instances of growing size."
+  )
+  parser.add_argument("--orders", type=parse_list(int), default=[1, 2, 4, 6, 8])
+  parser.add_argument("--hot-ratios", type=parse_list(float), default=[0.5])
+  parser.add_argument("--dirty", type=parse_list(int), default=[1])
+  parser.add_argument(
+    "--tables", type=parse_list(int), default=[0], help="random layout sizes, 0 = café layout"
+  )
+  parser.add_argument("--seeds", type=int, default=1, help="instances per combination")
+  parser.add_argument("--seed", type=int, default=0)
+  parser.add_argument("--algorithms", type=parse_list(str), default=list(DEFAULT_ALGORITHMS))
+  parser.add_argument("--keying", choices=KEYINGS, default="absolute", help="visited keys")
+  parser.add_argument("--timeout", type=float, default=30.0, help="seconds per run")
+  parser.add_argument("--out", default="benchmark.json", help="JSON results file")
+  parser.add_argument("--baseline", help="JSON results file to compare against")
+  parser.add_argument("--tolerance", type=float, default=0.25, help="allowed time increase")
+  parser.add_argument("--min-time", type=float, default=0.05, help="ignored time increase [s]")
+  parser.add_argument(
+    "--stats-out", help="directory of the search reports, timings then include the monitoring"
+  )
+  parser.add_argument(
+    "--stats-format",
+    choices=("json", "csv"),
+    default="json",
+    help="full report, or the progress samples only",
+  )
+  args = parser.parse_args()
+
+  for spec in args.algorithms:
+    parse_algorithm(spec)
+
+  instances = generate_instances(
+    args.orders, args.hot_ratios, args.dirty, args.tables, args.seeds, args.seed
+  )
+  runs = run_benchmark(
+    instances, args.algorithms, args.timeout, args.keying, args.stats_out, args.stats_format
+  )
+
+  with open(args.out, "w") as file:
+    meta = {"python": platform.python_version(), "machine": platform.machine(), **vars(args)}
+    json.dump({"meta": meta, "runs": runs}, file, indent=2)
+
+  if args.baseline:
+    with open(args.baseline) as file:
+      baseline = json.load(file)["runs"]
+
+    regressions = compare(runs, baseline, args.tolerance, args.min_time)
+    for regression in regressions:
+      print(regression)
+    print(f"Regressions against {args.baseline}: {len(regressions)}")
+
+    if regressions:
+      sys.exit(1)
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,788 @@
+import itertools
+from collections import OrderedDict
+
+from constants import BIG_TABLES, DURATIONS, LOCATIONS_DISTANCE
+from layouts import distance_matrix
+
+DRINK_KINDS = ("cold", "hot")
+TRAY_CAPACITY = 3
+# Action templates kept per robot by default, see `TemplateCache`
+TEMPLATE_CACHE_SIZE = 65536
+
+# Waiter operations, the action code of a waiter is (operation, argument)
+IDLE, TAKE_TRAY, RETURN_TRAY, MOVING, PICKING_UP, DELIVERING, CLEANING = range(7)
+W_OPERATION_NAMES = (
+  "idle",
+  "take_tray",
+  "return_tray",
+  "moving",
+  "picking_up",
+  "delivering",
+  "cleaning",
+  "delivery_run",
+  "tray_run",
+)
+
+# Waiter macro-operations, the whole trip of a waiter leaving the bar with drinks: one drink without
+# the tray, ending at its table, or a tray load in the fastest table order, ending back at the bar
+DELIVERY_RUN, TRAY_RUN = 7, 8
+
+
+class TemplateCache:
+  """Bounded LRU cache of action templates, lists of (action code, duration) pairs.
+
+  Templates only depend on a projection of the state, the caller shifts the durations by the
+  current time. At most `size` templates are kept, the least recently used one is evicted first;
+  `hits` and `misses` count the lookups.
+  """
+
+  __slots__ = ("size", "templates", "hits", "misses")
+
+  def __init__(self, size):
+    self.size = size
+    self.templates = OrderedDict()
+    self.hits = 0
+    self.misses = 0
+
+  def get(self, projection, build):
+    """Returns the template of a projection, calling `build(projection)` on a miss."""
+
+    templates = self.templates
+    template = templates.get(projection)
+
+    if template is not None:
+      self.hits += 1
+      templates.move_to_end(projection)
+      return template
+
+    self.misses += 1
+    template = templates[projection] = build(projection)
+    if len(templates) > self.size:
+      templates.popitem(last=False)
+
+    return template
+
+  def stats(self):
+    """Returns the hits, misses and number of cached templates."""
+
+    return {"hits": self.hits, "misses": self.misses, "size": len(self.templates)}
+
+
+class Cafe:
+  """Café domain with states packed into integers.
+
+  A state is the tuple (time, key, b_finish_time, w_finish_time), where `key` is one integer
+  holding, from the lowest bits up: barista action code, waiter action code, waiter location, tray
+  flag, bitmask of tables to clean, and the counts per (table, drink kind) of orders, prepared
+  drinks and waiter inventory. `canonical_state` keys the visited table with everything but the
+  clock.
+
+  The layout (distances between locations, big tables) and the durations default to the values in
+  `constants.py`; `durations` overrides any entry of `DURATIONS` by name. The distances are the
+  edges of the café graph, the waiter travels between two locations along the shortest path, whose
+  lengths are precomputed once by `layouts.distance_matrix`.
+
+  The actions of a free robot only depend on a projection of the key (the orders for the barista;
+  location, tray, tables to clean, prepared drinks and inventory for the waiter), so they are
+  built once per projection as templates of durations and kept in LRU caches of
+  `template_cache_size` entries each, 0 disables them.
+
+  With `macro_actions`, a waiter leaving the bar with drinks in hand makes its whole trip as one
+  action, a delivery run, instead of moving and delivering step by step; `expand_macros` turns the
+  runs of a plan back into primitive steps. Plans get much shorter, but the waiter can no longer
+  come back to the bar halfway through a tray load, so `check_macros.py` compares the costs with
+  the primitive search.
+  """
+
+  def __init__(
+    self,
+    max_count=15,
+    partial_order_reduction=False,
+    distances=LOCATIONS_DISTANCE,
+    big_tables=BIG_TABLES,
+    durations=None,
+    template_cache_size=TEMPLATE_CACHE_SIZE,
+    macro_actions=False,
+  ):
+    self.partial_order_reduction = partial_order_reduction
+    self.template_cache_size = template_cache_size
+    self.macro_actions = macro_actions
+
+    unknown = set(durations or {}) - set(DURATIONS)
+    if unknown:
+      raise ValueError(f"Unknown durations: {', '.join(sorted(unknown))}")
+    durations = {**DURATIONS, **(durations or {})}
+
+    self.time_to_pickup = durations["time_to_pickup"]
+    self.time_to_deliver = durations["time_to_deliver"]
+    self.time_to_take_tray = durations["time_to_take_tray"]
+    self.time_to_return_tray = durations["time_to_return_tray"]
+    self.speed_with_tray = durations["speed_with_tray"]
+    self.speed_without_tray = durations["speed_without_tray"]
+
+    tables = sorted({location for pair in distances for location in pair} - {"bar"})
+
+    self.locations = ("bar", *tables)
+    self.drinks = tuple((table, kind) for table in tables for kind in DRINK_KINDS)
+    self.location_index = {location: i for i, location in enumerate(self.locations)}
+    self.drink_index = {drink: d for d, drink in enumerate(self.drinks)}
+
+    n_locations = len(self.locations)
+    n_drinks = len(self.drinks)
+
+    # Static data, indexed by location or drink ----------------------------------------------------
+    self.distance = distance_matrix(self.locations, distances)
+    # Travel times without and with the tray, indexed by tray flag, location and destination
+    self.travel_time = [
+      [[distance / speed for distance in row] for row in self.distance]
+      for speed in (self.speed_without_tray, self.speed_with_tray)
+    ]
+    self.clean_cost = [
+      durations["time_to_clean_big"] if loc in big_tables else durations["time_to_clean_small"]
+      for loc in self.locations
+    ]
+    self.make_cost = [
+      durations["time_to_make_cold"] if kind == "cold" else durations["time_to_make_hot"]
+      for _, kind in self.drinks
+    ]
+    self.drink_location = [self.location_index[table] for table, _ in self.drinks]
+
+    # Action codes ---------------------------------------------------------------------------------
+    self.b_actions = [("idle", None)] + [("making", drink) for drink in self.drinks]
+
+    self.w_actions = [(IDLE, None), (TAKE_TRAY, True), (RETURN_TRAY, False)]
+    self.w_actions += [(MOVING, i) for i in range(n_locations)]
+    self.w_actions += [(PICKING_UP, d) for d in range(n_drinks)]
+    self.w_actions += [(DELIVERING, d) for d in range(n_drinks)]
+    self.w_actions += [(CLEANING, i) for i in range(n_locations)]
+    if macro_actions:
+      self.w_actions += [(DELIVERY_RUN, d) for d in range(n_drinks)]
+      self.w_actions += [(TRAY_RUN, run) for run in self.tray_runs()]
+    self.w_codes = {action: code for code, action in enumerate(self.w_actions)}
+    self.move_codes = [self.w_codes[(MOVING, i)] for i in range(n_locations)]
+
+    # Bit layout of the key ------------------------------------------------------------------------
+    self.count_bits = max(max_count, 1).bit_length()
+    self.count_mask = (1 << self.count_bits) - 1
+
+    b_bits = (len(self.b_actions) - 1).bit_length()
+    w_bits = (len(self.w_actions) - 1).bit_length()
+    location_bits = (n_locations - 1).bit_length()
+
+    self.w_shift = b_bits
+    self.location_shift = self.w_shift + w_bits
+    self.tray_shift = self.location_shift + location_bits
+    self.clean_shift = self.tray_shift + 1
+    orders_shift = self.clean_shift + n_locations
+    prepared_shift = orders_shift + n_drinks * self.count_bits
+    inventory_shift = prepared_shift + n_drinks * self.count_bits
+    self.key_bits = inventory_shift + n_drinks * self.count_bits
+
+    self.b_mask = (1 << b_bits) - 1
+    self.w_mask = (1 << w_bits) - 1
+    self.location_mask = (1 << location_bits) - 1
+    self.actions_mask = (1 << self.location_shift) - 1
+    self.location_field = self.location_mask << self.location_shift
+    self.tray_bit = 1 << self.tray_shift
+    self.clean_bits = [1 << (self.clean_shift + i) for i in range(n_locations)]
+    self.clean_field = ((1 << n_locations) - 1) << self.clean_shift
+
+    self.orders_shifts = [orders_shift + d * self.count_bits for d in range(n_drinks)]
+    self.prepared_shifts = [prepared_shift + d * self.count_bits for d in range(n_drinks)]
+    self.inventory_shifts = [inventory_shift + d * self.count_bits for d in range(n_drinks)]
+    self.orders_field = ((1 << (n_drinks * self.count_bits)) - 1) << orders_shift
+    self.prepared_field = ((1 << (n_drinks * self.count_bits)) - 1) << prepared_shift
+    self.inventory_field = ((1 << (n_drinks * self.count_bits)) - 1) << inventory_shift
+
+    # Delivery runs: the inventory each tray run delivers, the tray run of each sorted load and the
+    # duration of every run
+    self.run_inventory = {
+      argument: sum(1 << self.inventory_shifts[d] for d in argument)
+      for operation, argument in self.w_actions
+      if operation == TRAY_RUN
+    }
+    self.tray_run_order = {
+      tuple(sorted(argument)): argument
+      for operation, argument in self.w_actions
+      if operation == TRAY_RUN
+    }
+    self.run_cost = {
+      code: sum(duration for _, duration in self.run_tasks(code))
+      for code, (operation, _) in enumerate(self.w_actions)
+      if operation in (DELIVERY_RUN, TRAY_RUN)
+    }
+
+    # Everything but the waiter location must be zero in a goal key
+    self.goal_mask = ((1 << self.key_bits) - 1) & ~self.location_field
+
+    # Action templates, keyed by the part of the key the actions depend on ------------------------
+    self.waiter_field = (
+      self.location_field
+      | self.tray_bit
+      | self.clean_field
+      | self.prepared_field
+      | self.inventory_field
+    )
+    self.b_templates = TemplateCache(template_cache_size)
+    self.w_templates = TemplateCache(template_cache_size)
+
+  # Encoding ---------------------------------------------------------------------------------------
+  def counts(self, key, shifts):
+    """Returns the list of drink counts stored in the given count field of a key."""
+
+    mask = self.count_mask
+    return [(key >> shift) & mask for shift in shifts]
+
+  def encode(self, state):
+    """Packs a readable 9-tuple state into (time, key, b_finish_time, w_finish_time)."""
+
+    time, b_status, w_status, location, tray, inventory, orders, prepared, tables_to_clean = state
+
+    b_action, b_action_data, b_finish_time = b_status
+    w_action, w_action_data, w_finish_time = w_status
+
+    b_code = self.b_actions.index((b_action, b_action_data))
+
+    operation = W_OPERATION_NAMES.index(w_action)
+    if operation in (MOVING, CLEANING):
+      w_action_data = self.location_index[w_action_data]
+    elif operation in (PICKING_UP, DELIVERING, DELIVERY_RUN):
+      w_action_data = self.drink_index[w_action_data]
+    elif operation == TRAY_RUN:
+      w_action_data = tuple(self.drink_index[drink] for drink in w_action_data)
+    w_code = self.w_codes[(operation, w_action_data)]
+
+    key = b_code | (w_code << self.w_shift) | (self.location_index[location] << self.location_shift)
+
+    if tray:
+      key |= self.tray_bit
+
+    for table in tables_to_clean:
+      key |= self.clean_bits[self.location_index[table]]
+
+    for drinks, shifts in (
+      (orders, self.orders_shifts),
+      (prepared, self.prepared_shifts),
+      (inventory, self.inventory_shifts),
+    ):
+      for drink in drinks:
+        shift = shifts[self.drink_index[drink]]
+        if (key >> shift) & self.count_mask == self.count_mask:
+          raise ValueError(f"More than {self.count_mask} drinks {drink} in one state")
+        key += 1 << shift
+
+    return (time, key, b_finish_time, w_finish_time)
+
+  def decode(self, state):
+    """Unpacks a state into the readable 9-tuple form."""
+
+    time, key, b_finish_time, w_finish_time = state
+
+    b_action, b_action_data = self.b_actions[key & self.b_mask]
+    w_action, w_action_data = self.describe_w_action((key >> self.w_shift) & self.w_mask)
+
+    def drinks(shifts):
+      return tuple(
+        drink
+        for drink, count in zip(self.drinks, self.counts(key, shifts), strict=True)
+        for _ in range(count)
+      )
+
+    return (
+      time,
+      (b_action, b_action_data, b_finish_time),
+      (w_action, w_action_data, w_finish_time),
+      self.locations[(key >> self.location_shift) & self.location_mask],
+      bool(key & self.tray_bit),
+      drinks(self.inventory_shifts),
+      drinks(self.orders_shifts),
+      drinks(self.prepared_shifts),
+      tuple(loc for loc, bit in zip(self.locations, self.clean_bits, strict=True) if key & bit),
+    )
+
+  def relative_state(self, state):
+    """Canonical key with the remaining action durations instead of absolute finish times.
+
+    The dynamics do not depend on the clock, so two states with the same key and the same remaining
+    durations have the same futures shifted in time, and the one reached later is pruned as a
+    duplicate. Idle robots get a remaining duration of zero, unless they wait for a wake-up time
+    set by `add_events`.
+    """
+
+    time, key, b_finish_time, w_finish_time = state
+
+    return (key, max(b_finish_time - time, 0.0), max(w_finish_time - time, 0.0))
+
+  def describe_w_action(self, code):
+    """Returns the readable (action, data) pair of a waiter action code."""
+
+    operation, argument = self.w_actions[code]
+
+    if operation in (MOVING, CLEANING):
+      argument = self.locations[argument]
+    elif operation in (PICKING_UP, DELIVERING, DELIVERY_RUN):
+      argument = self.drinks[argument]
+    elif operation == TRAY_RUN:
+      argument = tuple(self.drinks[d] for d in argument)
+
+    return W_OPERATION_NAMES[operation], argument
+
+  def describe_step(self, step):
+    """Returns a plan step as readable (time, barista task, waiter task), tasks are (action, data,
+    finish time) triples."""
+
+    time, (b_code, b_finish_time), (w_code, w_finish_time) = step
+
+    return (
+      time,
+      (*self.b_actions[b_code], b_finish_time),
+      (*self.describe_w_action(w_code), w_finish_time),
+    )
+
+  def format_step(self, step):
+    """Formats a plan step (time, barista task, waiter task) as a table row."""
+
+    time, (b_action, b_action_data, b_finish_time), (w_action, w_action_data, w_finish_time) = (
+      self.describe_step(step)
+    )
+
+    b_text = f"{b_action}, {b_action_data}, {b_finish_time}"
+    w_text = f"{w_action}, {w_action_data}, {w_finish_time}"
+
+    return f"{time:^8} | {b_text:<35} | {w_text:<35}"
+
+  # Search callbacks -------------------------------------------------------------------------------
+  def get_next_states(self, state):
+    """Generates all possible successor states from the current state.
+
+    Each successor comes with its plan step (time, barista task, waiter task), where a task is an
+    (action code, finish time) pair; `format_step` turns it into text once the plan is known.
+    """
+
+    # 1-2. Advance the clock to the next event and apply its effects
+    new_state = self.advance_events(state)
+    next_event_time, new_key, b_finish_time, w_finish_time = new_state
+
+    # 3. Generate new possible tasks for newly free robots -----------------------
+    if b_finish_time <= next_event_time:
+      possible_b_tasks = self.get_barista_actions(new_state)
+    else:
+      possible_b_tasks = [(new_key & self.b_mask, b_finish_time)]
+
+    if w_finish_time <= next_event_time:
+      possible_w_tasks = self.get_waiter_actions(new_state)
+    else:
+      possible_w_tasks = [((new_key >> self.w_shift) & self.w_mask, w_finish_time)]
+
+    # 4. Create successor states for each combination of tasks -------------------
+    return self.assemble_successors(new_state, possible_b_tasks, possible_w_tasks)
+
+  def advance_events(self, state):
+    """Moves the clock to the next event and applies the effects of the actions that finish then.
+
+    The action codes are kept in the key, the finish times tell which robots are free. An idle
+    robot whose finish time is still ahead wakes up then, which is how `add_events` lets an idle
+    robot react to events that arrive while the other one is busy.
+    """
+
+    time, key, b_finish_time, w_finish_time = state
+
+    b_code = key & self.b_mask
+    w_code = (key >> self.w_shift) & self.w_mask
+
+    # 1. Find the time of the next event -----------------------------------------
+    next_event_time = min(
+      b_finish_time if b_code or b_finish_time > time else float("inf"),
+      w_finish_time if w_code or w_finish_time > time else float("inf"),
+    )
+
+    if next_event_time == float("inf"):
+      next_event_time = time
+
+    # 2. Update world state based on events that just finished -------------------
+    new_key = key
+
+    # Barista finishes making a drink
+    if b_finish_time == next_event_time and b_code:
+      new_key += (1 << self.prepared_shifts[b_code - 1]) - (1 << self.orders_shifts[b_code - 1])
+
+    if w_finish_time == next_event_time:
+      new_key = self.finish_waiter_action(new_key)
+
+    return (next_event_time, new_key, b_finish_time, w_finish_time)
+
+  def assemble_successors(self, new_state, possible_b_tasks, possible_w_tasks):
+    """Returns the (successor, step) pairs of every combination of barista and waiter tasks."""
+
+    next_event_time, new_key = new_state[0], new_state[1]
+
+    successors = []
+    base_key = new_key & ~self.actions_mask
+    w_shift = self.w_shift
+
+    for b_task in possible_b_tasks:
+      for w_task in possible_w_tasks:
+        next_key = base_key | b_task[0] | (w_task[0] << w_shift)
+        next_state = (next_event_time, next_key, b_task[1], w_task[1])
+
+        successors.append((next_state, (next_event_time, b_task, w_task)))
+
+    return successors
+
+  def finish_waiter_action(self, key):
+    """Applies the effect of the waiter's current action to the key (the action code is kept)."""
+
+    operation, argument = self.w_actions[(key >> self.w_shift) & self.w_mask]
+
+    # Waiter finishes moving
+    if operation == MOVING:
+      key = (key & ~self.location_field) | (argument << self.location_shift)
+
+    # Waiter finishes taking the tray
+    elif operation == TAKE_TRAY:
+      key |= self.tray_bit
+
+    # Waiter finishes returning the tray
+    elif operation == RETURN_TRAY:
+      key &= ~self.tray_bit
+
+    # Waiter finishes picking up a drink
+    elif operation == PICKING_UP:
+      key += (1 << self.inventory_shifts[argument]) - (1 << self.prepared_shifts[argument])
+
+    # Waiter finishes delivering a drink
+    elif operation == DELIVERING:
+      key -= 1 << self.inventory_shifts[argument]
+
+    # Waiter finishes cleaning a table
+    elif operation == CLEANING:
+      key &= ~self.clean_bits[argument]
+
+    # Waiter finishes a delivery run at the table of its drink
+    elif operation == DELIVERY_RUN:
+      key = (key & ~self.location_field) | (self.drink_location[argument] << self.location_shift)
+      key -= 1 << self.inventory_shifts[argument]
+
+    # Waiter finishes a tray run back at the bar
+    elif operation == TRAY_RUN:
+      key -= self.run_inventory[argument]
+
+    return key
+
+  def get_barista_actions(self, state):
+    """Returns a list of possible (action code, finish time) tasks for an idle barista."""
+
+    time, key, _, _ = state
+
+    if self.template_cache_size:
+      template = self.b_templates.get(key & self.orders_field, self.barista_template)
+    else:
+      template = self.barista_template(key)
+
+    return [(code, time + duration) for code, duration in template]
+
+  def barista_template(self, key):
+    """Returns the (action code, duration) pairs of an idle barista, given the orders of a key."""
+
+    template = []
+
+    # Barista can make drinks
+    for d, count in enumerate(self.counts(key, self.orders_shifts)):
+      if count:
+        template.append((d + 1, self.make_cost[d]))
+
+    # Barista can idle if there is nothing else to do
+    if not template:
+      template.append((0, 0.0))
+
+    return template
+
+  def get_waiter_actions(self, state):
+    """Returns a list of possible (action code, finish time) tasks for an idle waiter."""
+
+    time, key = state[0], state[1]
+
+    first_pickup = first_delivery = 0
+    if self.partial_order_reduction:
+      first_pickup, first_delivery = self.commuting_bounds(state)
+
+    projection = (key & self.waiter_field, first_pickup, first_delivery)
+    if self.template_cache_size:
+      template = self.w_templates.get(projection, self.waiter_template)
+    else:
+      template = self.waiter_template(projection)
+
+    return [(code, time + duration) for code, duration in template]
+
+  def waiter_template(self, projection):
+    """Returns the (action code, duration) pairs of an idle waiter, given the waiter fields of a key
+    and the lowest drinks it may pick up and deliver."""
+
+    key, first_pickup, first_delivery = projection
+
+    w_codes = self.w_codes
+    location = (key >> self.location_shift) & self.location_mask
+    tray = key & self.tray_bit
+    prepared = key & self.prepared_field
+    inventory = self.counts(key, self.inventory_shifts)
+    inventory_size = sum(inventory)
+
+    template = []
+
+    # Waiter can take or return the tray
+    if location == 0 and inventory_size == 0:
+      if not tray:
+        template.append((w_codes[(TAKE_TRAY, True)], self.time_to_take_tray))
+      else:
+        template.append((w_codes[(RETURN_TRAY, False)], self.time_to_return_tray))
+
+    # Waiter can pickup drinks from the bar
+    if (
+      location == 0
+      and prepared
+      and ((not tray and inventory_size == 0) or (tray and inventory_size < TRAY_CAPACITY))
+    ):
+      for d, count in enumerate(self.counts(key, self.prepared_shifts)):
+        if count and d >= first_pickup:
+          template.append((w_codes[(PICKING_UP, d)], self.time_to_pickup))
+
+    # Waiter can deliver drinks if he is at the right table
+    relevant = 1  # bitmask over locations, the bar is always relevant
+    for d, count in enumerate(inventory):
+      if count:
+        if self.drink_location[d] == location and d >= first_delivery:
+          template.append((w_codes[(DELIVERING, d)], self.time_to_deliver))
+        relevant |= 1 << self.drink_location[d]
+
+    # Waiter can clean dirty tables
+    tables_to_clean = (key & self.clean_field) >> self.clean_shift
+    if tables_to_clean >> location & 1 and not tray and inventory_size == 0:
+      template.append((w_codes[(CLEANING, location)], self.clean_cost[location]))
+
+    # Waiter leaving the bar with drinks makes the whole trip at once
+    if self.macro_actions and location == 0 and inventory_size:
+      run = self.run_action(inventory, tray)
+      if run is not None:
+        template.append(run)
+        return template
+
+    # Waiter can walk to another location, visiting only the set bits of `relevant`
+    relevant = (relevant | tables_to_clean) & ~(1 << location)
+    travel_time = self.travel_time[1 if tray else 0][location]
+    move_codes = self.move_codes
+
+    while relevant:
+      destination = (relevant & -relevant).bit_length() - 1
+      relevant &= relevant - 1
+      template.append((move_codes[destination], travel_time[destination]))
+
+    # Waiter can idle if there is nothing else to do
+    if not tray and not prepared and inventory_size == 0 and not tables_to_clean:
+      template.append((w_codes[(IDLE, None)], 0.0))
+
+    return template
+
+  # Macro-operations ------------------------------------------------------------------------------
+  def tray_runs(self):
+    """Returns every load of the tray as its drinks in the fastest delivery order."""
+
+    travel_time = self.travel_time[1]
+    runs = []
+
+    def length(tables):
+      stops = (0, *tables, 0)
+      return sum(travel_time[a][b] for a, b in itertools.pairwise(stops))
+
+    for size in range(1, TRAY_CAPACITY + 1):
+      for drinks in itertools.combinations_with_replacement(range(len(self.drinks)), size):
+        tables = min(
+          itertools.permutations(sorted({self.drink_location[d] for d in drinks})), key=length
+        )
+        runs.append(tuple(d for table in tables for d in drinks if self.drink_location[d] == table))
+
+    return runs
+
+  def run_action(self, inventory, tray):
+    """Returns the (action code, duration) of the delivery run of a waiter at the bar, if any."""
+
+    drinks = tuple(d for d, count in enumerate(inventory) for _ in range(count))
+
+    if tray:
+      code = self.w_codes.get((TRAY_RUN, self.tray_run_order.get(drinks)))
+    elif len(drinks) == 1:
+      code = self.w_codes[(DELIVERY_RUN, drinks[0])]
+    else:
+      code = None
+
+    return None if code is None else (code, self.run_cost[code])
+
+  def run_tasks(self, code):
+    """Returns the primitive (action code, duration) tasks of a delivery run, from the bar."""
+
+    operation, argument = self.w_actions[code]
+    tray = operation == TRAY_RUN
+    drinks = argument if tray else (argument,)
+    travel_time = self.travel_time[1 if tray else 0]
+
+    tasks = []
+    location = 0
+    for d in drinks:
+      table = self.drink_location[d]
+      if table != location:
+        tasks.append((self.move_codes[table], travel_time[location][table]))
+        location = table
+      tasks.append((self.w_codes[(DELIVERING, d)], self.time_to_deliver))
+
+    if tray:
+      tasks.append((self.move_codes[0], travel_time[location][0]))
+
+    return tasks
+
+  def expand_macros(self, plan):
+    """Returns the plan with every delivery run replaced by the primitive steps it stands for."""
+
+    expanded = []
+    parts = []
+
+    for i, (time, b_task, w_task) in enumerate(plan):
+      if self.w_actions[w_task[0]][0] not in (DELIVERY_RUN, TRAY_RUN):
+        expanded.append((time, b_task, w_task))
+        continue
+
+      # 1. Primitive (code, start, finish) tasks of a run starting now --------------
+      if i == 0 or plan[i - 1][2] != w_task:
+        parts = []
+        start = time
+        for code, duration in self.run_tasks(w_task[0]):
+          parts.append((code, start, start + duration))
+          start += duration
+        parts[-1] = (parts[-1][0], parts[-1][1], w_task[1])
+
+      # 2. The task going on now and the ones starting before the next step ----------
+      end = plan[i + 1][0] if i + 1 < len(plan) else w_task[1]
+
+      for code, start, finish in parts:
+        if start < time < finish:
+          expanded.append((time, b_task, (code, finish)))
+        elif time <= start < end:
+          # A free barista chooses again at every event, idling until then
+          task = b_task if b_task[1] > start or start == time else (0, start)
+          expanded.append((start, task, (code, finish)))
+
+    return expanded
+
+  def commuting_bounds(self, state):
+    """Lowest drink index the free waiter may pick up and deliver under partial-order reduction.
+
+    Two pickups in a row, or two deliveries in a row, reach the same state in either order, so only
+    the increasing drink order is kept. Pickups are left unordered when the barista finished a drink
+    during the previous pickup, as the other order may not have been possible then.
+    """
+
+    time, key, b_finish_time, w_finish_time = state
+    operation, argument = self.w_actions[(key >> self.w_shift) & self.w_mask]
+
+    if operation == DELIVERING:
+      return 0, argument
+
+    if operation == PICKING_UP:
+      b_code = key & self.b_mask
+      b_start_time = b_finish_time - self.make_cost[b_code - 1] if b_code else b_finish_time
+      b_finished_now = b_code and b_finish_time <= time
+
+      if b_start_time <= w_finish_time - self.time_to_pickup and not b_finished_now:
+        return argument, 0
+
+    return 0, 0
+
+  def goal(self, state):
+    """Checks that every drink is delivered, every table is clean and both robots are idle."""
+
+    return not state[1] & self.goal_mask
+
+  # World updates ----------------------------------------------------------------------------------
+  def add_events(self, state, time, orders=(), tables_to_clean=()):
+    """Returns the state with new orders and dirty tables that arrived at `time`.
+
+    `state` is the last decision point reached by the plan being executed, so busy robots finish
+    after `time`. Idle robots wake up at `time` to react, the state keeps its own clock.
+    """
+
+    state_time, key, b_finish_time, w_finish_time = state
+    time = max(time, state_time)
+
+    for drink in orders:
+      shift = self.orders_shifts[self.drink_index[tuple(drink)]]
+      if (key >> shift) & self.count_mask == self.count_mask:
+        raise ValueError(f"More than {self.count_mask} drinks {tuple(drink)} in one state")
+      key += 1 << shift
+
+    for table in tables_to_clean:
+      key |= self.clean_bits[self.location_index[table]]
+
+    if not key & self.b_mask:
+      b_finish_time = time
+    if not (key >> self.w_shift) & self.w_mask:
+      w_finish_time = time
+
+    return (state_time, key, b_finish_time, w_finish_time)
+
+  # Heuristics -------------------------------------------------------------------------------------
+  def heuristic(self, state):
+    """Estimates the remaining time to reach the goal from the current state."""
+
+    key = state[1]
+
+    h = 0.0
+
+    # 1. Estimate prep time for pending orders
+    for d, count in enumerate(self.counts(key, self.orders_shifts)):
+      h += count * self.make_cost[d]
+
+    # 2. Each dirty table cleaning cost
+    for i, bit in enumerate(self.clean_bits):
+      if key & bit:
+        h += self.clean_cost[i]
+
+    # 3. If drinks left to deliver or prepare, assume we must move at least once
+    drinks_field = self.orders_field | self.prepared_field | self.inventory_field
+    if key & drinks_field and (key >> self.location_shift) & self.location_mask:
+      h += 1
+
+    return h
+
+  def heuristic2(self, state):
+    """Estimates the remaining time to reach the goal from the current state."""
+
+    key = state[1]
+
+    h = sum(self.counts(key, self.orders_shifts))
+    h += sum(self.counts(key, self.prepared_shifts))
+    h += sum(self.counts(key, self.inventory_shifts))
+    h += bin(key & self.clean_field).count("1")
+
+    drinks_field = self.orders_field | self.prepared_field | self.inventory_field
+    if key & drinks_field and (key >> self.location_shift) & self.location_mask:
+      h += 1
+
+    return h
+
+  def heuristic3(self, state):
+    """Estimates the remaining time to reach the goal from the current state."""
+
+    key = state[1]
+
+    h = 0.0
+
+    # Drinks to make
+    h += sum(self.counts(key, self.orders_shifts)) * min(self.make_cost)
+
+    # Drinks to deliver (either already prepared or in inventory)
+    total_drinks = sum(self.counts(key, self.prepared_shifts))
+    total_drinks += sum(self.counts(key, self.inventory_shifts))
+    h += total_drinks * self.time_to_deliver
+
+    # Tables to clean, optimistic: assume all small tables
+    h += bin(key & self.clean_field).count("1") * min(self.clean_cost)
+
+    return h
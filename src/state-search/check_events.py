@@ -0,0 +1,58 @@
+import argparse
+import random
+import sys
+
+from cafe import DRINK_KINDS, Cafe
+from heuristics import get_heuristic
+from instances import random_initial_state, random_walk
+from search_algorithm import UCS, A_star
+
+
+def main():
+  parser = argparse.ArgumentParser(
+    description="Checks that states with new events solve with the default duplicate detection."
+  )
+  parser.add_argument("--instances", type=int, default=40, help="number of generated instances")
+  parser.add_argument("--orders", type=int, default=2, help="maximum number of initial orders")
+  parser.add_argument("--events", type=int, default=2, help="maximum number of new orders")
+  parser.add_argument("--heuristic", default="max")
+  parser.add_argument("--seed", type=int, default=0)
+  args = parser.parse_args()
+
+  rng = random.Random(args.seed)
+  mismatches = 0
+
+  for _ in range(args.instances):
+    n_orders = rng.randint(1, args.orders)
+    n_events = rng.randint(1, args.events)
+    cafe = Cafe(max_count=n_orders + n_events)
+    tables = cafe.locations[1:]
+    state = cafe.encode(
+      random_initial_state(rng, tables, n_orders, hot_ratio=rng.random(), n_dirty=rng.randint(0, 1))
+    )
+
+    # New orders arrive while the plan runs, idle robots wait for them
+    state = random_walk(rng, state, cafe.get_next_states, cafe.goal, rng.randint(0, 4 * n_orders))
+    orders = [(rng.choice(tables), rng.choice(DRINK_KINDS)) for _ in range(n_events)]
+    state = cafe.add_events(state, state[0] + rng.uniform(0.0, 4.0), orders)
+
+    # A* with the default key against UCS with the time-shift invariant key
+    total_time, _, _ = A_star(
+      state, cafe.goal, cafe.get_next_states, get_heuristic(args.heuristic, cafe, state)
+    )
+    optimal_time, _, _ = UCS(
+      state, cafe.goal, cafe.get_next_states, canonical_state=cafe.relative_state
+    )
+
+    if abs(total_time - optimal_time) > 1e-9:
+      mismatches += 1
+      print(f"A* = {total_time} != UCS = {optimal_time} at {cafe.decode(state)}")
+
+  print(f"Checked instances: {args.instances}, mismatches: {mismatches}")
+
+  if mismatches:
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+  main()
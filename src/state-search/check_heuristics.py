@@ -0,0 +1,70 @@
+import argparse
+import random
+import sys
+
+from cafe import Cafe
+from heuristics import ADMISSIBLE_HEURISTICS, HEURISTICS, get_heuristic
+from instances import random_initial_state, random_walk
+from search_algorithm import UCS
+
+
+def main():
+  parser = argparse.ArgumentParser(
+    description="Checks the heuristics against exact UCS costs on random instances."
+  )
+  parser.add_argument("--instances", type=int, default=20, help="number of generated instances")
+  parser.add_argument("--orders", type=int, default=3, help="maximum number of orders")
+  parser.add_argument("--dirty", type=int, default=2, help="maximum number of dirty tables")
+  parser.add_argument("--samples", type=int, default=4, help="sampled states per instance")
+  parser.add_argument("--seed", type=int, default=0)
+  args = parser.parse_args()
+
+  rng = random.Random(args.seed)
+  violations = {name: 0 for name in HEURISTICS}
+  ratios = {name: [] for name in HEURISTICS}
+  checked = 0
+
+  for _ in range(args.instances):
+    n_orders = rng.randint(1, args.orders)
+    cafe = Cafe(max_count=n_orders)
+    tables = cafe.locations[1:]
+    initial_state = cafe.encode(
+      random_initial_state(
+        rng, tables, n_orders, hot_ratio=rng.random(), n_dirty=rng.randint(0, args.dirty)
+      )
+    )
+    heuristics = {name: get_heuristic(name, cafe, initial_state) for name in HEURISTICS}
+
+    # The initial state plus states at random depths of the same instance
+    states = [initial_state]
+    for _ in range(args.samples - 1):
+      steps = rng.randint(1, 4 * n_orders)
+      states.append(random_walk(rng, initial_state, cafe.get_next_states, cafe.goal, steps))
+
+    for state in states:
+      total_time, _, _ = UCS(state, cafe.goal, cafe.get_next_states)
+      cost_to_go = total_time - state[0]
+      checked += 1
+
+      for name, heuristic in heuristics.items():
+        h = heuristic(state)
+        if h > cost_to_go + 1e-9:
+          violations[name] += 1
+          if name in ADMISSIBLE_HEURISTICS:
+            print(f"{name}: h = {h} > h* = {cost_to_go} at {cafe.decode(state)}")
+        if cost_to_go > 0:
+          ratios[name].append(h / cost_to_go)
+
+  print(f"Checked states: {checked}")
+  print(f"{'Heuristic':<18} | {'Overestimates':>13} | {'Mean h/h*':>9}")
+  print("-" * 46)
+  for name in HEURISTICS:
+    mean_ratio = sum(ratios[name]) / len(ratios[name]) if ratios[name] else 1.0
+    print(f"{name:<18} | {violations[name]:>13} | {mean_ratio:>9.3f}")
+
+  if any(violations[name] for name in ADMISSIBLE_HEURISTICS):
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,91 @@
+import argparse
+import random
+import sys
+import time as clock
+
+from cafe import Cafe
+from heuristics import get_heuristic
+from instances import random_initial_state
+from search_algorithm import A_star
+from simulator import simulate
+
+
+def solve(cafe, initial_state, heuristic):
+  """Returns the cost, expanded nodes, plan and time of A* on an instance."""
+
+  stats = {}
+  time_start = clock.perf_counter()
+  total_time, _, path = A_star(
+    initial_state,
+    cafe.goal,
+    cafe.get_next_states,
+    get_heuristic(heuristic, cafe, initial_state),
+    stats,
+  )
+
+  return total_time, stats["expanded"], path, clock.perf_counter() - time_start
+
+
+def main():
+  parser = argparse.ArgumentParser(
+    description="Checks the macro-action search against the primitive one on random instances."
+  )
+  parser.add_argument("--instances", type=int, default=20, help="number of generated instances")
+  parser.add_argument("--orders", type=int, default=6, help="maximum number of orders")
+  parser.add_argument("--dirty", type=int, default=2, help="maximum number of dirty tables")
+  parser.add_argument("--heuristic", default="max")
+  parser.add_argument("--seed", type=int, default=0)
+  args = parser.parse_args()
+
+  rng = random.Random(args.seed)
+  totals = {"primitive": [0, 0, 0.0], "macro": [0, 0, 0.0]}  # Expanded nodes, plan steps, time
+  gaps = invalid = 0
+
+  for _ in range(args.instances):
+    n_orders = rng.randint(1, args.orders)
+    tables = Cafe().locations[1:]
+    state = random_initial_state(
+      rng, tables, n_orders, hot_ratio=rng.random(), n_dirty=rng.randint(0, args.dirty)
+    )
+
+    cafe = Cafe(max_count=n_orders)
+    macro_cafe = Cafe(max_count=n_orders, macro_actions=True)
+    initial_state = macro_cafe.encode(state)
+
+    cost, expanded, path, elapsed = solve(cafe, cafe.encode(state), args.heuristic)
+    macro_cost, macro_expanded, macro_path, macro_elapsed = solve(
+      macro_cafe, initial_state, args.heuristic
+    )
+
+    for name, values in (
+      ("primitive", (expanded, len(path or ()), elapsed)),
+      ("macro", (macro_expanded, len(macro_path or ()), macro_elapsed)),
+    ):
+      totals[name] = [total + value for total, value in zip(totals[name], values, strict=True)]
+
+    # The expanded macro plan must be a valid primitive plan of the same cost
+    if macro_path is not None:
+      try:
+        _, makespan = simulate(macro_cafe, initial_state, macro_cafe.expand_macros(macro_path))
+        if abs(makespan - macro_cost) > 1e-9:
+          raise ValueError(f"The expanded plan takes {makespan} instead of {macro_cost}")
+      except ValueError as error:
+        invalid += 1
+        print(f"Invalid plan: {error} at {state}")
+
+    if macro_cost > cost + 1e-9:
+      gaps += 1
+      print(f"Macro plan {macro_cost} > optimal {cost} at {state}")
+
+  print(f"Checked instances: {args.instances}, suboptimal: {gaps}, invalid: {invalid}")
+  print(f"{'Search':<10} | {'Expanded':>10} | {'Plan steps':>10} | {'Time [s]':>8}")
+  print("-" * 48)
+  for name, (expanded, steps, elapsed) in totals.items():
+    print(f"{name:<10} | {expanded:>10} | {steps:>10} | {elapsed:>8.3f}")
+
+  if gaps or invalid:
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,120 @@
+import argparse
+import random
+import sys
+
+from instances import random_scenario, random_walk
+from multi_robot import MULTI_HEURISTICS, get_multi_heuristic
+from scenarios import build_instance
+from search_algorithm import UCS
+
+# Durations drawn for the instances, short walks against long actions expose double counting
+DURATION_CHOICES = {
+  "time_to_pickup": (0.5, 1.0, 3.0),
+  "time_to_deliver": (0.5, 1.0, 3.0),
+  "time_to_make_cold": (1.0, 3.0),
+  "time_to_make_hot": (2.0, 5.0),
+}
+
+
+def random_multi_scenario(rng, n_orders, n_dirty):
+  """Returns a random scenario with several robots, a random layout and random durations."""
+
+  scenario = random_scenario(rng, n_orders, rng.random(), n_dirty, n_tables=rng.randint(2, 4))
+
+  scale = rng.choice((0.02, 0.5, 1.0))
+  for edge in scenario["layout"]["distances"]:
+    edge[2] *= scale
+
+  scenario["durations"] = {name: rng.choice(values) for name, values in DURATION_CHOICES.items()}
+  scenario["baristas"] = rng.randint(1, 2)
+  scenario["waiters"] = rng.randint(1, 2)
+
+  return scenario
+
+
+class SearchTooLong(Exception):
+  """Raised by the UCS progress callback once a state needs more expansions than allowed."""
+
+
+def expansion_limit(max_expanded):
+  """Returns a UCS progress callback that stops the search after `max_expanded` expansions."""
+
+  def progress(counters):
+    if counters["expanded"] >= max_expanded:
+      raise SearchTooLong
+
+  return progress
+
+
+def main():
+  parser = argparse.ArgumentParser(
+    description="Checks the multi-robot heuristics against exact UCS costs on random instances."
+  )
+  parser.add_argument("--instances", type=int, default=10, help="number of generated instances")
+  parser.add_argument("--orders", type=int, default=2, help="maximum number of orders")
+  parser.add_argument("--dirty", type=int, default=1, help="maximum number of dirty tables")
+  parser.add_argument("--samples", type=int, default=4, help="sampled states per instance")
+  parser.add_argument(
+    "--max-expanded", type=int, default=50_000, help="UCS expansions before a state is skipped"
+  )
+  parser.add_argument("--seed", type=int, default=0)
+  args = parser.parse_args()
+
+  rng = random.Random(args.seed)
+  violations = {name: 0 for name in MULTI_HEURISTICS}
+  ratios = {name: [] for name in MULTI_HEURISTICS}
+  checked = skipped = 0
+
+  for _ in range(args.instances):
+    n_orders = rng.randint(1, args.orders)
+    scenario = random_multi_scenario(rng, n_orders, rng.randint(0, args.dirty))
+    cafe, initial_state = build_instance(scenario)
+    heuristics = {name: get_multi_heuristic(name, cafe) for name in MULTI_HEURISTICS}
+
+    # The initial state plus states at random depths of the same instance
+    states = [initial_state]
+    for _ in range(args.samples - 1):
+      steps = rng.randint(1, 6 * n_orders)
+      states.append(random_walk(rng, initial_state, cafe.get_next_states, cafe.goal, steps))
+
+    for state in states:
+      if cafe.goal(state):
+        continue
+
+      # Tiny distances against long actions can blow up the exact search, those states are skipped
+      try:
+        total_time, _, _ = UCS(
+          state,
+          cafe.goal,
+          cafe.get_next_states,
+          canonical_state=cafe.canonical_state,
+          progress=expansion_limit(args.max_expanded),
+          progress_every=1_000,
+        )
+      except SearchTooLong:
+        skipped += 1
+        continue
+      cost_to_go = total_time - state[0]
+      checked += 1
+
+      for name, heuristic in heuristics.items():
+        h = heuristic(state)
+        if h > cost_to_go + 1e-9:
+          violations[name] += 1
+          print(f"{name}: h = {h} > h* = {cost_to_go} at {state} of {scenario}")
+        if cost_to_go > 0:
+          ratios[name].append(h / cost_to_go)
+
+  print(f"Checked states: {checked}, skipped: {skipped}")
+  print(f"{'Heuristic':<18} | {'Overestimates':>13} | {'Mean h/h*':>9}")
+  print("-" * 46)
+  for name in MULTI_HEURISTICS:
+    mean_ratio = sum(ratios[name]) / len(ratios[name]) if ratios[name] else 1.0
+    print(f"{name:<18} | {violations[name]:>13} | {mean_ratio:>9.3f}")
+
+  if any(violations.values()):
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,58 @@
+import argparse
+import sys
+from pathlib import Path
+from time import perf_counter
+
+from pddl import load_task, solve
+
+PLANNING_DIR = Path(__file__).resolve().parent.parent / "planning"
+
+
+def replay(task, path):
+  """Replays the steps of a path with every action allowed and returns the state reached, or raises
+  ValueError at the first step that is not a successor of the previous state."""
+
+  state = task.initial_state
+  task.helpful_actions = False
+
+  for step in path:
+    successors = {next_step: next_state for next_state, next_step in task.get_next_states(state)}
+    if step not in successors:
+      raise ValueError(f"Invalid step {task.describe_step(step)}")
+    state = successors[step]
+
+  return state
+
+
+def main():
+  parser = argparse.ArgumentParser(
+    description="Smoke run of the PDDL front-end on the repository's own domain and problem."
+  )
+  parser.add_argument("--domain", default=PLANNING_DIR / "domain.pddl")
+  parser.add_argument("--problem", default=PLANNING_DIR / "problem.pddl")
+  parser.add_argument("--algorithm", choices=("astar", "greedy"), default="greedy")
+  parser.add_argument("--weight", type=float, default=1.0)
+  args = parser.parse_args()
+
+  task = load_task(args.domain, args.problem)
+  task.helpful_actions = True
+
+  time_start = perf_counter()
+  total_time, _, path, stats = solve(task, args.algorithm, args.weight)
+  elapsed = perf_counter() - time_start
+
+  print(f"Search time: {elapsed:.2f} [s], expanded nodes: {stats['expanded']}")
+  if path is None:
+    print("No plan found")
+    sys.exit(1)
+
+  state = replay(task, path)
+  if not task.goal(state) or abs(state[0] - total_time) > 1e-9:
+    print(f"The plan ends at {state[0]} without reaching the goal")
+    sys.exit(1)
+
+  print(f"Plan makespan: {total_time} [s], {len(task.plan(path))} actions")
+
+
+if __name__ == "__main__":
+  main()
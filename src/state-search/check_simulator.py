@@ -0,0 +1,98 @@
+import argparse
+import random
+import sys
+
+from cafe import PICKING_UP, Cafe
+from heuristics import get_heuristic
+from instances import random_initial_state, random_walk
+from search_algorithm import A_star
+from simulator import simulate
+
+# Drinks prepared before the plan starts, as the states of `OnlinePlanner` have them
+PREPARED_STATE = (
+  0.0,
+  ("idle", None, 0.0),
+  ("idle", None, 0.0),
+  "bar",
+  False,
+  (),
+  (("table1", "cold"),),
+  (("table1", "cold"),),
+  (),
+)
+
+
+def check_plan(cafe, state, heuristic):
+  """Returns the errors of the simulated optimal plan from a state: a makespan other than its cost
+  or a pickup linked to a task that does not make its drink before it."""
+
+  cost, _, path = A_star(
+    state, cafe.goal, cafe.get_next_states, get_heuristic(heuristic, cafe, state)
+  )
+  tasks, makespan = simulate(cafe, state, path)
+  errors = []
+
+  if abs(makespan - cost) > 1e-9:
+    errors.append(f"the simulated plan takes {makespan} instead of {cost}")
+
+  for task in tasks:
+    operation, drink = cafe.w_actions[task.code] if task.robot == "waiter" else (None, None)
+    if operation != PICKING_UP or task.after == -1:
+      continue
+
+    making = tasks[task.after]
+    if making.robot != "barista" or making.code - 1 != drink:
+      errors.append(f"the pickup at {task.start} waits for {making}")
+    elif making.start + making.duration > task.start + 1e-9:
+      errors.append(f"the pickup at {task.start} starts before {making} finishes")
+
+  return errors
+
+
+def main():
+  parser = argparse.ArgumentParser(
+    description="Checks the plan simulator on optimal plans from states with prepared drinks."
+  )
+  parser.add_argument("--instances", type=int, default=40, help="number of generated instances")
+  parser.add_argument("--orders", type=int, default=4, help="maximum number of orders")
+  parser.add_argument("--heuristic", default="max")
+  parser.add_argument("--seed", type=int, default=0)
+  args = parser.parse_args()
+
+  rng = random.Random(args.seed)
+  failures = 0
+
+  # The fixed case first, then states part way through random plans
+  cafe = Cafe(max_count=2)
+  cases = [(cafe, cafe.encode(PREPARED_STATE))]
+
+  for _ in range(args.instances):
+    n_orders = rng.randint(1, args.orders)
+    cafe = Cafe(max_count=n_orders)
+    tables = cafe.locations[1:]
+    state = cafe.encode(random_initial_state(rng, tables, n_orders, hot_ratio=rng.random()))
+    cases.append(
+      (cafe, random_walk(rng, state, cafe.get_next_states, cafe.goal, rng.randint(0, 6 * n_orders)))
+    )
+
+  for cafe, state in cases:
+    if cafe.goal(state):
+      continue
+
+    try:
+      errors = check_plan(cafe, state, args.heuristic)
+    except ValueError as error:
+      errors = [str(error)]
+
+    if errors:
+      failures += 1
+      print(f"{'; '.join(errors)} at {cafe.decode(state)}")
+
+  print(f"Checked states: {len(cases)}, failures: {failures}")
+
+  if failures:
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,132 @@
+import os
+import pickle
+import struct
+import time as clock
+import zlib
+
+# Each record is its length followed by the zlib-compressed pickle of the record
+RECORD = struct.Struct("<I")
+
+
+class SearchCheckpoint:
+  """Append-only log of a search, to resume it after an interruption.
+
+  The file starts with the initial state, then every save appends one compressed record with the
+  nodes added since the previous save, as (parent, step, state, priority), the nodes expanded since
+  then and the counters. Saves only write what changed, at most once every `interval` seconds, so
+  their cost follows the progress of the search and not its size. The visited table, the closed set
+  and the frontier are rebuilt from the nodes when resuming; a record cut short by a crash is
+  dropped along with the work done after the previous save.
+  """
+
+  def __init__(self, path, interval=60.0):
+    self.path = path
+    self.interval = interval
+    self.nodes = []
+    self.expanded = []
+    self.last_save = clock.perf_counter()
+    self.saves = 0
+
+  # Writing ----------------------------------------------------------------------------------------
+  def write(self, record):
+    """Appends a record and waits until it is on disk."""
+
+    data = zlib.compress(pickle.dumps(record, protocol=5), 1)
+
+    with open(self.path, "ab") as file:
+      file.write(RECORD.pack(len(data)) + data)
+      file.flush()
+      os.fsync(file.fileno())
+
+  def add(self, parent, step, state, priority):
+    """Logs a node added to the search tree."""
+
+    self.nodes.append((parent, step, state, priority))
+
+  def expand(self, node, expanded, counters):
+    """Logs an expanded node, after its successors, and saves if the interval has elapsed."""
+
+    self.expanded.append(node)
+
+    if expanded % 1024 == 0 and clock.perf_counter() - self.last_save >= self.interval:
+      self.save(counters())
+
+  def save(self, counters):
+    """Appends the nodes added and expanded since the previous save."""
+
+    self.write((self.nodes, self.expanded, counters))
+    self.nodes = []
+    self.expanded = []
+    self.last_save = clock.perf_counter()
+    self.saves += 1
+
+  # Reading ----------------------------------------------------------------------------------------
+  def records(self):
+    """Returns the complete records of the file, truncating an incomplete last one."""
+
+    records = []
+    end = 0
+
+    with open(self.path, "r+b") as file:
+      data = file.read()
+
+      while end + RECORD.size <= len(data):
+        (size,) = RECORD.unpack_from(data, end)
+        start = end + RECORD.size
+        if start + size > len(data):
+          break
+        try:
+          records.append(pickle.loads(zlib.decompress(data[start : start + size])))
+        except zlib.error:
+          break
+        end = start + size
+
+      file.truncate(end)
+
+    return records
+
+  def restore(self, initial_state, tree, canonical_state):
+    """Rebuilds a search from the file, or starts the file for a new search.
+
+    Returns None for a new search, else (visited, closed, open nodes as (priority, node, state),
+    counters) with the nodes added to `tree`. Open nodes are the ones not expanded that hold the
+    best g of their state, the others would only be stale entries.
+    """
+
+    records = self.records() if os.path.exists(self.path) else []
+
+    if not records:
+      with open(self.path, "wb"):
+        pass
+      self.write(initial_state)
+      return None
+
+    if records[0] != initial_state:
+      raise ValueError(f"Checkpoint {self.path} belongs to a search from another initial state")
+    if len(records) == 1:
+      return None
+
+    # 1. Replay the tree, the last node of a state holds its best g --------------
+    states = []
+    priorities = []
+    best = {}
+    expanded = set()
+
+    for nodes, expanded_nodes, _ in records[1:]:
+      for parent, step, state, priority in nodes:
+        node = 0 if parent < 0 else tree.add(parent, step)
+        states.append(state)
+        priorities.append(priority)
+        best[canonical_state(state)] = node
+      expanded.update(expanded_nodes)
+
+    # 2. Visited table, closed set and frontier ---------------------------------
+    visited = {canon_state: states[node][0] for canon_state, node in best.items()}
+    closed = {canonical_state(states[node]) for node in expanded}
+    frontier = [
+      (priorities[node], node, states[node])
+      for canon_state, node in best.items()
+      if canon_state not in closed
+    ]
+
+    return visited, closed, frontier, records[-1][2]
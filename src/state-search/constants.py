@@ -10,6 +10,9 @@ TIME_TO_RETURN_TRAY = 0.0
 SPEED_WITH_TRAY = 1.0
 SPEED_WITHOUT_TRAY = 2.0
 
+# Hot drinks must start being delivered before this time after they are made, as in domain.pddl
+HOT_TIME_LIMIT = 4.0
+
 # Distances between locations [meters]
 LOCATIONS_DISTANCE = {
   ("bar", "table1"): 2,
@@ -23,3 +26,20 @@ LOCATIONS_DISTANCE = {
   ("table2", "table4"): 1,
   ("table3", "table4"): 1,
 }
+
+# Tables that take TIME_TO_CLEAN_BIG to clean
+BIG_TABLES = ("table3",)
+
+# Defaults of the durations and speeds a scenario can override, by lowercase constant name
+DURATIONS = {
+  "time_to_make_cold": TIME_TO_MAKE_COLD,
+  "time_to_make_hot": TIME_TO_MAKE_HOT,
+  "time_to_pickup": TIME_TO_PICKUP,
+  "time_to_deliver": TIME_TO_DELIVER,
+  "time_to_clean_big": TIME_TO_CLEAN_BIG,
+  "time_to_clean_small": TIME_TO_CLEAN_SMALL,
+  "time_to_take_tray": TIME_TO_TAKE_TRAY,
+  "time_to_return_tray": TIME_TO_RETURN_TRAY,
+  "speed_with_tray": SPEED_WITH_TRAY,
+  "speed_without_tray": SPEED_WITHOUT_TRAY,
+}
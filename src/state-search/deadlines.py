@@ -0,0 +1,173 @@
+from cafe import DELIVERING, MOVING, PICKING_UP, RETURN_TRAY, TAKE_TRAY, Cafe
+from constants import HOT_TIME_LIMIT
+
+
+class DeadlineCafe(Cafe):
+  """Café where hot drinks cool down, as in `domain.pddl`: the delivery of a hot drink must start
+  less than `hot_time_limit` seconds after the barista finishes it.
+
+  A state is the tuple (time, key, b_finish_time, w_finish_time, hot), the first four fields as in
+  `Cafe` and `hot` the sorted tuple of (deadline, drink, carried) of the hot drinks made and not
+  delivered yet. Drinks of the same kind only differ by their deadline, so the waiter always picks
+  up and delivers the one that expires first.
+
+  A successor is pruned as soon as some hot drink, including the one the barista is making, cannot
+  make its deadline: the bound on the start of its delivery adds the waiter's current action, the
+  fastest travel to the bar and to the table and the pickup still to do. Partial-order reduction is
+  not supported, as two deliveries in a row no longer commute under deadlines, and neither are
+  macro-actions, whose tours ignore the deadlines.
+  """
+
+  def __init__(self, hot_time_limit=HOT_TIME_LIMIT, **options):
+    super().__init__(**options)
+
+    if self.partial_order_reduction:
+      raise ValueError("Partial-order reduction does not support hot drink deadlines")
+    if self.macro_actions:
+      raise ValueError("Macro-actions do not support hot drink deadlines")
+
+    self.hot_time_limit = hot_time_limit
+    self.hot_drinks = [kind == "hot" for _, kind in self.drinks]
+
+    # Fastest travel times with or without the tray, the waiter may still change it at the bar
+    self.min_travel_time = [
+      [min(times) for times in zip(*rows, strict=True)]
+      for rows in zip(*self.travel_time, strict=True)
+    ]
+
+  # Encoding ---------------------------------------------------------------------------------------
+  def encode(self, state):
+    """Packs a readable 9-tuple state, hot drinks already prepared or carried are just made."""
+
+    time, key, b_finish_time, w_finish_time = super().encode(state)
+    deadline = time + self.hot_time_limit
+
+    hot = []
+    for shifts, carried in ((self.prepared_shifts, False), (self.inventory_shifts, True)):
+      for d, count in enumerate(self.counts(key, shifts)):
+        if self.hot_drinks[d]:
+          hot += [(deadline, d, carried)] * count
+
+    return (time, key, b_finish_time, w_finish_time, tuple(sorted(hot)))
+
+  def decode(self, state):
+    """Unpacks a state into the readable 9-tuple form, without the deadlines."""
+
+    return super().decode(state[:4])
+
+  def relative_state(self, state):
+    """`Cafe.relative_state` with the time left before each deadline."""
+
+    time, hot = state[0], state[4]
+
+    return (
+      *super().relative_state(state[:4]),
+      tuple((deadline - time, d, carried) for deadline, d, carried in hot),
+    )
+
+  # Search callbacks -------------------------------------------------------------------------------
+  def get_next_states(self, state):
+    """Generates the successors of `Cafe.get_next_states` that can still meet every deadline."""
+
+    successors = super().get_next_states(state[:4])
+    if not successors:
+      return successors
+
+    hot = self.advance_hot_drinks(state, successors[0][0][0])
+
+    next_states = []
+    for next_state, step in successors:
+      next_state = (*next_state, hot)
+      if self.meets_deadlines(next_state):
+        next_states.append((next_state, step))
+
+    return next_states
+
+  def advance_hot_drinks(self, state, next_event_time):
+    """Applies the actions that finish at the next event to the hot drinks of a state."""
+
+    _, key, b_finish_time, w_finish_time, hot = state
+
+    # Barista finishes making a hot drink
+    b_code = key & self.b_mask
+    if b_finish_time == next_event_time and b_code and self.hot_drinks[b_code - 1]:
+      hot = tuple(sorted((*hot, (b_finish_time + self.hot_time_limit, b_code - 1, False))))
+
+    if w_finish_time != next_event_time:
+      return hot
+
+    # Waiter finishes picking up or delivering the hot drink of that kind that expires first
+    operation, argument = self.w_actions[(key >> self.w_shift) & self.w_mask]
+    if operation not in (PICKING_UP, DELIVERING) or not self.hot_drinks[argument]:
+      return hot
+
+    carried = operation == DELIVERING
+    i = next(i for i, (_, d, in_hand) in enumerate(hot) if d == argument and in_hand == carried)
+
+    if operation == PICKING_UP:
+      return tuple(sorted((*hot[:i], (hot[i][0], argument, True), *hot[i + 1 :])))
+
+    return hot[:i] + hot[i + 1 :]
+
+  def meets_deadlines(self, state):
+    """Checks that a lower bound on the start of every hot drink delivery is before its deadline."""
+
+    _, key, b_finish_time, w_finish_time, hot = state
+
+    b_code = key & self.b_mask
+    making = b_code and self.hot_drinks[b_code - 1]
+    if not hot and not making:
+      return True
+
+    # 1. Waiter position and tray once its current action is over ----------------
+    location = (key >> self.location_shift) & self.location_mask
+    tray = bool(key & self.tray_bit)
+    operation, argument = self.w_actions[(key >> self.w_shift) & self.w_mask]
+
+    if operation == MOVING:
+      location = argument
+    elif operation in (TAKE_TRAY, RETURN_TRAY):
+      tray = operation == TAKE_TRAY
+
+    picking_up = argument if operation == PICKING_UP else None
+    delivering = argument if operation == DELIVERING else None
+
+    # Drinks in hand keep the tray as it is, drinks at the bar may be carried either way
+    travel_time = self.travel_time[1 if tray else 0]
+    to_bar = w_finish_time + self.min_travel_time[location][0]
+    from_bar = self.min_travel_time[0]
+
+    # 2. Earliest delivery start of each hot drink ---------------------------------
+    for deadline, d, carried in hot:
+      table = self.drink_location[d]
+
+      if carried and d == delivering:
+        start = w_finish_time - self.time_to_deliver
+        delivering = None
+      elif carried:
+        start = w_finish_time + travel_time[location][table]
+      elif d == picking_up:
+        start = w_finish_time + travel_time[0][table]
+        picking_up = None
+      else:
+        ready_time = deadline - self.hot_time_limit
+        start = max(to_bar, ready_time) + self.time_to_pickup + from_bar[table]
+
+      if start >= deadline:
+        return False
+
+    # 3. The hot drink being made ------------------------------------------------
+    if making:
+      start = (
+        max(to_bar, b_finish_time) + self.time_to_pickup + from_bar[self.drink_location[b_code - 1]]
+      )
+      if start >= b_finish_time + self.hot_time_limit:
+        return False
+
+    return True
+
+  # World updates ----------------------------------------------------------------------------------
+  def add_events(self, state, time, orders=(), tables_to_clean=()):
+    """`Cafe.add_events`, the hot drinks are kept as they are."""
+
+    return (*super().add_events(state[:4], time, orders, tables_to_clean), state[4])
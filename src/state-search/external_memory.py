@@ -0,0 +1,330 @@
+import hashlib
+import heapq
+import itertools
+import mmap
+import os
+import pickle
+import struct
+import tempfile
+import time as clock
+
+from search_algorithm import canonical_state, record_stats
+
+# Slot of the closed table: 16-byte digest of the canonical state and its g
+SLOT = struct.Struct("<16sd")
+EMPTY = bytes(16)
+
+# Record of the tree index: parent node and offset of the step in the steps file
+NODE = struct.Struct("<qq")
+
+
+def state_digest(canon_state):
+  """Returns the fixed-size key of a canonical state in the closed table."""
+
+  return hashlib.blake2b(pickle.dumps(canon_state, protocol=5), digest_size=16).digest()
+
+
+class DiskHashTable:
+  """Closed set of a search as an open-addressing hash table in a memory-mapped file.
+
+  Slots hold a 16-byte digest of the canonical state and its g, probed linearly; the table doubles
+  into a new file, read and written sequentially, once it is `max_load` full. Only the pages in use
+  stay in RAM, the operating system writes the others back to disk.
+  """
+
+  def __init__(self, path, capacity=1 << 16, max_load=0.7):
+    self.path = path
+    self.max_load = max_load
+    self.count = 0
+    self.open(path, capacity)
+
+  def open(self, path, capacity):
+    """Maps a new empty table of `capacity` slots (a power of two) at `path`."""
+
+    self.capacity = capacity
+    self.mask = capacity - 1
+    self.file = open(path, "w+b")  # noqa: SIM115
+    self.file.truncate(capacity * SLOT.size)
+    self.map = mmap.mmap(self.file.fileno(), 0)
+
+  def close(self):
+    """Unmaps the table, its length stays available."""
+
+    self.map.close()
+    self.file.close()
+
+  def __len__(self):
+    return self.count
+
+  def find(self, digest):
+    """Returns the offset of the slot of a digest, or of the empty slot where it would go."""
+
+    table = self.map
+    size = SLOT.size
+    i = int.from_bytes(digest[:8], "little") & self.mask
+
+    while True:
+      offset = i * size
+      stored = table[offset : offset + 16]
+      if stored in (digest, EMPTY):
+        return offset
+      i = (i + 1) & self.mask
+
+  def get(self, digest, default=None):
+    """Returns the g stored for a digest."""
+
+    offset = self.find(digest)
+    stored, g = SLOT.unpack_from(self.map, offset)
+
+    return default if stored == EMPTY else g
+
+  def __contains__(self, digest):
+    offset = self.find(digest)
+
+    return self.map[offset : offset + 16] != EMPTY
+
+  def __setitem__(self, digest, g):
+    offset = self.find(digest)
+
+    if self.map[offset : offset + 16] == EMPTY:
+      self.count += 1
+    SLOT.pack_into(self.map, offset, digest, g)
+
+    if self.count > self.max_load * self.capacity:
+      self.grow()
+
+  def grow(self):
+    """Rehashes every slot into a table twice as large."""
+
+    old_map, old_file = self.map, self.file
+    new_path = f"{self.path}.grow"
+    self.open(new_path, self.capacity * 2)
+
+    chunk = SLOT.size * 4096
+    for start in range(0, len(old_map), chunk):
+      for digest, g in SLOT.iter_unpack(old_map[start : start + chunk]):
+        if digest != EMPTY:
+          SLOT.pack_into(self.map, self.find(digest), digest, g)
+
+    old_map.close()
+    old_file.close()
+    os.replace(new_path, self.path)
+
+
+class DiskTree:
+  """`SearchTree` on disk: a fixed-size index record per node and the pickled steps."""
+
+  def __init__(self, directory):
+    self.index = open(os.path.join(directory, "tree.index"), "w+b")  # noqa: SIM115
+    self.steps = open(os.path.join(directory, "tree.steps"), "w+b")  # noqa: SIM115
+    self.index.write(NODE.pack(-1, -1))
+    self.size = 1
+
+  def __len__(self):
+    return self.size
+
+  def add(self, parent, step):
+    """Stores a new node and returns its index."""
+
+    offset = self.steps.tell()
+    pickle.dump(step, self.steps, protocol=5)
+    self.index.write(NODE.pack(parent, offset))
+    self.size += 1
+
+    return self.size - 1
+
+  def path(self, node):
+    """Rebuilds the list of steps from the root to the given node."""
+
+    self.index.flush()
+    self.steps.flush()
+    path = []
+
+    while node > 0:
+      self.index.seek(node * NODE.size)
+      node, offset = NODE.unpack(self.index.read(NODE.size))
+      self.steps.seek(offset)
+      path.append(pickle.load(self.steps))
+
+    path.reverse()
+
+    return path
+
+  def close(self):
+    self.index.close()
+    self.steps.close()
+
+
+class BucketQueue:
+  """External priority queue, its entries split by f into buckets of `bucket_width`.
+
+  Entries of later buckets are buffered and appended to the bucket's file in chunks of
+  `buffer_size`. Only the lowest bucket is in memory, as a heap, once `load` has read it back;
+  entries pushed into it or below it while it is being expanded join that heap.
+  """
+
+  def __init__(self, directory, bucket_width=1.0, buffer_size=100_000):
+    self.directory = directory
+    self.bucket_width = bucket_width
+    self.buffer_size = buffer_size
+    self.buffers = {}
+    self.sizes = {}
+    self.heap = []
+    self.current = None
+    self.bytes_written = 0
+
+  def __len__(self):
+    return len(self.heap) + sum(self.sizes.values())
+
+  def bucket_path(self, bucket):
+    return os.path.join(self.directory, f"bucket-{bucket}.pickle")
+
+  def push(self, entry):
+    """Adds an (f, ...) entry."""
+
+    bucket = int(entry[0] // self.bucket_width)
+
+    if self.current is not None and bucket <= self.current:
+      heapq.heappush(self.heap, entry)
+      return
+
+    buffer = self.buffers.setdefault(bucket, [])
+    buffer.append(entry)
+    self.sizes[bucket] = self.sizes.get(bucket, 0) + 1
+
+    if len(buffer) >= self.buffer_size:
+      self.flush(bucket)
+
+  def flush(self, bucket):
+    """Appends the buffer of a bucket to its file."""
+
+    chunk = pickle.dumps(self.buffers.pop(bucket), protocol=5)
+    with open(self.bucket_path(bucket), "ab") as file:
+      file.write(chunk)
+    self.bytes_written += len(chunk)
+
+  def load(self):
+    """Reads the lowest bucket back and returns its entries, the caller turns them into the heap."""
+
+    bucket = min(self.sizes)
+    del self.sizes[bucket]
+    entries = self.buffers.pop(bucket, [])
+
+    path = self.bucket_path(bucket)
+    if os.path.exists(path):
+      with open(path, "rb") as file:
+        while True:
+          try:
+            entries.extend(pickle.load(file))
+          except EOFError:
+            break
+      os.remove(path)
+
+    self.current = bucket
+
+    return entries
+
+
+# External-memory A* Search ------------------------------------------------------------------------
+def external_A_star(
+  initial_state,
+  goal,
+  get_next_states,
+  heuristic,
+  stats=None,
+  canonical_state=canonical_state,
+  directory=None,
+  bucket_width=1.0,
+  buffer_size=100_000,
+  progress=None,
+  progress_every=10_000,
+):
+  """Finds the fastest plan using A* search with the closed set, the frontier and the search tree
+  on disk.
+
+  Successors are not checked against the closed set when generated, they are written to the
+  bucket of their f; duplicates are dropped in bulk when a bucket is read back (delayed duplicate
+  detection) and when popped. RAM holds one bucket of the frontier and the pages of the closed
+  table in use, so instances larger than memory are still solved optimally with a consistent
+  heuristic (use `zero_heuristic` for UCS). The files go to a temporary directory inside
+  `directory`, removed when the search ends; the returned closed table only keeps its length.
+  """
+
+  with tempfile.TemporaryDirectory(prefix="external-search-", dir=directory) as work:
+    tree = DiskTree(work)
+    closed = DiskHashTable(os.path.join(work, "closed.table"))
+    frontier = BucketQueue(work, bucket_width, buffer_size)
+    sequence = itertools.count()
+
+    expanded = generated = duplicates = loads = peak_frontier = 0
+    time_start = clock.perf_counter()
+
+    def counters():
+      return {
+        "expanded": expanded,
+        "generated": generated,
+        "duplicates": duplicates,
+        "peak_frontier": peak_frontier,
+        "visited": len(closed),
+        "bucket_loads": loads,
+        "bytes_written": frontier.bytes_written,
+        "elapsed": clock.perf_counter() - time_start,
+      }
+
+    # Entries: (f, -g, sequence, parent node, step, state), the root has no parent
+    frontier.push((heuristic(initial_state), -0.0, next(sequence), -1, None, initial_state))
+
+    try:
+      while frontier.heap or frontier.sizes:
+        # 1. Read the next bucket back, keeping the best entry of each new state -----
+        if not frontier.heap:
+          loads += 1
+          best = {}
+
+          for entry in frontier.load():
+            digest = state_digest(canonical_state(entry[5]))
+            if digest in closed or (digest in best and best[digest][1] >= entry[1]):
+              duplicates += 1
+              continue
+            if digest in best:
+              duplicates += 1
+            best[digest] = entry
+
+          frontier.heap = list(best.values())
+          heapq.heapify(frontier.heap)
+          continue
+
+        peak_frontier = max(peak_frontier, len(frontier))
+
+        # 2. Expand the best entry of the bucket -------------------------------------
+        _, neg_g, _, parent, step, state = heapq.heappop(frontier.heap)
+        digest = state_digest(canonical_state(state))
+
+        if digest in closed:
+          duplicates += 1
+          continue
+
+        closed[digest] = -neg_g
+        node = 0 if parent < 0 else tree.add(parent, step)
+        expanded += 1
+
+        if progress is not None and expanded % progress_every == 0:
+          progress(counters())
+
+        if goal(state):
+          record_stats(stats, **counters())
+          return -neg_g, closed, tree.path(node)
+
+        next_states = get_next_states(state)
+        generated += len(next_states)
+
+        for next_state, next_step in next_states:
+          next_time = next_state[0]
+          f = next_time + heuristic(next_state)
+          frontier.push((f, -next_time, next(sequence), node, next_step, next_state))
+
+      record_stats(stats, **counters())
+      return float("inf"), None, None
+    finally:
+      tree.close()
+      closed.close()
@@ -0,0 +1,340 @@
+import heapq
+import itertools
+
+from cafe import TRAY_CAPACITY
+
+
+def zero_heuristic(state):
+  """Blind heuristic, A* with it behaves as UCS."""
+
+  return 0.0
+
+
+# Critical path ------------------------------------------------------------------------------------
+class CriticalPath:
+  """Max-of-robots bound on the remaining time.
+
+  The barista still has to finish its current drink and make every other pending one, and the last
+  of them must then be picked up, carried and delivered. The waiter still has to finish its current
+  action, pick up and deliver every drink, clean every dirty table and walk between those places,
+  which takes at least a spanning tree over them. The robots work in parallel, so the bound is the
+  larger of the two and never their sum.
+  """
+
+  def __init__(self, cafe):
+    self.cafe = cafe
+    self.shortest = cafe.distance  # Already the shortest paths of the layout graph
+    self.max_speed = max(cafe.speed_with_tray, cafe.speed_without_tray)
+    self.tail = [
+      cafe.time_to_pickup + self.shortest[0][location] / self.max_speed + cafe.time_to_deliver
+      for location in cafe.drink_location
+    ]
+    self.tree_cache = {}
+
+  def __call__(self, state):
+    return max(self.barista_bound(state), self.waiter_bound(state))
+
+  def barista_bound(self, state):
+    """Remaining barista work plus the fastest delivery of the last drink."""
+
+    time, key, b_finish_time, _ = state[:4]
+    cafe = self.cafe
+
+    h = 0.0
+    tail = float("inf")
+
+    for d, count in enumerate(cafe.counts(key, cafe.orders_shifts)):
+      if count:
+        h += count * cafe.make_cost[d]
+        tail = min(tail, self.tail[d])
+
+    if h == 0.0:
+      return 0.0
+
+    # The drink being made is still counted in the orders
+    b_code = key & cafe.b_mask
+    if b_code:
+      h += b_finish_time - time - cafe.make_cost[b_code - 1]
+
+    return h + tail
+
+  def waiter_bound(self, state):
+    """Remaining waiter actions plus a spanning tree over the places still to visit."""
+
+    time, key, _, w_finish_time = state[:4]
+    cafe = self.cafe
+
+    h = 0.0
+
+    if (key >> cafe.w_shift) & cafe.w_mask:
+      h = w_finish_time - time
+      key = cafe.finish_waiter_action(key)
+
+    location = (key >> cafe.location_shift) & cafe.location_mask
+    orders = cafe.counts(key, cafe.orders_shifts)
+    prepared = cafe.counts(key, cafe.prepared_shifts)
+    inventory = cafe.counts(key, cafe.inventory_shifts)
+
+    required = 1 if key & cafe.tray_bit else 0
+
+    for d, drink_location in enumerate(cafe.drink_location):
+      pending = orders[d] + prepared[d]
+      if pending:
+        h += pending * (cafe.time_to_pickup + cafe.time_to_deliver)
+        required |= 1 | (1 << drink_location)
+      if inventory[d]:
+        h += inventory[d] * cafe.time_to_deliver
+        required |= 1 << drink_location
+
+    tables_to_clean = (key & cafe.clean_field) >> cafe.clean_shift
+    for i, cost in enumerate(cafe.clean_cost):
+      if tables_to_clean >> i & 1:
+        h += cost
+    required |= tables_to_clean
+
+    return h + self.spanning_tree(location, required & ~(1 << location))
+
+  def spanning_tree(self, start, required):
+    """Walking time of a minimum spanning tree over the start and the required locations."""
+
+    cache_key = (start, required)
+    if cache_key in self.tree_cache:
+      return self.tree_cache[cache_key]
+
+    # Prim's algorithm
+    best = {i: self.shortest[start][i] for i in range(len(self.shortest)) if required >> i & 1}
+    total = 0.0
+
+    while best:
+      node = min(best, key=best.get)
+      total += best.pop(node)
+      for other in best:
+        best[other] = min(best[other], self.shortest[node][other])
+
+    self.tree_cache[cache_key] = total / self.max_speed
+    return self.tree_cache[cache_key]
+
+
+# Pattern database ---------------------------------------------------------------------------------
+class PatternDatabase:
+  """Waiter-only pattern databases over projections of the drink counts.
+
+  A pattern is a group of tables. Its abstract state keeps the waiter location and tray, the number
+  of drinks per table of the group still to be picked up (orders plus prepared) or being carried,
+  and the dirty tables of the group. Drinks of other tables and the barista are dropped, which only
+  relaxes the problem, so the exact abstract cost is a lower bound. Abstract costs are computed once
+  with a backward Dijkstra from the abstract goals. The heuristic is the remaining time of the
+  waiter's current action plus the largest value over the patterns.
+  """
+
+  def __init__(self, cafe, state, max_states=100_000):
+    self.cafe = cafe
+
+    n_tables = len(cafe.locations) - 1
+    self.drink_table = [location - 1 for location in cafe.drink_location]
+
+    # Largest number of drinks per table that can show up while solving from this state
+    key = state[1]
+    totals = [0] * n_tables
+    for shifts in (cafe.orders_shifts, cafe.prepared_shifts, cafe.inventory_shifts):
+      for d, count in enumerate(cafe.counts(key, shifts)):
+        totals[self.drink_table[d]] += count
+    tables_to_clean = (key & cafe.clean_field) >> cafe.clean_shift
+    dirty = [bool(tables_to_clean >> (t + 1) & 1) for t in range(n_tables)]
+
+    # Group the busy tables greedily while the abstract space stays small enough
+    self.patterns = []
+    for table in range(n_tables):
+      if not totals[table] and not dirty[table]:
+        continue
+      if self.patterns:
+        group = [*self.patterns[-1], table]
+        if self.space_size(group, totals, dirty) <= max_states:
+          self.patterns[-1] = group
+          continue
+      self.patterns.append([table])
+
+    self.databases = [self.build(pattern, totals, dirty) for pattern in self.patterns]
+
+  def space_size(self, pattern, totals, dirty):
+    """Number of abstract states of a pattern."""
+
+    size = len(self.cafe.locations) * 2 * len(self.carried_vectors(pattern, totals))
+    for table in pattern:
+      size *= (totals[table] + 1) * (2 if dirty[table] else 1)
+
+    return size
+
+  def carried_vectors(self, pattern, totals):
+    """Drink counts per table of the pattern that fit in the waiter's hands."""
+
+    return [
+      carried
+      for carried in itertools.product(*(range(totals[table] + 1) for table in pattern))
+      if sum(carried) <= TRAY_CAPACITY
+    ]
+
+  def build(self, pattern, totals, dirty):
+    """Computes the exact waiter-only cost to the goal of every abstract state of a pattern."""
+
+    locations = [table + 1 for table in pattern]
+    dirty_masks = [
+      mask
+      for mask in range(1 << len(pattern))
+      if all(dirty[t] or not mask >> j & 1 for j, t in enumerate(pattern))
+    ]
+
+    abstract_states = itertools.product(
+      range(len(self.cafe.locations)),
+      (False, True),
+      itertools.product(*(range(totals[table] + 1) for table in pattern)),
+      self.carried_vectors(pattern, totals),
+      dirty_masks,
+    )
+
+    predecessors = {}
+    costs = {}
+    frontier = []
+
+    for abstract_state in abstract_states:
+      predecessors.setdefault(abstract_state, [])
+
+      location, tray, pending, carried, mask = abstract_state
+      if not tray and not any(pending) and not any(carried) and not mask:
+        costs[abstract_state] = 0.0
+        frontier.append((0.0, abstract_state))
+
+      for next_state, cost in self.abstract_successors(abstract_state, locations):
+        predecessors.setdefault(next_state, []).append((abstract_state, cost))
+
+    # Backward Dijkstra from every abstract goal
+    heapq.heapify(frontier)
+
+    while frontier:
+      cost, abstract_state = heapq.heappop(frontier)
+
+      if cost > costs[abstract_state]:
+        continue
+
+      for previous_state, step_cost in predecessors[abstract_state]:
+        new_cost = cost + step_cost
+        if previous_state not in costs or costs[previous_state] > new_cost:
+          costs[previous_state] = new_cost
+          heapq.heappush(frontier, (new_cost, previous_state))
+
+    return costs
+
+  def abstract_successors(self, abstract_state, locations):
+    """Yields the (abstract state, cost) pairs reachable with one waiter action."""
+
+    location, tray, pending, carried, mask = abstract_state
+    cafe = self.cafe
+    carried_size = sum(carried)
+
+    if location == 0 and carried_size == 0:
+      if not tray:
+        yield (location, True, pending, carried, mask), cafe.time_to_take_tray
+      else:
+        yield (location, False, pending, carried, mask), cafe.time_to_return_tray
+
+    if location == 0 and (
+      (not tray and carried_size == 0) or (tray and carried_size < TRAY_CAPACITY)
+    ):
+      for j, count in enumerate(pending):
+        if count:
+          next_pending = pending[:j] + (count - 1,) + pending[j + 1 :]
+          next_carried = carried[:j] + (carried[j] + 1,) + carried[j + 1 :]
+          yield (location, tray, next_pending, next_carried, mask), cafe.time_to_pickup
+
+    for j, table_location in enumerate(locations):
+      if table_location == location:
+        if carried[j]:
+          next_carried = carried[:j] + (carried[j] - 1,) + carried[j + 1 :]
+          yield (location, tray, pending, next_carried, mask), cafe.time_to_deliver
+
+        if mask >> j & 1 and not tray and carried_size == 0:
+          cost = cafe.clean_cost[location]
+          yield (location, tray, pending, carried, mask & ~(1 << j)), cost
+
+    for destination, cost in enumerate(cafe.travel_time[1 if tray else 0][location]):
+      if destination != location:
+        yield (destination, tray, pending, carried, mask), cost
+
+  def __call__(self, state):
+    time, key, _, w_finish_time = state[:4]
+    cafe = self.cafe
+
+    h = 0.0
+
+    if (key >> cafe.w_shift) & cafe.w_mask:
+      h = w_finish_time - time
+      key = cafe.finish_waiter_action(key)
+
+    location = (key >> cafe.location_shift) & cafe.location_mask
+    tray = bool(key & cafe.tray_bit)
+    orders = cafe.counts(key, cafe.orders_shifts)
+    prepared = cafe.counts(key, cafe.prepared_shifts)
+    inventory = cafe.counts(key, cafe.inventory_shifts)
+    tables_to_clean = (key & cafe.clean_field) >> cafe.clean_shift
+
+    pending = [0] * (len(cafe.locations) - 1)
+    carried = [0] * (len(cafe.locations) - 1)
+    for d, table in enumerate(self.drink_table):
+      pending[table] += orders[d] + prepared[d]
+      carried[table] += inventory[d]
+
+    best = 0.0
+    for pattern, costs in zip(self.patterns, self.databases, strict=True):
+      mask = 0
+      for j, table in enumerate(pattern):
+        if tables_to_clean >> (table + 1) & 1:
+          mask |= 1 << j
+
+      abstract_state = (
+        location,
+        tray,
+        tuple(pending[table] for table in pattern),
+        tuple(carried[table] for table in pattern),
+        mask,
+      )
+      best = max(best, costs.get(abstract_state, 0.0))
+
+    return h + best
+
+
+class MaxHeuristic:
+  """Largest value among several admissible heuristics, which is still admissible."""
+
+  def __init__(self, *heuristics):
+    self.heuristics = heuristics
+
+  def __call__(self, state):
+    return max(heuristic(state) for heuristic in self.heuristics)
+
+
+# Suite --------------------------------------------------------------------------------------------
+HEURISTICS = {
+  "zero": lambda cafe, state: zero_heuristic,
+  "original": lambda cafe, state: cafe.heuristic,
+  "count": lambda cafe, state: cafe.heuristic2,
+  "optimistic": lambda cafe, state: cafe.heuristic3,
+  "critical_path": lambda cafe, state: CriticalPath(cafe),
+  "pattern_database": lambda cafe, state: PatternDatabase(cafe, state),
+  "max": lambda cafe, state: MaxHeuristic(CriticalPath(cafe), PatternDatabase(cafe, state)),
+}
+
+# Heuristics whose tables are built from the drinks of the initial state, to rebuild when orders
+# change; the others only depend on the café
+INSTANCE_HEURISTICS = ("pattern_database", "max")
+
+# Heuristics that must never overestimate, `check_heuristics.py` fails if one of them does
+ADMISSIBLE_HEURISTICS = ("zero", "critical_path", "pattern_database", "max")
+
+
+def get_heuristic(name, cafe, initial_state):
+  """Builds the named heuristic for the instance that starts at `initial_state`."""
+
+  if name not in HEURISTICS:
+    raise ValueError(f"Unknown heuristic {name}, expected one of {', '.join(HEURISTICS)}")
+
+  return HEURISTICS[name](cafe, initial_state)
@@ -0,0 +1,90 @@
+from cafe import DRINK_KINDS
+from constants import LOCATIONS_DISTANCE
+
+
+def random_initial_state(rng, tables, n_orders, hot_ratio=0.5, n_dirty=0, location="bar"):
+  """Returns a random readable initial state with idle robots and an empty-handed waiter."""
+
+  orders = tuple(
+    (rng.choice(tables), DRINK_KINDS[1] if rng.random() < hot_ratio else DRINK_KINDS[0])
+    for _ in range(n_orders)
+  )
+  tables_to_clean = tuple(sorted(rng.sample(list(tables), min(n_dirty, len(tables)))))
+
+  return (
+    0.0,
+    ("idle", None, 0.0),
+    ("idle", None, 0.0),
+    location,
+    False,
+    (),
+    orders,
+    (),
+    tables_to_clean,
+  )
+
+
+def random_walk(rng, state, get_next_states, goal, steps):
+  """Follows up to `steps` random successors from a state and returns the last state reached, which
+  is a goal or a dead end when the walk stops early (symmetry breaking in `MultiCafe` can leave an
+  awaiting robot without any action)."""
+
+  for _ in range(steps):
+    next_states = [] if goal(state) else get_next_states(state)
+    if not next_states:
+      break
+
+    state, _ = rng.choice(next_states)
+
+  return state
+
+
+def random_layout(rng, n_tables, big_ratio=0.25):
+  """Returns a random layout with `n_tables` tables on a grid, Manhattan distances from the bar.
+
+  The layout uses the scenario format: {"distances": [[location1, location2, distance], ...],
+  "big_tables": [...]}.
+  """
+
+  side = 2
+  while side * side - 1 < n_tables:
+    side += 1
+
+  cells = [(x, y) for x in range(side) for y in range(side) if (x, y) != (0, 0)]
+  positions = {"bar": (0, 0)}
+  for i, cell in enumerate(rng.sample(cells, n_tables), 1):
+    positions[f"table{i}"] = cell
+
+  locations = list(positions)
+  distances = [
+    [a, b, abs(positions[a][0] - positions[b][0]) + abs(positions[a][1] - positions[b][1])]
+    for i, a in enumerate(locations)
+    for b in locations[i + 1 :]
+  ]
+  big_tables = [table for table in locations[1:] if rng.random() < big_ratio]
+
+  return {"distances": distances, "big_tables": big_tables}
+
+
+def random_scenario(rng, n_orders, hot_ratio=0.5, n_dirty=0, n_tables=None):
+  """Returns a random scenario dict (see `scenarios.build_instance`) with an exact hot/cold mix.
+
+  Without `n_tables` the café layout of `constants.py` is used.
+  """
+
+  scenario = {}
+
+  if n_tables is None:
+    tables = sorted({location for pair in LOCATIONS_DISTANCE for location in pair} - {"bar"})
+  else:
+    scenario["layout"] = random_layout(rng, n_tables)
+    tables = [f"table{i}" for i in range(1, n_tables + 1)]
+
+  n_hot = round(n_orders * hot_ratio)
+  kinds = [DRINK_KINDS[1]] * n_hot + [DRINK_KINDS[0]] * (n_orders - n_hot)
+  rng.shuffle(kinds)
+
+  scenario["orders"] = [[rng.choice(tables), kind] for kind in kinds]
+  scenario["dirty_tables"] = sorted(rng.sample(tables, min(n_dirty, len(tables))))
+
+  return scenario
@@ -0,0 +1,118 @@
+import csv
+import json
+import time as clock
+
+# Phases of `Cafe.get_next_states` timed by `SearchMonitor.attach`
+PHASES = ("advance_events", "get_barista_actions", "get_waiter_actions", "assemble_successors")
+
+
+class SearchMonitor:
+  """Opt-in instrumentation of one search run.
+
+  Pass `monitor.progress` as the `progress` callback of a search algorithm to sample its counters
+  (expansions, generated, duplicates, reopenings, peak frontier...), `monitor.attach(cafe)` to time
+  the phases of successor generation and read the hit rates of its action template caches, and
+  `monitor.wrap_heuristic(h)` to time the heuristic. The
+  counters are sampled every `progress_every` expansions, and `callback`, if given, receives a
+  snapshot at most once every `interval` seconds. Nothing is measured unless the monitor is
+  attached, so searches without one run at full speed.
+  """
+
+  def __init__(self, callback=None, interval=1.0):
+    self.callback = callback
+    self.interval = interval
+    self.phases = {}
+    self.counters = {}
+    self.samples = []
+    self.caches = {}
+    self.time_start = clock.perf_counter()
+    self.last_report = self.time_start
+
+  def timed(self, name, function):
+    """Returns `function` wrapped to accumulate its calls and time under the phase `name`."""
+
+    phase = self.phases.setdefault(name, [0, 0.0])
+    perf_counter = clock.perf_counter
+
+    def wrapper(*args):
+      start = perf_counter()
+      result = function(*args)
+      phase[1] += perf_counter() - start
+      phase[0] += 1
+      return result
+
+    return wrapper
+
+  def attach(self, cafe):
+    """Times the phases of `cafe.get_next_states`, by shadowing its methods on the instance, and
+    keeps its action template caches for the report."""
+
+    for name in PHASES:
+      # `MultiCafe` has no `assemble_successors`
+      if hasattr(cafe, name):
+        setattr(cafe, name, self.timed(name, getattr(cafe, name)))
+
+    # `MultiCafe` has no template caches
+    for robot, name in (("barista", "b_templates"), ("waiter", "w_templates")):
+      if hasattr(cafe, name):
+        self.caches[robot] = getattr(cafe, name)
+
+    return cafe
+
+  def wrap_heuristic(self, heuristic):
+    """Returns the heuristic wrapped to time its evaluations."""
+
+    return self.timed("heuristic", heuristic)
+
+  def snapshot(self):
+    """Returns the elapsed time, the last counters and the time spent in each phase."""
+
+    return {
+      "elapsed": clock.perf_counter() - self.time_start,
+      **self.counters,
+      **{f"{name}_time": seconds for name, (_, seconds) in self.phases.items()},
+    }
+
+  def progress(self, counters):
+    """Progress callback for the search algorithms."""
+
+    self.counters = counters
+    self.samples.append(self.snapshot())
+
+    now = clock.perf_counter()
+    if self.callback is not None and now - self.last_report >= self.interval:
+      self.last_report = now
+      self.callback(self.samples[-1])
+
+  def finish(self, stats):
+    """Records the final counters from the `stats` dict filled by the search."""
+
+    self.counters = dict(stats)
+    self.samples.append(self.snapshot())
+
+  def report(self):
+    """Returns every measurement as a JSON-friendly dict."""
+
+    return {
+      "elapsed": clock.perf_counter() - self.time_start,
+      "counters": self.counters,
+      "phases": {
+        name: {"calls": calls, "time": seconds} for name, (calls, seconds) in self.phases.items()
+      },
+      "template_caches": {robot: cache.stats() for robot, cache in self.caches.items()},
+      "samples": self.samples,
+    }
+
+  def export(self, path):
+    """Writes the report to a .json file, or the progress samples to a .csv file (one row per
+    sample, the last row holds the final counters)."""
+
+    if str(path).endswith(".csv"):
+      columns = list(dict.fromkeys(column for sample in self.samples for column in sample))
+      with open(path, "w", newline="") as file:
+        writer = csv.DictWriter(file, columns)
+        writer.writeheader()
+        writer.writerows(self.samples)
+    else:
+      with open(path, "w") as file:
+        json.dump(self.report(), file, indent=2)
@@ -0,0 +1,62 @@
+import json
+
+try:
+  import numpy as np
+except ImportError:  # Falls back to the pure Python Floyd-Warshall
+  np = None
+
+LAYOUT_FIELDS = ("distances", "big_tables")
+
+
+def read_layout(path):
+  """Returns the layout of a JSON file {"distances": [[location1, location2, distance], ...],
+  "big_tables": [...]}, the distances being the edges of the café graph."""
+
+  with open(path) as file:
+    layout = json.load(file)
+
+  unknown = set(layout) - set(LAYOUT_FIELDS)
+  if unknown:
+    raise ValueError(f"Unknown layout fields in {path}: {', '.join(sorted(unknown))}")
+
+  return layout
+
+
+def distance_matrix(locations, distances):
+  """Returns the all-pairs shortest distances between locations, as lists indexed by location.
+
+  `distances` maps (location1, location2) pairs to the length of the edge between them, in either
+  direction; locations that are not neighbours are reached through the shortest path (vectorized
+  Floyd-Warshall with NumPy when available).
+  """
+
+  n = len(locations)
+  index = {location: i for i, location in enumerate(locations)}
+
+  # 1. Edges of the graph ------------------------------------------------------
+  matrix = [[0.0 if i == j else float("inf") for j in range(n)] for i in range(n)]
+  for (location1, location2), distance in distances.items():
+    i, j = index[location1], index[location2]
+    matrix[i][j] = matrix[j][i] = min(matrix[i][j], float(distance))
+
+  # 2. Shortest paths through every intermediate location ----------------------
+  if np is not None:
+    array = np.array(matrix)
+    for k in range(n):
+      np.minimum(array, array[:, k, None] + array[None, k, :], out=array)
+    matrix = array.tolist()
+  else:
+    for k in range(n):
+      row_k = matrix[k]
+      for row in matrix:
+        through_k = row[k]
+        for j in range(n):
+          if through_k + row_k[j] < row[j]:
+            row[j] = through_k + row_k[j]
+
+  for i, row in enumerate(matrix):
+    for j, distance in enumerate(row):
+      if distance == float("inf"):
+        raise ValueError(f"No path between {locations[i]} and {locations[j]}")
+
+  return matrix
@@ -0,0 +1,442 @@
+from cafe import (
+  CLEANING,
+  DELIVERING,
+  IDLE,
+  MOVING,
+  PICKING_UP,
+  RETURN_TRAY,
+  TAKE_TRAY,
+  TRAY_CAPACITY,
+  Cafe,
+)
+from constants import BIG_TABLES, LOCATIONS_DISTANCE
+from heuristics import zero_heuristic
+
+# Action code of a robot whose action just finished and that waits for its next decision
+AWAITING = -1
+
+
+class MultiCafe:
+  """Café with any number of baristas and waiters.
+
+  A state is the tuple (time, key, baristas, waiters). `key` is a `Cafe` key that only holds the
+  shared world: tables to clean, orders not started yet and prepared drinks not picked up yet.
+  `baristas` holds one (action code, finish time) pair per barista, and `waiters` one (action code,
+  finish time, location, tray, inventory) record per waiter, the inventory packing its drink counts.
+  The codes are the `Cafe` ones, plus `AWAITING`.
+
+  Joint actions are never enumerated: each successor gives an action to the first robot awaiting
+  a decision, at the same time, and the clock only moves to the next event once every robot is
+  busy or idle. The branching factor is then the sum of the robot choices instead of their
+  product. Orders, prepared drinks and dirty tables are reserved when a robot starts working on
+  them, so two robots never take the same one.
+
+  Identical robots (any two baristas, or waiters with the same location, tray and inventory) that
+  decide at the same time must pick non-decreasing action codes, and `canonical_state` sorts the
+  robots, so states that only differ by a permutation of identical robots are merged. Pass it as
+  the `canonical_state` of the search algorithms.
+  """
+
+  def __init__(
+    self,
+    baristas=1,
+    waiters=2,
+    max_count=15,
+    distances=LOCATIONS_DISTANCE,
+    big_tables=BIG_TABLES,
+    durations=None,
+  ):
+    if baristas < 1 or waiters < 1:
+      raise ValueError("A café needs at least one barista and one waiter")
+
+    self.n_baristas = baristas
+    self.n_waiters = waiters
+
+    # The layout, durations, action codes and shared key layout are the single-robot ones
+    self.cafe = cafe = Cafe(
+      max_count=max_count, distances=distances, big_tables=big_tables, durations=durations
+    )
+
+    self.locations = cafe.locations
+    self.drinks = cafe.drinks
+    self.make_cost = cafe.make_cost
+    self.clean_cost = cafe.clean_cost
+    self.drink_location = cafe.drink_location
+    self.w_actions = cafe.w_actions
+    self.w_codes = cafe.w_codes
+
+    self.count_mask = cafe.count_mask
+    self.inventory_shifts = [d * cafe.count_bits for d in range(len(self.drinks))]
+
+    # Duration of each waiter action code, moves depend on the location and the tray
+    self.w_durations = [
+      {
+        IDLE: 0.0,
+        TAKE_TRAY: cafe.time_to_take_tray,
+        RETURN_TRAY: cafe.time_to_return_tray,
+        PICKING_UP: cafe.time_to_pickup,
+        DELIVERING: cafe.time_to_deliver,
+        CLEANING: cafe.clean_cost[argument] if operation == CLEANING else 0.0,
+      }.get(operation)
+      for operation, argument in self.w_actions
+    ]
+
+  # Encoding ---------------------------------------------------------------------------------------
+  def initial_state(self, orders, tables_to_clean=(), waiter_locations=None):
+    """Returns the state at time zero, every robot awaits a decision and waiters start without
+    the tray at `waiter_locations` (all at the bar by default)."""
+
+    cafe = self.cafe
+    _, key, _, _ = cafe.encode(
+      (0.0, ("idle", None, 0.0), ("idle", None, 0.0), "bar", False, (), orders, (), tables_to_clean)
+    )
+
+    if waiter_locations is None:
+      waiter_locations = ("bar",) * self.n_waiters
+    if len(waiter_locations) != self.n_waiters:
+      raise ValueError(f"Expected {self.n_waiters} waiter locations")
+
+    baristas = ((AWAITING, 0.0),) * self.n_baristas
+    waiters = tuple(
+      (AWAITING, 0.0, cafe.location_index[location], False, 0) for location in waiter_locations
+    )
+
+    return (0.0, key, baristas, waiters)
+
+  def canonical_state(self, state):
+    """Canonical key without the clock and with the robots sorted, so that identical robots are
+    interchangeable.
+
+    Sorting the few robot records is cheap next to the dict lookups of the search: an incremental
+    hash carried by the states needs a key object with Python-level hashing and equality, and
+    tracking those objects in the garbage collector costs more than the sorts it saves.
+    """
+
+    _, key, baristas, waiters = state
+
+    return (key, tuple(sorted(baristas)), tuple(sorted(waiters)))
+
+  def w_duration(self, code, location, tray):
+    """Returns the duration of a waiter action started at a location."""
+
+    duration = self.w_durations[code]
+    if duration is None:
+      duration = self.cafe.travel_time[1 if tray else 0][location][self.w_actions[code][1]]
+
+    return duration
+
+  def describe_step(self, step):
+    """Returns a plan step as readable (time, robot, action, data, finish time)."""
+
+    time, role, index, code, finish_time = step
+
+    if role == "barista":
+      action, data = self.cafe.b_actions[code]
+    else:
+      action, data = self.cafe.describe_w_action(code)
+
+    return (time, f"{role}{index + 1}", action, data, finish_time)
+
+  def format_step(self, step):
+    """Formats a plan step (time, robot, task) as a table row."""
+
+    time, robot, action, data, finish_time = self.describe_step(step)
+
+    return f"{time:^8} | {robot:<9} | {action}, {data}, {finish_time}"
+
+  # Search callbacks -------------------------------------------------------------------------------
+  def get_next_states(self, state):
+    """Generates the successors that give an action to the first robot awaiting a decision.
+
+    Each successor comes with its plan step (time, "barista"|"waiter", robot index, action code,
+    finish time).
+    """
+
+    time, key, baristas, waiters = state
+
+    # 1. Decide the first awaiting robot, baristas first -------------------------
+    for i, barista in enumerate(baristas):
+      if barista[0] == AWAITING:
+        tasks = self.get_barista_actions(state, i)
+        role = "barista"
+        break
+    else:
+      for i, waiter in enumerate(waiters):
+        if waiter[0] == AWAITING:
+          tasks = self.get_waiter_actions(state, i)
+          role = "waiter"
+          break
+      else:
+        # Every robot is busy, only in states not built by `get_next_states`
+        return self.get_next_states(self.advance_events(state))
+
+    # 2. Apply each task, move to the next event once nobody awaits --------------
+    successors = []
+
+    for next_key, robot in tasks:
+      if role == "barista":
+        next_state = (time, next_key, (*baristas[:i], robot, *baristas[i + 1 :]), waiters)
+      else:
+        next_state = (time, next_key, baristas, (*waiters[:i], robot, *waiters[i + 1 :]))
+
+      if not any(b[0] == AWAITING for b in next_state[2]) and not any(
+        w[0] == AWAITING for w in next_state[3]
+      ):
+        next_state = self.advance_events(next_state)
+
+      successors.append((next_state, (time, role, i, robot[0], robot[1])))
+
+    return successors
+
+  def advance_events(self, state):
+    """Moves the clock to the next finish time and applies the effects of the actions that finish
+    then. Those robots, and idle ones, await a decision at that time."""
+
+    time, key, baristas, waiters = state
+
+    # 1. Find the time of the next event -----------------------------------------
+    finish_times = [finish for code, finish in baristas if code > 0]
+    finish_times += [waiter[1] for waiter in waiters if waiter[0] > 0]
+    next_event_time = min(finish_times, default=time)
+
+    # 2. Update the robots whose actions just finished ---------------------------
+    # Baristas finish making a drink, the order was taken when they started
+    new_baristas = []
+    for code, finish_time in baristas:
+      if code > 0 and finish_time == next_event_time:
+        key += 1 << self.cafe.prepared_shifts[code - 1]
+      if code == 0 or finish_time == next_event_time:
+        code, finish_time = AWAITING, next_event_time
+      new_baristas.append((code, finish_time))
+
+    new_waiters = []
+    for waiter in waiters:
+      code, finish_time = waiter[0], waiter[1]
+      if code > 0 and finish_time == next_event_time:
+        waiter = self.finish_waiter_action(waiter)
+      if code == 0 or finish_time == next_event_time:
+        waiter = (AWAITING, next_event_time, *waiter[2:])
+      new_waiters.append(waiter)
+
+    return (next_event_time, key, tuple(new_baristas), tuple(new_waiters))
+
+  def finish_waiter_action(self, waiter):
+    """Applies the effect of a waiter's current action to its record, shared resources were
+    reserved when the action started."""
+
+    code, finish_time, location, tray, inventory = waiter
+    operation, argument = self.w_actions[code]
+
+    if operation == MOVING:
+      location = argument
+    elif operation == TAKE_TRAY:
+      tray = True
+    elif operation == RETURN_TRAY:
+      tray = False
+    elif operation == PICKING_UP:
+      inventory += 1 << self.inventory_shifts[argument]
+    elif operation == DELIVERING:
+      inventory -= 1 << self.inventory_shifts[argument]
+
+    return (code, finish_time, location, tray, inventory)
+
+  def lowest_code(self, robots, i, time, profile, duration):
+    """Lowest action code robot `i` may take: the largest one taken at `time` by an identical
+    robot decided before it, which breaks the symmetry between interchangeable robots."""
+
+    lowest = 0
+    for robot in robots[:i]:
+      code = robot[0]
+      if code != AWAITING and robot[2:] == profile and robot[1] == time + duration(robot):
+        lowest = max(lowest, code)
+
+    return lowest
+
+  def get_barista_actions(self, state, i):
+    """Returns the possible (key, barista record) tasks of the awaiting barista `i`."""
+
+    time, key, baristas, _ = state
+    cafe = self.cafe
+
+    lowest = self.lowest_code(
+      baristas, i, time, (), lambda b: self.make_cost[b[0] - 1] if b[0] else 0.0
+    )
+
+    actions = []
+    orders = cafe.counts(key, cafe.orders_shifts)
+
+    # Barista can make drinks, taking the order
+    for d, count in enumerate(orders):
+      if count and d + 1 >= lowest:
+        actions.append((key - (1 << cafe.orders_shifts[d]), (d + 1, time + self.make_cost[d])))
+
+    # Barista can idle if there is nothing else to do
+    if not any(orders):
+      actions.append((key, (0, time)))
+
+    return actions
+
+  def get_waiter_actions(self, state, i):
+    """Returns the possible (key, waiter record) tasks of the awaiting waiter `i`."""
+
+    time, key, _, waiters = state
+    cafe = self.cafe
+    w_codes = self.w_codes
+
+    _, _, location, tray, inventory = waiters[i]
+    lowest = self.lowest_code(
+      waiters, i, time, (location, tray, inventory), lambda w: self.w_duration(w[0], w[2], w[3])
+    )
+
+    prepared = cafe.counts(key, cafe.prepared_shifts)
+    carried = [(inventory >> shift) & self.count_mask for shift in self.inventory_shifts]
+    inventory_size = sum(carried)
+
+    actions = []
+
+    def add(next_key, operation, argument, duration):
+      code = w_codes[(operation, argument)]
+      if code >= lowest:
+        actions.append((next_key, (code, time + duration, location, tray, inventory)))
+
+    # Waiter can take or return the tray
+    if location == 0 and inventory_size == 0:
+      if not tray:
+        add(key, TAKE_TRAY, True, cafe.time_to_take_tray)
+      else:
+        add(key, RETURN_TRAY, False, cafe.time_to_return_tray)
+
+    # Waiter can pickup drinks from the bar, taking them from the other waiters
+    if location == 0 and (
+      (not tray and inventory_size == 0) or (tray and inventory_size < TRAY_CAPACITY)
+    ):
+      for d, count in enumerate(prepared):
+        if count:
+          add(key - (1 << cafe.prepared_shifts[d]), PICKING_UP, d, cafe.time_to_pickup)
+
+    # Waiter can deliver drinks if he is at the right table
+    relevant = 1  # bitmask over locations, the bar is always relevant
+    for d, count in enumerate(carried):
+      if count:
+        if self.drink_location[d] == location:
+          add(key, DELIVERING, d, cafe.time_to_deliver)
+        relevant |= 1 << self.drink_location[d]
+
+    # Waiter can clean dirty tables, taking them from the other waiters
+    tables_to_clean = (key & cafe.clean_field) >> cafe.clean_shift
+    if tables_to_clean >> location & 1 and not tray and inventory_size == 0:
+      add(key & ~cafe.clean_bits[location], CLEANING, location, self.clean_cost[location])
+
+    # Waiter can walk to another location
+    relevant = (relevant | tables_to_clean) & ~(1 << location)
+    travel_time = cafe.travel_time[1 if tray else 0][location]
+
+    while relevant:
+      destination = (relevant & -relevant).bit_length() - 1
+      relevant &= relevant - 1
+      add(key, MOVING, destination, travel_time[destination])
+
+    # Waiter can idle if there is nothing else to do, or let another waiter do it
+    if self.n_waiters > 1 or (
+      not tray and not any(prepared) and inventory_size == 0 and not tables_to_clean
+    ):
+      add(key, IDLE, None, 0.0)
+
+    return actions
+
+  def goal(self, state):
+    """Checks that every drink is delivered, every table is clean and every robot is idle."""
+
+    _, key, baristas, waiters = state
+
+    return (
+      not key
+      and all(code <= 0 for code, _ in baristas)
+      and all(code <= 0 and not tray and not inventory for code, _, _, tray, inventory in waiters)
+    )
+
+
+# Heuristics ---------------------------------------------------------------------------------------
+class MultiRobotBound:
+  """Admissible bound on the remaining time with several robots.
+
+  Every robot must finish its current action. The pending barista work is shared by the baristas
+  at best evenly, and the last drink must then be picked up, carried and delivered. Every drink
+  still has to be picked up and/or delivered and every dirty table cleaned, which the waiters also
+  share at best evenly; walking is ignored there. Any single order takes at least its making time
+  plus its delivery tail.
+  """
+
+  def __init__(self, multi_cafe):
+    self.multi_cafe = multi_cafe
+    cafe = multi_cafe.cafe
+
+    max_speed = max(cafe.speed_with_tray, cafe.speed_without_tray)
+    self.tail = [
+      cafe.time_to_pickup + cafe.distance[0][location] / max_speed + cafe.time_to_deliver
+      for location in cafe.drink_location
+    ]
+
+  def __call__(self, state):
+    time, key, baristas, waiters = state
+    multi_cafe = self.multi_cafe
+    cafe = multi_cafe.cafe
+
+    # 1. Current actions ---------------------------------------------------------
+    h = 0.0
+    for robot in (*baristas, *waiters):
+      h = max(h, robot[1] - time)
+
+    # 2. Barista work and the tail of every drink still to make ------------------
+    orders = cafe.counts(key, cafe.orders_shifts)
+    b_work = 0.0
+    tail = float("inf")
+    for d, count in enumerate(orders):
+      if count:
+        b_work += count * multi_cafe.make_cost[d]
+        tail = min(tail, self.tail[d])
+        h = max(h, multi_cafe.make_cost[d] + self.tail[d])
+    for code, finish_time in baristas:
+      if code > 0:
+        b_work += finish_time - time
+    if b_work and tail < float("inf"):
+      h = max(h, b_work / multi_cafe.n_baristas + tail)
+
+    # 3. Waiter work -------------------------------------------------------------
+    in_progress = sum(1 for code, _ in baristas if code > 0)
+    to_pickup = sum(orders) + in_progress + sum(cafe.counts(key, cafe.prepared_shifts))
+    w_work = to_pickup * (cafe.time_to_pickup + cafe.time_to_deliver)
+
+    for code, finish_time, _, _, inventory in waiters:
+      w_work += max(finish_time - time, 0.0)
+
+      # A drink being delivered leaves the inventory when the delivery finishes, its remaining
+      # time is already counted
+      if code > 0 and multi_cafe.w_actions[code][0] == DELIVERING:
+        inventory -= 1 << multi_cafe.inventory_shifts[multi_cafe.w_actions[code][1]]
+
+      for shift in multi_cafe.inventory_shifts:
+        w_work += ((inventory >> shift) & multi_cafe.count_mask) * cafe.time_to_deliver
+
+    for location, bit in enumerate(cafe.clean_bits):
+      if key & bit:
+        w_work += multi_cafe.clean_cost[location]
+
+    return max(h, w_work / multi_cafe.n_waiters)
+
+
+MULTI_HEURISTICS = {
+  "zero": lambda multi_cafe: zero_heuristic,
+  "critical_path": MultiRobotBound,
+}
+
+
+def get_multi_heuristic(name, multi_cafe):
+  """Builds the named heuristic for a `MultiCafe`."""
+
+  if name not in MULTI_HEURISTICS:
+    raise ValueError(
+      f"Unknown multi-robot heuristic {name}, expected one of {', '.join(MULTI_HEURISTICS)}"
+    )
+
+  return MULTI_HEURISTICS[name](multi_cafe)
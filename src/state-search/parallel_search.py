@@ -0,0 +1,300 @@
+import heapq
+import multiprocessing
+import os
+import queue
+import time as clock
+
+from search_algorithm import SearchTree, canonical_state, record_stats
+
+# Messages sent to a worker inbox besides successor batches
+STOP, PATH, EXIT = "stop", "path", "exit"
+
+
+def owner_of(canon_state, n_workers):
+  """Worker that owns a canonical state (hash distribution)."""
+
+  return hash(canon_state) % n_workers
+
+
+def hda_worker(
+  worker_id,
+  n_workers,
+  goal,
+  get_next_states,
+  heuristic,
+  canonical_state,
+  inboxes,
+  results,
+  incumbent,
+  idle,
+  sent,
+  received,
+  batch_size,
+):
+  """Runs the open/closed lists of the states owned by one worker of HDA*.
+
+  Parent pointers are global references `node * n_workers + worker_id`, so the plan can be rebuilt
+  across workers once the search is over. A worker whose coordinator died (e.g. killed on a
+  timeout) exits instead of polling its inbox forever.
+  """
+
+  inbox = inboxes[worker_id]
+  coordinator = os.getppid()
+  tree = SearchTree()
+  frontier = []
+  visited = {}
+  closed = set()
+  buffers = [[] for _ in range(n_workers)]
+  expanded = generated = stale = reopened = 0
+
+  def orphaned():
+    # Nobody reads the queues once the coordinator is gone, their feeder threads must not be waited
+    if os.getppid() == coordinator:
+      return False
+    for pipe in (*inboxes, results):
+      pipe.cancel_join_thread()
+    return True
+
+  def flush(owner):
+    sent[worker_id] += 1
+    inboxes[owner].put(buffers[owner])
+    buffers[owner] = []
+
+  def receive(batch):
+    nonlocal reopened
+
+    for state, parent, step in batch:
+      canon_state = canonical_state(state)
+      g = state[0]
+
+      if canon_state not in visited or visited[canon_state] > g:
+        if canon_state in closed:
+          closed.discard(canon_state)
+          reopened += 1
+
+        visited[canon_state] = g
+        node = 0 if parent is None else tree.add(parent, step)
+        ref = node * n_workers + worker_id
+        heapq.heappush(frontier, (g + heuristic(state), -g, ref, state))
+
+  while True:
+    # 1. Read incoming batches, block only when there is nothing to expand --------
+    has_work = bool(frontier) and frontier[0][0] < incumbent.value
+    try:
+      message = inbox.get_nowait() if has_work else inbox.get(timeout=0.01)
+    except queue.Empty:
+      message = None
+
+    if message == STOP:
+      break
+    if orphaned():
+      return
+
+    if message is not None:
+      idle[worker_id] = 0
+      receive(message)
+      received[worker_id] += 1
+      continue
+
+    # 2. Expand a few nodes whose f can still beat the incumbent ------------------
+    for _ in range(batch_size):
+      if not frontier or frontier[0][0] >= incumbent.value:
+        break
+
+      f, neg_g, ref, state = heapq.heappop(frontier)
+      canon_state = canonical_state(state)
+
+      if canon_state in closed or visited[canon_state] < -neg_g:
+        stale += 1
+        continue
+
+      closed.add(canon_state)
+      expanded += 1
+
+      if goal(state):
+        with incumbent.get_lock():
+          if -neg_g < incumbent.value:
+            incumbent.value = -neg_g
+            results.put(("goal", -neg_g, ref))
+        continue
+
+      for next_state, step in get_next_states(state):
+        generated += 1
+        owner = owner_of(canonical_state(next_state), n_workers)
+        if owner == worker_id:
+          receive([(next_state, ref, step)])
+        else:
+          buffers[owner].append((next_state, ref, step))
+
+    # 3. Send the successors of other workers in batches ---------------------------
+    for owner in range(n_workers):
+      if buffers[owner]:
+        flush(owner)
+
+    if not frontier or frontier[0][0] >= incumbent.value:
+      idle[worker_id] = 1
+
+  # Answer path queries until the coordinator is done with the plan
+  results.put(
+    (
+      "stats",
+      worker_id,
+      {
+        "expanded": expanded,
+        "generated": generated,
+        "stale": stale,
+        "reopened": reopened,
+      },
+      visited,
+    )
+  )
+
+  while True:
+    try:
+      message = inbox.get(timeout=1.0)
+    except queue.Empty:
+      if orphaned():
+        return
+      continue
+    if message == EXIT:
+      break
+    if message[0] != PATH:
+      continue
+    _, node = message
+    results.put(("node", tree.parents[node], tree.steps[node]))
+
+
+def HDA_star(
+  initial_state,
+  goal,
+  get_next_states,
+  heuristic,
+  n_workers=None,
+  stats=None,
+  canonical_state=canonical_state,
+  batch_size=64,
+):
+  """Finds the fastest plan using Hash-Distributed A* over several processes.
+
+  Canonical states are hashed to worker processes, each with its own open and closed lists, and
+  successors travel in batches over queues. A goal found by a worker only becomes the incumbent:
+  the search stops when every worker is idle (nothing left with f below the incumbent) and every
+  sent batch has been received, checked twice in a row, so the incumbent is optimal for an
+  admissible heuristic. Returns (total time, visited, path) as `A_star` does, the visited table
+  merging the disjoint tables of the workers.
+
+  Canonical states must hash the same way in every worker: the default keys are tuples of numbers,
+  and workers are forked when the platform allows it. The caller must not be a daemonic process,
+  which cannot start the workers; they are terminated if the search is interrupted.
+  """
+
+  n_workers = n_workers or multiprocessing.cpu_count()
+  methods = multiprocessing.get_all_start_methods()
+  context = multiprocessing.get_context("fork" if "fork" in methods else None)
+
+  inboxes = [context.Queue() for _ in range(n_workers)]
+  results = context.Queue()
+  incumbent = context.Value("d", float("inf"))
+  idle = context.Array("b", n_workers, lock=False)
+  sent = context.Array("q", n_workers, lock=False)
+  received = context.Array("q", n_workers, lock=False)
+
+  workers = [
+    context.Process(
+      target=hda_worker,
+      args=(
+        worker_id,
+        n_workers,
+        goal,
+        get_next_states,
+        heuristic,
+        canonical_state,
+        inboxes,
+        results,
+        incumbent,
+        idle,
+        sent,
+        received,
+        batch_size,
+      ),
+      daemon=True,
+    )
+    for worker_id in range(n_workers)
+  ]
+  for worker in workers:
+    worker.start()
+
+  try:
+    # The root is node 0 of its owner
+    root_owner = owner_of(canonical_state(initial_state), n_workers)
+    sent[root_owner] += 1
+    inboxes[root_owner].put([(initial_state, None, None)])
+
+    # Termination: two identical snapshots with every worker idle and no batch in flight
+    best = (float("inf"), None)
+    previous_snapshot = None
+
+    while True:
+      try:
+        while True:
+          message = results.get(timeout=0.01)
+          if message[0] == "goal" and message[1] < best[0]:
+            best = (message[1], message[2])
+      except queue.Empty:
+        pass
+
+      snapshot = (all(idle), sum(sent), sum(received))
+      if snapshot[0] and snapshot[1] == snapshot[2] and snapshot == previous_snapshot:
+        break
+      previous_snapshot = snapshot
+      clock.sleep(0.005)
+
+    for inbox in inboxes:
+      inbox.put(STOP)
+
+    # Collect the worker counters and visited tables, goal messages may still be queued before them
+    total = {"expanded": 0, "generated": 0, "stale": 0, "reopened": 0}
+    visited = {}
+    pending = n_workers
+    while pending:
+      message = results.get()
+      if message[0] == "goal":
+        if message[1] < best[0]:
+          best = (message[1], message[2])
+      elif message[0] == "stats":
+        pending -= 1
+        for name, value in message[2].items():
+          total[name] += value
+        visited.update(message[3])
+
+    # Rebuild the plan by following the global parent references
+    total_time, ref = best
+    path = []
+
+    while ref is not None:
+      node, worker_id = divmod(ref, n_workers)
+      if node == 0:
+        break
+      inboxes[worker_id].put((PATH, node))
+      _, ref, step = results.get()
+      path.append(step)
+
+    path.reverse()
+
+    for inbox in inboxes:
+      inbox.put(EXIT)
+    for worker in workers:
+      worker.join()
+  finally:
+    # An interrupted search (timeout, Ctrl+C) leaves the workers running
+    for worker in workers:
+      if worker.is_alive():
+        worker.terminate()
+        worker.join()
+
+  record_stats(stats, **total, visited=len(visited))
+
+  if total_time == float("inf"):
+    return float("inf"), None, None
+
+  return total_time, visited, path
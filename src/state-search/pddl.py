@@ -0,0 +1,1163 @@
+import argparse
+import hashlib
+import heapq
+import itertools
+import pickle
+import re
+from collections import namedtuple
+from pathlib import Path
+from time import perf_counter
+
+from search_algorithm import GBFS, UCS, A_star
+
+# Bump when the pickled task format changes, so stale cache files are ignored
+CACHE_VERSION = b"pddl-task-3"
+
+COMPARISONS = {
+  "<": lambda a, b: a < b,
+  "<=": lambda a, b: a <= b,
+  ">": lambda a, b: a > b,
+  ">=": lambda a, b: a >= b,
+  "=": lambda a, b: a == b,
+}
+OPERATIONS = {
+  "+": lambda a, b: a + b,
+  "-": lambda a, b: a - b,
+  "*": lambda a, b: a * b,
+  "/": lambda a, b: a / b,
+}
+ASSIGNMENTS = {
+  "assign": lambda old, value: value,
+  "increase": lambda old, value: old + value,
+  "decrease": lambda old, value: old - value,
+  "scale-up": lambda old, value: old * value,
+  "scale-down": lambda old, value: old / value,
+}
+# The operator of the negated comparison, and of the comparison with its sides swapped
+NEGATED = {"<": ">=", "<=": ">", ">": "<=", ">=": "<", "=": "!=", "!=": "="}
+MIRRORED = {"<": ">", "<=": ">=", ">": "<", ">=": "<=", "=": "=", "!=": "!="}
+
+# Ground conditions are bitmasks of facts that must be true or false, plus the formulas that are not
+# plain literals (disjunctions, numeric comparisons). Ground effects are bitmasks of added and
+# deleted facts, plus (operation, fluent index, expression) numeric effects.
+Condition = namedtuple("Condition", ["positive", "negative", "formulas"])
+Effects = namedtuple("Effects", ["add", "delete", "numeric"])
+GroundAction = namedtuple(
+  "GroundAction",
+  ["name", "duration", "start", "over_all", "end", "start_effects", "end_effects"],
+)
+
+
+# Parsing ------------------------------------------------------------------------------------------
+def parse_sexp(text):
+  """Returns the nested lists of a PDDL s-expression, lowercased and without comments."""
+
+  tokens = re.findall(r"[()]|[^\s()]+", re.sub(r";[^\n]*", "", text.lower()))
+  stack = [[]]
+
+  for token in tokens:
+    if token == "(":
+      stack.append([])
+    elif token == ")":
+      if len(stack) == 1:
+        raise ValueError("Unbalanced parentheses in PDDL")
+      expression = stack.pop()
+      stack[-1].append(expression)
+    else:
+      stack[-1].append(token)
+
+  if len(stack) != 1 or len(stack[0]) != 1:
+    raise ValueError("Expected exactly one PDDL expression")
+
+  return stack[0][0]
+
+
+def parse_typed_list(items):
+  """Returns the (name, type) pairs of a typed list "a b - type c - other d"."""
+
+  pairs = []
+  names = []
+  items = iter(items)
+
+  for item in items:
+    if item == "-":
+      kind = next(items)
+      pairs += [(name, kind) for name in names]
+      names = []
+    else:
+      names.append(item)
+
+  return pairs + [(name, "object") for name in names]
+
+
+def sections(expression, kind):
+  """Returns the name and the {keyword: arguments} sections of a domain or problem."""
+
+  if expression[0] != "define" or expression[1][0] != kind:
+    raise ValueError(f"Expected (define ({kind} ...) ...)")
+
+  result = {}
+  for section in expression[2:]:
+    if section[0] == ":durative-action":
+      result.setdefault(":durative-action", []).append(section[1:])
+    elif section[0] == ":action":
+      raise ValueError("Only durative actions are supported")
+    else:
+      result[section[0]] = section[1:]
+
+  return expression[1][1], result
+
+
+def parse_domain(text):
+  """Returns the domain as a dict of types, constants, predicates and durative actions."""
+
+  name, parsed = sections(parse_sexp(text), "domain")
+
+  actions = []
+  for action in parsed.get(":durative-action", []):
+    action_name, fields = action[0], dict(zip(action[1::2], action[2::2], strict=True))
+
+    duration = fields[":duration"]
+    if duration[0] != "=" or duration[1] != "?duration":
+      raise ValueError(f"Only (= ?duration ...) durations are supported in {action_name}")
+
+    actions.append(
+      {
+        "name": action_name,
+        "parameters": parse_typed_list(fields.get(":parameters", [])),
+        "duration": duration[2],
+        "condition": timed_parts(fields.get(":condition", ["and"]), action_name),
+        "effect": timed_parts(fields.get(":effect", ["and"]), action_name),
+      }
+    )
+
+  return {
+    "name": name,
+    "types": dict(parse_typed_list(parsed.get(":types", []))),
+    "constants": parse_typed_list(parsed.get(":constants", [])),
+    "actions": actions,
+  }
+
+
+def timed_parts(expression, action_name):
+  """Splits a durative condition or effect into its (time specifier, expression) parts."""
+
+  if expression and expression[0] == "and":
+    return [part for item in expression[1:] for part in timed_parts(item, action_name)]
+
+  if not expression:
+    return []
+
+  if expression[0] == "at" and expression[1] in ("start", "end"):
+    return [(expression[1], expression[2])]
+  if expression[0] == "over" and expression[1] == "all":
+    return [("over_all", expression[2])]
+
+  raise ValueError(f"Expected at start/at end/over all in {action_name}: {expression}")
+
+
+def parse_problem(text):
+  """Returns the problem as a dict of objects, initial atoms and fluents, and goal."""
+
+  name, parsed = sections(parse_sexp(text), "problem")
+
+  atoms = set()
+  fluents = {}
+  for item in parsed.get(":init", []):
+    if item[0] == "=":
+      fluents[(item[1][0], *item[1][1:])] = float(item[2])
+    elif item[0] == "at":
+      raise ValueError("Timed initial literals are not supported")
+    else:
+      atoms.add(tuple(item))
+
+  metric = parsed.get(":metric")
+  if metric is not None and metric != ["minimize", ["total-time"]]:
+    raise ValueError("Only the (minimize (total-time)) metric is supported")
+
+  return {
+    "name": name,
+    "objects": parse_typed_list(parsed.get(":objects", [])),
+    "atoms": atoms,
+    "fluents": fluents,
+    "goal": parsed[":goal"][0],
+  }
+
+
+# Grounding ----------------------------------------------------------------------------------------
+def make_and(parts):
+  """Conjunction with constants folded and nested conjunctions flattened."""
+
+  flat = []
+  for part in parts:
+    if part is False:
+      return False
+    if part is True:
+      continue
+    flat += part[1] if part[0] == "and" else [part]
+
+  if not flat:
+    return True
+  return flat[0] if len(flat) == 1 else ("and", flat)
+
+
+def make_or(parts):
+  """Disjunction with constants folded and nested disjunctions flattened."""
+
+  flat = []
+  for part in parts:
+    if part is True:
+      return True
+    if part is False:
+      continue
+    flat += part[1] if part[0] == "or" else [part]
+
+  if not flat:
+    return False
+  return flat[0] if len(flat) == 1 else ("or", flat)
+
+
+def make_not(part):
+  """Negation pushed down to the literals and comparisons (negation normal form)."""
+
+  if isinstance(part, bool):
+    return not part
+  if part[0] == "not":
+    return part[1]
+  if part[0] == "and":
+    return make_or([make_not(item) for item in part[1]])
+  if part[0] == "or":
+    return make_and([make_not(item) for item in part[1]])
+
+  return ("not", part)
+
+
+class Grounder:
+  """Grounds the actions, initial state and goal of a domain and problem.
+
+  Predicates and functions that no action changes are static: they are evaluated while grounding,
+  and the actions whose static conditions fail are dropped. Dynamic ground atoms become bits of the
+  facts integer and dynamic ground functions become indices of the fluents tuple.
+  """
+
+  def __init__(self, domain, problem):
+    self.domain = domain
+    self.problem = problem
+
+    objects = domain["constants"] + problem["objects"]
+    self.objects = [name for name, _ in objects]
+    self.object_type = dict(objects)
+
+    # 1. Predicates and functions changed by some action -------------------------
+    self.dynamic_predicates = set()
+    self.dynamic_functions = set()
+    for action in domain["actions"]:
+      for _, effect in action["effect"]:
+        self.collect_dynamic(effect)
+
+    self.atom_index = {}
+    self.fluent_index = {}
+
+  def collect_dynamic(self, effect):
+    if effect[0] == "and":
+      for item in effect[1:]:
+        self.collect_dynamic(item)
+    elif effect[0] == "not":
+      self.dynamic_predicates.add(effect[1][0])
+    elif effect[0] in ASSIGNMENTS:
+      self.dynamic_functions.add(effect[1][0])
+    else:
+      self.dynamic_predicates.add(effect[0])
+
+  def is_subtype(self, kind, ancestor):
+    while kind != ancestor:
+      if kind not in self.domain["types"]:
+        return ancestor == "object"
+      kind = self.domain["types"][kind]
+
+    return True
+
+  def objects_of(self, kind):
+    """Returns the objects of a type, subtypes included."""
+
+    return [name for name in self.objects if self.is_subtype(self.object_type[name], kind)]
+
+  def bindings(self, parameters, binding):
+    """Yields the bindings of typed parameters extended from `binding`."""
+
+    names = [name for name, _ in parameters]
+    for values in itertools.product(*(self.objects_of(kind) for _, kind in parameters)):
+      yield {**binding, **dict(zip(names, values, strict=True))}
+
+  def atom(self, expression, binding):
+    """Returns True/False for a static atom and ("atom", index) for a dynamic one."""
+
+    atom = (expression[0], *(binding.get(term, term) for term in expression[1:]))
+
+    if expression[0] not in self.dynamic_predicates:
+      return atom in self.problem["atoms"]
+
+    return ("atom", self.atom_index.setdefault(atom, len(self.atom_index)))
+
+  def expression(self, expression, binding):
+    """Grounds a numeric expression, static parts are folded into numbers."""
+
+    if isinstance(expression, str):
+      return float(expression)
+
+    head = expression[0]
+
+    if head in OPERATIONS:
+      if len(expression) == 2 and head == "-":
+        expression = ["-", "0", expression[1]]
+      left = self.expression(expression[1], binding)
+      right = self.expression(expression[2], binding)
+      if isinstance(left, float) and isinstance(right, float):
+        return OPERATIONS[head](left, right)
+      if left is None or right is None:
+        return None
+      # Zero times or over anything, e.g. the duration of a move between a location and itself
+      if head in ("*", "/") and left == 0.0 or head == "*" and right == 0.0:
+        return 0.0
+      return (head, left, right)
+
+    fluent = (head, *(binding.get(term, term) for term in expression[1:]))
+
+    # Undefined static fluents are None, which makes every comparison with them false
+    if head not in self.dynamic_functions:
+      return self.problem["fluents"].get(fluent)
+
+    return ("fluent", self.fluent_index.setdefault(fluent, len(self.fluent_index)))
+
+  def formula(self, expression, binding):
+    """Grounds a formula into True/False or nested ("and"|"or", parts), ("not", f), ("atom", i)
+    and ("compare", operator, left, right) tuples."""
+
+    head = expression[0]
+
+    if head == "and":
+      return make_and([self.formula(item, binding) for item in expression[1:]])
+    if head == "or":
+      return make_or([self.formula(item, binding) for item in expression[1:]])
+    if head == "not":
+      return make_not(self.formula(expression[1], binding))
+    if head == "imply":
+      return make_or(
+        [make_not(self.formula(expression[1], binding)), self.formula(expression[2], binding)]
+      )
+    if head in ("exists", "forall"):
+      parts = [
+        self.formula(expression[2], extended)
+        for extended in self.bindings(parse_typed_list(expression[1]), binding)
+      ]
+      return make_or(parts) if head == "exists" else make_and(parts)
+
+    # Object equality, as opposed to the numeric comparison (= (f ...) value)
+    if head == "=" and all(isinstance(term, str) for term in expression[1:]):
+      left, right = (binding.get(term, term) for term in expression[1:])
+      if left in self.object_type or right in self.object_type:
+        return left == right
+
+    if head in COMPARISONS:
+      left = self.expression(expression[1], binding)
+      right = self.expression(expression[2], binding)
+      if left is None or right is None:
+        return False
+      if isinstance(left, float) and isinstance(right, float):
+        return COMPARISONS[head](left, right)
+      return ("compare", head, left, right)
+
+    return self.atom(expression, binding)
+
+  def condition(self, formula):
+    """Compiles a ground formula into a `Condition`, or None when it can never hold."""
+
+    if formula is False:
+      return None
+
+    positive = negative = 0
+    formulas = []
+
+    for part in [] if formula is True else formula[1] if formula[0] == "and" else [formula]:
+      if part[0] == "atom":
+        positive |= 1 << part[1]
+      elif part[0] == "not" and part[1][0] == "atom":
+        negative |= 1 << part[1][1]
+      else:
+        formulas.append(part)
+
+    if positive & negative:
+      return None
+
+    return Condition(positive, negative, tuple(formulas))
+
+  def effects(self, parts, binding):
+    """Compiles the ground effects of one time specifier."""
+
+    add = delete = 0
+    numeric = []
+
+    for effect in parts:
+      if effect[0] == "and":
+        nested = self.effects(effect[1:], binding)
+        add, delete = add | nested.add, delete | nested.delete
+        numeric += nested.numeric
+      elif effect[0] == "not":
+        delete |= 1 << self.atom(effect[1], binding)[1]
+      elif effect[0] in ASSIGNMENTS:
+        fluent = self.expression(effect[1], binding)[1]
+        numeric.append((effect[0], fluent, self.expression(effect[2], binding)))
+      else:
+        add |= 1 << self.atom(effect, binding)[1]
+
+    return Effects(add, delete, tuple(numeric))
+
+  def actions(self):
+    """Yields the ground actions whose conditions can hold."""
+
+    for action in self.domain["actions"]:
+      for binding in self.bindings(action["parameters"], {}):
+        formulas = {"start": [], "over_all": [], "end": []}
+        for when, expression in action["condition"]:
+          formulas[when].append(self.formula(expression, binding))
+
+        conditions = {when: self.condition(make_and(parts)) for when, parts in formulas.items()}
+        if None in conditions.values():
+          continue
+
+        duration = self.expression(action["duration"], binding)
+        if duration is None:
+          continue
+
+        arguments = " ".join(binding[name] for name, _ in action["parameters"])
+        ground_action = GroundAction(
+          name=f"({action['name']} {arguments})" if arguments else f"({action['name']})",
+          duration=duration,
+          start=conditions["start"],
+          over_all=conditions["over_all"],
+          end=conditions["end"],
+          start_effects=self.effects(
+            [effect for when, effect in action["effect"] if when == "start"], binding
+          ),
+          end_effects=self.effects(
+            [effect for when, effect in action["effect"] if when == "end"], binding
+          ),
+        )
+
+        if not is_no_op(ground_action):
+          yield ground_action
+
+
+def is_no_op(action):
+  """Checks for an instantaneous action that leaves the state as its conditions required it, like a
+  move from a location to itself; no plan needs one."""
+
+  start, end = action.start_effects, action.end_effects
+  if action.duration != 0.0 or start.numeric or end.numeric:
+    return False
+
+  added = (start.add & ~end.delete) | end.add
+  deleted = (start.delete & ~end.add) | end.delete
+
+  return (
+    not added & ~(action.start.positive | action.over_all.positive)
+    and not deleted & ~action.start.negative
+  )
+
+
+# Task ---------------------------------------------------------------------------------------------
+def evaluate(expression, fluents):
+  """Returns the value of a ground numeric expression, None when a fluent is undefined."""
+
+  if isinstance(expression, float):
+    return expression
+  if expression[0] == "fluent":
+    return fluents[expression[1]]
+
+  left = evaluate(expression[1], fluents)
+  right = evaluate(expression[2], fluents)
+  if left is None or right is None:
+    return None
+
+  return OPERATIONS[expression[0]](left, right)
+
+
+def holds(formula, facts, fluents):
+  """Checks a ground formula that is not a plain literal."""
+
+  head = formula[0]
+
+  if head == "atom":
+    return bool(facts >> formula[1] & 1)
+  if head == "not":
+    return not holds(formula[1], facts, fluents)
+  if head == "and":
+    return all(holds(part, facts, fluents) for part in formula[1])
+  if head == "or":
+    return any(holds(part, facts, fluents) for part in formula[1])
+
+  left = evaluate(formula[2], fluents)
+  right = evaluate(formula[3], fluents)
+
+  return left is not None and right is not None and COMPARISONS[formula[1]](left, right)
+
+
+def satisfied(condition, facts, fluents):
+  """Checks a compiled `Condition`."""
+
+  return (
+    facts & condition.positive == condition.positive
+    and not facts & condition.negative
+    and all(holds(formula, facts, fluents) for formula in condition.formulas)
+  )
+
+
+def apply_effects(effects, facts, fluents):
+  """Returns the (facts, fluents) after the effects, None when they update an undefined fluent."""
+
+  facts = (facts & ~effects.delete) | effects.add
+
+  if effects.numeric:
+    # Every update reads the values from before the effects
+    updated = list(fluents)
+    for operation, fluent, expression in effects.numeric:
+      value = evaluate(expression, fluents)
+      old = fluents[fluent]
+      if value is None or (old is None and operation != "assign"):
+        return None
+      updated[fluent] = ASSIGNMENTS[operation](old, value)
+    fluents = tuple(updated)
+
+  return facts, fluents
+
+
+def fluent_changes(effects, n_fluents):
+  """Returns, per fluent, how the given numeric effects can change it: a [rises, falls, constants]
+  triple, where `constants` are the values it can be assigned."""
+
+  changes = [[False, False, set()] for _ in range(n_fluents)]
+
+  for operation, fluent, expression in effects:
+    change = changes[fluent]
+    if not isinstance(expression, float) or operation.startswith("scale"):
+      change[0] = change[1] = True
+    elif operation == "assign":
+      change[2].add(expression)
+    elif (expression > 0) == (operation == "increase") and expression != 0:
+      change[0] = True
+    elif expression != 0:
+      change[1] = True
+
+  return changes
+
+
+def can_hold(formula, value, facts, fluents, added, deleted, changes):
+  """Checks whether a ground formula can evaluate to `value` in a later state, over-approximated:
+  facts change only if some action adds or deletes them, and fluents only take their current value,
+  an assigned constant, or move in the directions of `changes` (see `fluent_changes`)."""
+
+  head = formula[0]
+
+  if head == "atom":
+    bit = 1 << formula[1]
+    return bool(facts & bit) == value or bool((added if value else deleted) & bit)
+  if head == "not":
+    return can_hold(formula[1], not value, facts, fluents, added, deleted, changes)
+  if head in ("and", "or"):
+    parts = (can_hold(part, value, facts, fluents, added, deleted, changes) for part in formula[1])
+    return all(parts) if (head == "and") == value else any(parts)
+
+  # Only comparisons between one fluent and a constant are bounded, the others may always hold
+  _, operator, left, right = formula
+  if isinstance(left, float):
+    operator, left, right = MIRRORED[operator], right, left
+  if left[0] != "fluent" or not isinstance(right, float):
+    return True
+  if not value:
+    operator = NEGATED[operator]
+
+  rises, falls, constants = changes[left[1]]
+  values = [v for v in (fluents[left[1]], *constants) if v is not None]
+  if any(v != right if operator == "!=" else COMPARISONS[operator](v, right) for v in values):
+    return True
+  if operator in (">", ">="):
+    return rises and bool(values)
+  if operator in ("<", "<="):
+    return falls and bool(values)
+  if operator == "=":
+    return any(rises and v < right or falls and v > right for v in values)
+
+  return (rises or falls) and bool(values)
+
+
+def needed_facts(formula, facts, fluents, added, deleted, changes):
+  """Returns the mask of the facts a formula that can hold needs, once the disjuncts that can no
+  longer hold (see `can_hold`) are dropped: e.g. (or (not hot) still-hot) needs still-hot while
+  hot stays true."""
+
+  head = formula[0]
+
+  if head == "atom":
+    return 1 << formula[1]
+  if head == "and":
+    needed = 0
+    for part in formula[1]:
+      needed |= needed_facts(part, facts, fluents, added, deleted, changes)
+    return needed
+  if head == "or":
+    needed = -1
+    for part in formula[1]:
+      if can_hold(part, True, facts, fluents, added, deleted, changes):
+        needed &= needed_facts(part, facts, fluents, added, deleted, changes)
+    return max(needed, 0)
+
+  return 0
+
+
+def bit_indices(mask):
+  """Returns the indices of the set bits of a mask."""
+
+  indices = []
+  while mask:
+    indices.append((mask & -mask).bit_length() - 1)
+    mask &= mask - 1
+
+  return indices
+
+
+def fluent_values(actions, fluents):
+  """Returns, per fluent, the set of values it can take when actions only assign it constants, or
+  None when it can take any value."""
+
+  values = [set() if value is None else {value} for value in fluents]
+
+  for action in actions:
+    for effects in (action.start_effects, action.end_effects):
+      for operation, fluent, expression in effects.numeric:
+        if values[fluent] is None:
+          continue
+        if operation == "assign" and isinstance(expression, float):
+          values[fluent].add(expression)
+        else:
+          values[fluent] = None
+
+  return values
+
+
+def expression_fluents(expression):
+  """Returns the fluent indices used by a ground numeric expression."""
+
+  if isinstance(expression, float):
+    return set()
+  if expression[0] == "fluent":
+    return {expression[1]}
+
+  return expression_fluents(expression[1]) | expression_fluents(expression[2])
+
+
+def min_value(expression, values):
+  """Returns a lower bound of a non-negative expression over the possible fluent values."""
+
+  fluents = sorted(expression_fluents(expression))
+  if any(values[fluent] is None for fluent in fluents):
+    return 0.0
+
+  assignment = [None] * len(values)
+  results = []
+  for combination in itertools.product(*(values[fluent] for fluent in fluents)):
+    for fluent, value in zip(fluents, combination, strict=True):
+      assignment[fluent] = value
+    result = evaluate(expression, assignment)
+    if result is not None:
+      results.append(result)
+
+  return max(min(results, default=0.0), 0.0)
+
+
+class PDDLTask:
+  """Temporal planning task compiled from a PDDL domain and problem, searched in process.
+
+  A state is the tuple (time, facts, fluents, running), where `facts` has one bit per dynamic
+  ground atom, `fluents` holds the values of the dynamic ground functions (None while undefined)
+  and `running` is the sorted tuple of (end time, action index) of the actions in progress.
+  Actions start at decision epochs: time zero or the end of another action. A successor either
+  starts one applicable action, which is not already running, at the current time, or moves the
+  clock to the next end and applies the effects of the actions that end then. Over-all conditions
+  of the running actions must hold in every state they span. The goal requires no running action,
+  so the plan cost is its makespan.
+  """
+
+  def __init__(self, domain, problem):
+    grounder = Grounder(domain, problem)
+
+    # Only start the actions of the relaxed plan (see `get_next_states`)
+    self.helpful_actions = False
+
+    self.actions = list(grounder.actions())
+    self.goal_condition = grounder.condition(grounder.formula(problem["goal"], {}))
+    if self.goal_condition is None:
+      raise ValueError("The goal can never hold")
+
+    self.atoms = [" ".join(atom) for atom in grounder.atom_index]
+    self.fluent_names = [" ".join(fluent) for fluent in grounder.fluent_index]
+
+    facts = 0
+    for atom, index in grounder.atom_index.items():
+      if atom in problem["atoms"]:
+        facts |= 1 << index
+    fluents = tuple(problem["fluents"].get(fluent) for fluent in grounder.fluent_index)
+
+    self.initial_state = (0.0, facts, fluents, ())
+
+    # 1. Lower bounds of the durations, for the heuristic ------------------------
+    values = fluent_values(self.actions, fluents)
+    self.min_durations = [min_value(action.duration, values) for action in self.actions]
+
+    # 2. Relaxed planning graph: the facts each action needs at start and at end --
+    self.start_needs = [bit_indices(a.start.positive | a.over_all.positive) for a in self.actions]
+    self.end_needs = [bit_indices(a.end.positive) for a in self.actions]
+    self.triggers = [[] for _ in self.atoms]
+    for index, (start_needs, end_needs) in enumerate(
+      zip(self.start_needs, self.end_needs, strict=True)
+    ):
+      for fact in start_needs:
+        self.triggers[fact].append((index, True))
+      for fact in end_needs:
+        self.triggers[fact].append((index, False))
+    self.goal_facts = bit_indices(self.goal_condition.positive)
+    self.start_adds = [bit_indices(action.start_effects.add) for action in self.actions]
+    self.end_adds = [bit_indices(action.end_effects.add) for action in self.actions]
+
+    # 3. Dead ends: what can still change the facts and fluents ------------------
+    self.added = self.deleted = 0
+    for action in self.actions:
+      for effects in (action.start_effects, action.end_effects):
+        self.added |= effects.add
+        self.deleted |= effects.delete
+    self.literal_needs = [
+      (a.start.positive | a.over_all.positive, a.start.negative | a.over_all.negative)
+      for a in self.actions
+    ]
+    self.formula_needs = [a.start.formulas + a.over_all.formulas for a in self.actions]
+
+  # Search callbacks -------------------------------------------------------------------------------
+  def get_next_states(self, state):
+    """Generates the successors of a state, each with its plan step (time, action index or None
+    for the clock moving forward, duration).
+
+    With `helpful_actions`, only the actions of the `relaxed_plan` start, as FF's helpful actions:
+    robots no longer wander off on moves no plan to the goal needs, at the price of completeness.
+    """
+
+    time, facts, fluents, running = state
+    successors = []
+
+    # 1. Start an applicable action ----------------------------------------------
+    started = {index for _, index in running}
+    helpful = self.relaxed_plan(state) if self.helpful_actions else None
+
+    for index, action in enumerate(self.actions):
+      if index in started or not satisfied(action.start, facts, fluents):
+        continue
+      if helpful is not None and index not in helpful:
+        continue
+
+      duration = evaluate(action.duration, fluents)
+      if duration is None or duration < 0:
+        continue
+
+      after = apply_effects(action.start_effects, facts, fluents)
+      if after is None:
+        continue
+
+      next_running = tuple(sorted((*running, (time + duration, index))))
+      if not self.invariants_hold(next_running, *after):
+        continue
+
+      successors.append(((time, *after, next_running), (time, index, duration)))
+
+    # 2. Move the clock to the next end ------------------------------------------
+    if running:
+      next_state = self.advance_events(state)
+      if next_state is not None:
+        successors.append((next_state, (time, None, next_state[0] - time)))
+
+    return successors
+
+  def canonical_state(self, state):
+    """Canonical key with the time left to the end of each running action instead of its end time.
+
+    The effects do not depend on the clock, so two states with the same facts, fluents and time
+    left on the same actions have the same futures shifted in time, and the later one is pruned.
+    """
+
+    time, facts, fluents, running = state
+
+    return (facts, fluents, tuple((end_time - time, index) for end_time, index in running))
+
+  def advance_events(self, state):
+    """Returns the state after the actions that end next, None when one of them can not end."""
+
+    _, facts, fluents, running = state
+    next_event_time = running[0][0]
+
+    ending = [index for end_time, index in running if end_time == next_event_time]
+    next_running = tuple(entry for entry in running if entry[0] > next_event_time)
+
+    # At end conditions are checked before any of the simultaneous effects
+    for index in ending:
+      if not satisfied(self.actions[index].end, facts, fluents):
+        return None
+
+    for index in ending:
+      after = apply_effects(self.actions[index].end_effects, facts, fluents)
+      if after is None:
+        return None
+      facts, fluents = after
+
+    if not self.invariants_hold(next_running, facts, fluents):
+      return None
+
+    return (next_event_time, facts, fluents, next_running)
+
+  def relaxed_actions(self, state):
+    """Returns, per action, the mask of the facts it needs to start and the latest time from now at
+    which it may still start: infinite when nothing bounds it, minus infinity once it is dead.
+
+    Facts are reached as in the relaxed planning graph, from the facts that hold and the end
+    effects of the running actions, through the actions whose needed facts are reached and whose
+    other conditions can still hold (see `can_hold`). An action is dead when it is never reached,
+    e.g. a delivery to a table another waiter is assigned to, or of a hot drink whose time left
+    dropped to zero, as only the dead barista action could assign it again. The needed facts add
+    those of the conditions that are not plain literals (see `needed_facts`). A live action whose
+    conditions can no longer hold once a running action ends, like the delivery of a hot drink
+    that is cooling down, must start by then.
+    """
+
+    time, facts, fluents, running = state
+    actions = self.actions
+    needs = [positive for positive, _ in self.literal_needs]
+    dead = [float("-inf")] * len(actions)
+
+    # 1. Actions needing a fact that stays false or one that stays true ----------
+    stuck_false = ~facts & ~self.added
+    stuck_true = facts & ~self.deleted
+    candidates = [
+      index
+      for index, (positive, negative) in enumerate(self.literal_needs)
+      if not positive & stuck_false and not negative & stuck_true
+    ]
+
+    effects = [
+      effect
+      for index in candidates
+      for effect in actions[index].start_effects.numeric + actions[index].end_effects.numeric
+    ]
+    effects += [effect for _, index in running for effect in actions[index].end_effects.numeric]
+    changes = fluent_changes(effects, len(fluents))
+
+    # 2. Reach facts through the candidates until nothing changes ----------------
+    reached = facts
+    for _, index in running:
+      reached |= actions[index].end_effects.add
+
+    deadlines = list(dead)
+    changed = True
+    while changed:
+      changed = False
+      for index in candidates:
+        if deadlines[index] >= 0.0 or needs[index] & ~reached:
+          continue
+        if not all(
+          can_hold(formula, True, facts, fluents, reached, self.deleted, changes)
+          for formula in self.formula_needs[index]
+        ):
+          continue
+
+        deadlines[index] = float("inf")
+        changed = True
+        reached |= actions[index].start_effects.add | actions[index].end_effects.add
+
+    bounded = [
+      index for index in candidates if deadlines[index] >= 0.0 and self.formula_needs[index]
+    ]
+    for index in bounded:
+      for formula in self.formula_needs[index]:
+        needs[index] |= needed_facts(formula, facts, fluents, reached, self.deleted, changes)
+
+    # 3. Conditions that the end effects of the running actions break for good ---
+    for end_time, index in running:
+      end_effects = actions[index].end_effects
+      after = apply_effects(end_effects, facts, fluents)
+      if after is None:
+        return needs, dead  # The clock can never move past this end
+      facts, fluents = after
+      if not end_effects.numeric:
+        continue
+
+      for other in bounded:
+        if deadlines[other] == float("inf") and not all(
+          can_hold(formula, True, facts, fluents, reached, self.deleted, changes)
+          for formula in self.formula_needs[other]
+        ):
+          deadlines[other] = end_time - time
+
+    return needs, deadlines
+
+  def invariants_hold(self, running, facts, fluents):
+    """Checks the over-all conditions of the running actions."""
+
+    actions = self.actions
+
+    return all(satisfied(actions[index].over_all, facts, fluents) for _, index in running)
+
+  def goal(self, state):
+    """Checks that the goal holds and that no action is still running."""
+
+    return not state[3] and satisfied(self.goal_condition, state[1], state[2])
+
+  def heuristic(self, state):
+    """Admissible temporal h_max: the earliest time every goal fact can hold when deletes, negative
+    and numeric conditions are ignored, robots can do everything in parallel and actions take
+    their shortest possible duration; and at least the time until every running action ends.
+    Infinite at dead ends, where a goal fact needs an action that can no longer start in time (see
+    `relaxed_actions`)."""
+
+    time, facts, _, running = state
+    earliest, _, _ = self.relaxed_costs(state, additive=False)
+
+    h = max((earliest[fact] for fact in self.goal_facts if not facts >> fact & 1), default=0.0)
+
+    return max(h, running[-1][0] - time if running else 0.0)
+
+  def additive_heuristic(self, state):
+    """Inadmissible h_add: the sum of the relaxed costs of the goal facts, where an action costs
+    one plus its duration on top of the costs of its conditions. Better guidance for greedy and
+    weighted search, as it counts the work that h_max lets the robots share."""
+
+    facts = state[1]
+    costs, _, _ = self.relaxed_costs(state, additive=True)
+
+    return sum(costs[fact] for fact in self.goal_facts if not facts >> fact & 1)
+
+  def relaxed_costs(self, state, additive):
+    """Returns the relaxed cost of every fact, settled in increasing order as in Dijkstra's
+    algorithm. An action starts once its start and over-all facts hold and ends after its shortest
+    duration, once its at-end facts also hold; the cost of its conditions is their largest cost
+    (their earliest time) or, when `additive`, their sum plus one per action. Dead actions never
+    start, nor, with earliest times, actions whose deadline has passed; facts that only they reach
+    keep an infinite cost.
+
+    Also returns the supporter of every fact, the action that reached it first (-1 when it holds
+    or a running action adds it), and the needed facts of `relaxed_actions`.
+    """
+
+    time, facts, _, running = state
+    step = 1.0 if additive else 0.0
+    min_durations, start_adds, end_adds = self.min_durations, self.start_adds, self.end_adds
+
+    # 1. Facts that hold now or once the running actions end ---------------------
+    costs = [float("inf")] * len(self.atoms)
+    supporters = [-1] * len(self.atoms)
+    heap = [(0.0, fact, -1) for fact in bit_indices(facts)]
+    for end_time, index in running:
+      heap += [(end_time - time, fact, -1) for fact in end_adds[index]]
+    heapq.heapify(heap)
+
+    # Facts needed by the conditions that are not plain literals trigger their actions too
+    needs, deadlines = self.relaxed_actions(state)
+    missing = []
+    extra_triggers = {}
+    for index, (need, start_needs, end_needs) in enumerate(
+      zip(needs, self.start_needs, self.end_needs, strict=True)
+    ):
+      extra = bit_indices(need & ~self.literal_needs[index][0])
+      for fact in extra:
+        extra_triggers.setdefault(fact, []).append((index, True))
+      missing.append(len(start_needs) + len(extra) + len(end_needs))
+    start_costs = [0.0] * len(missing)
+    end_costs = [0.0] * len(missing)
+
+    # Relaxed costs are earliest times unless `additive`, only then can deadlines be checked
+    if additive:
+      deadlines = [deadline if deadline < 0.0 else float("inf") for deadline in deadlines]
+
+    def fire(index):
+      start_cost = start_costs[index] + step
+      if start_cost > deadlines[index]:
+        return
+      if additive:
+        end_cost = start_cost + min_durations[index] + end_costs[index]
+      else:
+        end_cost = max(start_cost + min_durations[index], end_costs[index])
+      for fact in start_adds[index]:
+        heapq.heappush(heap, (start_cost, fact, index))
+      for fact in end_adds[index]:
+        heapq.heappush(heap, (end_cost, fact, index))
+
+    for index, count in enumerate(missing):
+      if not count:
+        fire(index)
+
+    # 2. Settle the facts in cost order until every goal fact is settled ---------
+    goal_facts = set(self.goal_facts)
+    goals_left = sum(1 for fact in goal_facts if not facts >> fact & 1)
+
+    while heap and goals_left:
+      cost, fact, supporter = heapq.heappop(heap)
+      if costs[fact] <= cost:
+        continue
+      costs[fact] = cost
+      supporters[fact] = supporter
+
+      if fact in goal_facts and not facts >> fact & 1:
+        goals_left -= 1
+
+      for index, at_start in itertools.chain(self.triggers[fact], extra_triggers.get(fact, ())):
+        # Facts settle in increasing order, so the last one is the largest
+        if at_start:
+          start_costs[index] = start_costs[index] + cost if additive else cost
+        else:
+          end_costs[index] = end_costs[index] + cost if additive else cost
+        missing[index] -= 1
+        if not missing[index]:
+          fire(index)
+
+    return costs, supporters, needs
+
+  def relaxed_plan(self, state):
+    """Returns the set of actions of the relaxed plan of a state: the supporters of the missing
+    goal facts, then of the facts they need, as with h_add."""
+
+    _, supporters, needs = self.relaxed_costs(state, additive=True)
+
+    plan = set()
+    facts = [fact for fact in self.goal_facts if not state[1] >> fact & 1]
+    while facts:
+      index = supporters[facts.pop()]
+      if index >= 0 and index not in plan:
+        plan.add(index)
+        facts += bit_indices(needs[index]) + self.end_needs[index]
+
+    return plan
+
+  def describe_step(self, step):
+    """Returns a plan step as readable (time, action, duration)."""
+
+    time, index, duration = step
+
+    return (time, "wait" if index is None else self.actions[index].name, duration)
+
+  def format_step(self, step):
+    """Formats a plan step the way PDDL planners print plans."""
+
+    time, action, duration = self.describe_step(step)
+
+    return f"{time:.3f}: {action} [{duration:.3f}]"
+
+  def plan(self, path):
+    """Returns the steps of a path that start actions, the clock moves are implicit."""
+
+    return [step for step in path if step[1] is not None]
+
+
+def load_task(domain_path, problem_path, cache_dir=None):
+  """Returns the `PDDLTask` of a domain and problem file.
+
+  With a `cache_dir`, the grounded task is pickled there under the SHA-256 of both files, and later
+  calls with the same files load it instead of parsing and grounding again. Each file starts with a
+  header line holding `CACHE_VERSION` and that digest, a file whose header does not match is
+  rebuilt without being unpickled. Unpickling runs code, so only cache to a directory you trust.
+  """
+
+  domain_text = Path(domain_path).read_text()
+  problem_text = Path(problem_path).read_text()
+
+  cache_path = None
+  if cache_dir is not None:
+    digest = hashlib.sha256(CACHE_VERSION)
+    for text in (domain_text, problem_text):
+      digest.update(hashlib.sha256(text.encode()).digest())
+    cache_path = Path(cache_dir) / f"{digest.hexdigest()}.pickle"
+    header = CACHE_VERSION + b" " + digest.hexdigest().encode() + b"\n"
+
+    if cache_path.exists():
+      try:
+        with cache_path.open("rb") as file:
+          if file.readline() == header:
+            return pickle.load(file)
+      except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+        pass  # Rebuilt and overwritten below
+
+  task = PDDLTask(parse_domain(domain_text), parse_problem(problem_text))
+
+  if cache_path is not None:
+    # Written under a temporary name first, so concurrent runs never read a partial file
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    temporary_path = cache_path.with_suffix(f".{id(task)}.tmp")
+    with temporary_path.open("wb") as file:
+      file.write(header)
+      pickle.dump(task, file, protocol=pickle.HIGHEST_PROTOCOL)
+    temporary_path.replace(cache_path)
+
+  return task
+
+
+def solve(task, algorithm="astar", weight=1.0):
+  """Searches a plan of a task and returns (makespan, visited, path, stats)."""
+
+  stats = {}
+  search = (task.initial_state, task.goal, task.get_next_states)
+
+  if algorithm == "ucs":
+    result = UCS(*search, stats, canonical_state=task.canonical_state)
+  elif algorithm == "greedy":
+    result = GBFS(*search, task.additive_heuristic, stats, canonical_state=task.canonical_state)
+  else:
+    # Optimal with the admissible heuristic; weighted, the additive one trades quality for speed
+    heuristic = task.heuristic if weight == 1.0 else task.additive_heuristic
+    result = A_star(*search, heuristic, stats, canonical_state=task.canonical_state, weight=weight)
+
+  return (*result, stats)
+
+
+def main():
+  parser = argparse.ArgumentParser(
+    description="Solves a PDDL domain and problem with the in-process search."
+  )
+  parser.add_argument("domain", help="PDDL domain file")
+  parser.add_argument("problem", help="PDDL problem file")
+  parser.add_argument("--algorithm", choices=("astar", "ucs", "greedy"), default="astar")
+  parser.add_argument(
+    "--weight", type=float, default=1.0, help="A* weight, above 1 uses the additive heuristic"
+  )
+  parser.add_argument("--cache", help="directory of the grounded task cache, none by default")
+  parser.add_argument(
+    "--helpful", action="store_true", help="only start relaxed plan actions, fast but incomplete"
+  )
+  args = parser.parse_args()
+
+  time_start = perf_counter()
+  task = load_task(args.domain, args.problem, args.cache)
+  task.helpful_actions = args.helpful
+  time_ground = perf_counter()
+
+  total_time, _, path, stats = solve(task, args.algorithm, args.weight)
+  time_end = perf_counter()
+
+  print(f"Grounding time: {time_ground - time_start:.4f} [s], {len(task.actions)} actions")
+  print(f"Search time: {time_end - time_ground:.4f} [s]")
+  print(f"Number of nodes: {stats['visited']}")
+  print(f"Expanded nodes: {stats['expanded']}")
+
+  if path is None:
+    print("No plan found")
+    return
+
+  print(f"Plan makespan: {total_time} [s]")
+  for step in task.plan(path):
+    print(task.format_step(step))
+
+
+if __name__ == "__main__":
+  main()
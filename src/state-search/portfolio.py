@@ -0,0 +1,121 @@
+import multiprocessing
+import queue
+import time as clock
+from collections import namedtuple
+
+from heuristics import ADMISSIBLE_HEURISTICS, HEURISTICS, get_heuristic
+from search_algorithm import GBFS, UCS, A_star
+
+Strategy = namedtuple(
+  "Strategy", ["name", "algorithm", "heuristic", "weight"], defaults=(None, 1.0)
+)
+
+# Strongest strategies first, they start first when there are fewer workers than strategies
+DEFAULT_STRATEGIES = (
+  Strategy("A* max", "A_star", "max"),
+  Strategy("greedy max", "GBFS", "max"),
+  Strategy("weighted A* max (w=2)", "A_star", "max", 2.0),
+  *(Strategy(f"A* {name}", "A_star", name) for name in HEURISTICS if name not in ("zero", "max")),
+  Strategy("UCS", "UCS"),
+)
+
+
+def is_optimal(strategy):
+  """Checks whether a strategy proves that its plan is the fastest one."""
+
+  if strategy.algorithm == "UCS":
+    return True
+
+  return (
+    strategy.algorithm == "A_star"
+    and strategy.weight == 1.0
+    and strategy.heuristic in ADMISSIBLE_HEURISTICS
+  )
+
+
+def run_strategy(strategy, cafe, initial_state, results):
+  """Solves the instance with one strategy and puts the outcome on the results queue."""
+
+  time_start = clock.perf_counter()
+  stats = {}
+
+  if strategy.algorithm == "UCS":
+    total_time, _, path = UCS(initial_state, cafe.goal, cafe.get_next_states, stats)
+  else:
+    heuristic = get_heuristic(strategy.heuristic, cafe, initial_state)
+
+    if strategy.algorithm == "GBFS":
+      total_time, _, path = GBFS(initial_state, cafe.goal, cafe.get_next_states, heuristic, stats)
+    elif strategy.algorithm == "A_star":
+      total_time, _, path = A_star(
+        initial_state, cafe.goal, cafe.get_next_states, heuristic, stats, weight=strategy.weight
+      )
+    else:
+      raise ValueError(f"Unknown search algorithm {strategy.algorithm}")
+
+  stats["elapsed"] = clock.perf_counter() - time_start
+  results.put((strategy.name, total_time, path, stats))
+
+
+def solve_portfolio(
+  cafe, initial_state, strategies=DEFAULT_STRATEGIES, time_budget=60.0, n_workers=None, stats=None
+):
+  """Races several search strategies in parallel processes within a shared time budget.
+
+  Returns (total time, path, strategy name, optimal) for the plan proven optimal as soon as one
+  optimal strategy finishes, the other processes are then cancelled. If the budget runs out first,
+  the fastest plan found so far is returned with `optimal` set to False. `stats`, if given, receives
+  the counters of every strategy that finished.
+  """
+
+  n_workers = n_workers or min(multiprocessing.cpu_count(), len(strategies))
+  deadline = clock.perf_counter() + time_budget
+
+  results = multiprocessing.Queue()
+  pending = list(strategies)
+  running = {}
+  by_name = {strategy.name: strategy for strategy in strategies}
+  best = (float("inf"), None, None, False)
+
+  try:
+    while pending or running:
+      # 1. Keep every worker slot busy ---------------------------------------------
+      while pending and len(running) < n_workers:
+        strategy = pending.pop(0)
+        process = multiprocessing.Process(
+          target=run_strategy, args=(strategy, cafe, initial_state, results), daemon=True
+        )
+        process.start()
+        running[strategy.name] = process
+
+      remaining = deadline - clock.perf_counter()
+      if remaining <= 0:
+        break
+
+      # 2. Wait for the next strategy to finish ------------------------------------
+      try:
+        name, total_time, path, run_stats = results.get(timeout=min(remaining, 0.1))
+      except queue.Empty:
+        for name, process in list(running.items()):
+          if process.exitcode not in (None, 0):
+            del running[name]
+        continue
+
+      running.pop(name).join()
+      if stats is not None:
+        stats[name] = {"total_time": total_time, **run_stats}
+
+      optimal = is_optimal(by_name[name]) and path is not None
+      if total_time < best[0] or (optimal and total_time <= best[0]):
+        best = (total_time, path, name, optimal)
+
+      # 3. An optimal plan cannot be beaten, cancel the others ---------------------
+      if optimal:
+        break
+  finally:
+    for process in running.values():
+      process.terminate()
+    for process in running.values():
+      process.join()
+
+  return best
@@ -0,0 +1,139 @@
+from heuristics import INSTANCE_HEURISTICS, get_heuristic
+from search_algorithm import A_star, ARA_star
+
+
+class LearnedHeuristic:
+  """Admissible heuristic raised with the cost-to-go bounds learned by previous searches.
+
+  When a search from any start finds a plan of cost C, every state it reached with g has
+  h*(state) >= C - g, since g is at least its distance from the start; with a suboptimal plan
+  started at t0 the proven lower bound t0 + (C - t0) / bound replaces C. h* only depends on the
+  relative state (key and remaining durations), so these bounds stay valid for every later search
+  on the same café. At most `table_size` states are kept, the oldest learned ones are evicted
+  first.
+  """
+
+  def __init__(self, cafe, heuristic, table_size=1_000_000):
+    self.cafe = cafe
+    self.heuristic = heuristic
+    self.table_size = table_size
+    self.table = {}
+
+  def __call__(self, state):
+    learned = self.table.get(self.cafe.relative_state(state))
+    h = self.heuristic(state)
+
+    return learned if learned is not None and learned > h else h
+
+  def learn(self, visited, lower_bound):
+    """Stores lower_bound - g for the states of a finished search, keyed by relative state."""
+
+    table = self.table
+
+    for relative_state, g in visited.items():
+      value = lower_bound - g
+      if value > table.get(relative_state, 0.0):
+        table.pop(relative_state, None)
+        table[relative_state] = value
+
+    while len(table) > self.table_size:
+      del table[next(iter(table))]
+
+
+class OnlinePlanner:
+  """Keeps a plan up to date while the café executes it and new events arrive.
+
+  `advance(time)` follows the plan up to a time: the rest of an optimal plan stays optimal, so no
+  search is needed. `add_events(time, orders, tables_to_clean)` applies new orders and dirty tables
+  to the last decision point reached and repairs the plan from there. Work is reused across replans
+  in three ways: heuristics that only depend on the café (and their caches) are built once,
+  cost-to-go bounds learned by every search are kept in a `LearnedHeuristic`, and duplicate
+  detection uses relative states, so situations that repeat later in the shift are recognized. With
+  a `time_budget`, each replan is an anytime ARA* search that returns the best plan within the
+  budget instead of waiting for the optimal one.
+  """
+
+  def __init__(
+    self, cafe, state, heuristic="critical_path", time_budget=None, table_size=1_000_000
+  ):
+    self.cafe = cafe
+    self.heuristic_name = heuristic
+    self.time_budget = time_budget
+    self.state = state
+    self.plan = []
+    self.cost = float("inf")
+    self.bound = float("inf")
+    self.stats = {}
+
+    base = None if heuristic in INSTANCE_HEURISTICS else get_heuristic(heuristic, cafe, state)
+    self.heuristic = LearnedHeuristic(cafe, base, table_size)
+
+    self.replan()
+
+  def replan(self):
+    """Searches a new plan from the current state and returns it."""
+
+    cafe = self.cafe
+
+    # Heuristics built from the current drinks must follow the new orders
+    if self.heuristic_name in INSTANCE_HEURISTICS:
+      self.heuristic.heuristic = get_heuristic(self.heuristic_name, cafe, self.state)
+
+    self.stats = {}
+
+    if self.time_budget is None:
+      total_time, visited, path = A_star(
+        self.state,
+        cafe.goal,
+        cafe.get_next_states,
+        self.heuristic,
+        self.stats,
+        canonical_state=cafe.relative_state,
+      )
+      self.bound = 1.0
+    else:
+      total_time, visited, path = ARA_star(
+        self.state,
+        cafe.goal,
+        cafe.get_next_states,
+        self.heuristic,
+        self.stats,
+        canonical_state=cafe.relative_state,
+        time_budget=self.time_budget,
+      )
+      self.bound = self.stats["bound"]
+
+    if path is None:
+      raise ValueError("No plan reaches the goal from the current state")
+
+    # Learning runs with relative-state keys, as the learned heuristic expects
+    t0 = self.state[0]
+    self.heuristic.learn(visited, t0 + (total_time - t0) / self.bound)
+
+    self.cost = total_time
+    self.plan = path
+    return self.plan
+
+  def advance(self, time):
+    """Executes the plan steps decided up to `time` and returns them."""
+
+    cafe = self.cafe
+    executed = []
+
+    while self.plan and self.plan[0][0] <= time:
+      step = self.plan.pop(0)
+      self.state = dict((s, n) for n, s in cafe.get_next_states(self.state))[step]
+      executed.append(step)
+
+    return executed
+
+  def add_events(self, time, orders=(), tables_to_clean=()):
+    """Applies events that arrived at `time` and returns the repaired plan."""
+
+    self.advance(time)
+    if not orders and not tables_to_clean:
+      return self.plan
+
+    self.state = self.cafe.add_events(self.state, time, orders, tables_to_clean)
+
+    return self.replan()
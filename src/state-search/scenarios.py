@@ -0,0 +1,170 @@
+import json
+import sys
+from pathlib import Path
+
+from cafe import TEMPLATE_CACHE_SIZE, Cafe
+from constants import BIG_TABLES, LOCATIONS_DISTANCE
+from deadlines import DeadlineCafe
+from layouts import read_layout
+from multi_robot import MultiCafe
+
+SCENARIO_FIELDS = (
+  "id",
+  "orders",
+  "dirty_tables",
+  "waiter_start",
+  "layout",
+  "durations",
+  "hot_time_limit",
+  "baristas",
+  "waiters",
+)
+
+
+def parse_layout(layout):
+  """Returns the (distances, big tables) of a scenario layout, defaults from `constants.py`."""
+
+  if layout is None:
+    return LOCATIONS_DISTANCE, BIG_TABLES
+
+  # A layout file shared by many scenarios
+  if isinstance(layout, str):
+    layout = read_layout(layout)
+
+  distances = LOCATIONS_DISTANCE
+  if "distances" in layout:
+    distances = {}
+    for location1, location2, distance in layout["distances"]:
+      distances[(location1, location2)] = distance
+
+  return distances, tuple(layout.get("big_tables", BIG_TABLES))
+
+
+def build_instance(
+  scenario,
+  partial_order_reduction=False,
+  macro_actions=False,
+  template_cache_size=TEMPLATE_CACHE_SIZE,
+):
+  """Returns the (cafe, encoded initial state) of a scenario.
+
+  A scenario is a dict with the orders as [table, "cold"|"hot"] pairs and optionally the dirty
+  tables, the waiter start location, a layout {"distances": [[location1, location2, distance],
+  ...], "big_tables": [...]} or the path of a layout file with the same content, and durations
+  overriding `constants.DURATIONS` by name. The layout distances are the edges of the café graph.
+  Both robots start idle and the waiter starts without the tray. A "hot_time_limit" in seconds
+  makes the instance a `DeadlineCafe`, where hot drinks must be delivered before they cool down.
+
+  With a number of "baristas" or "waiters", the instance is a `MultiCafe` and "waiter_start" is
+  either one location for every waiter or a list with one location per waiter. Partial-order
+  reduction, macro-actions and the `template_cache_size` of the action template caches only apply
+  to the single-robot café.
+  """
+
+  unknown = set(scenario) - set(SCENARIO_FIELDS)
+  if unknown:
+    raise ValueError(f"Unknown scenario fields: {', '.join(sorted(unknown))}")
+
+  orders = tuple((table, kind) for table, kind in scenario["orders"])
+  distances, big_tables = parse_layout(scenario.get("layout"))
+
+  if "baristas" in scenario or "waiters" in scenario:
+    if "hot_time_limit" in scenario:
+      raise ValueError("Hot drink deadlines only apply to the single-robot café")
+    if macro_actions:
+      raise ValueError("Macro-actions only apply to the single-robot café")
+    return build_multi_instance(scenario, orders, distances, big_tables)
+
+  options = {
+    "max_count": max(1, len(orders)),
+    "partial_order_reduction": partial_order_reduction,
+    "distances": distances,
+    "big_tables": big_tables,
+    "durations": scenario.get("durations"),
+    "macro_actions": macro_actions,
+    "template_cache_size": template_cache_size,
+  }
+
+  if "hot_time_limit" in scenario:
+    cafe = DeadlineCafe(hot_time_limit=scenario["hot_time_limit"], **options)
+  else:
+    cafe = Cafe(**options)
+
+  initial_state = (
+    0.0,
+    ("idle", None, 0.0),
+    ("idle", None, 0.0),
+    scenario.get("waiter_start", "bar"),
+    False,
+    (),
+    orders,
+    (),
+    tuple(scenario.get("dirty_tables", ())),
+  )
+
+  try:
+    return cafe, cafe.encode(initial_state)
+  except KeyError as error:
+    raise ValueError(f"Unknown location, drink or action in scenario: {error}") from error
+
+
+def build_multi_instance(scenario, orders, distances, big_tables):
+  """Returns the (multi-robot cafe, initial state) of a scenario with several robots."""
+
+  cafe = MultiCafe(
+    baristas=scenario.get("baristas", 1),
+    waiters=scenario.get("waiters", 1),
+    max_count=max(1, len(orders)),
+    distances=distances,
+    big_tables=big_tables,
+    durations=scenario.get("durations"),
+  )
+
+  waiter_start = scenario.get("waiter_start", "bar")
+  if isinstance(waiter_start, str):
+    waiter_start = (waiter_start,) * cafe.n_waiters
+
+  try:
+    return cafe, cafe.initial_state(
+      orders, tuple(scenario.get("dirty_tables", ())), tuple(waiter_start)
+    )
+  except KeyError as error:
+    raise ValueError(f"Unknown location, drink or action in scenario: {error}") from error
+
+
+def read_json_lines(lines, name):
+  """Yields the scenarios of a JSONL stream, ids default to `name:line`."""
+
+  for line_number, line in enumerate(lines, 1):
+    line = line.strip()
+    if not line:
+      continue
+
+    try:
+      scenario = json.loads(line)
+    except json.JSONDecodeError as error:
+      raise ValueError(f"{name}:{line_number}: {error}") from error
+
+    scenario.setdefault("id", f"{name}:{line_number}")
+    yield scenario
+
+
+def read_scenarios(source):
+  """Yields the scenarios of a directory of .json/.jsonl files, a .json/.jsonl file, or stdin
+  ("-"), lazily so large streams are not loaded at once."""
+
+  if source == "-":
+    yield from read_json_lines(sys.stdin, "stdin")
+    return
+
+  path = Path(source)
+  paths = sorted(path.glob("*.json*")) if path.is_dir() else [path]
+
+  for path in paths:
+    if path.suffix == ".jsonl":
+      with path.open() as file:
+        yield from read_json_lines(file, path.name)
+    elif path.suffix == ".json":
+      scenario = json.loads(path.read_text())
+      scenario.setdefault("id", path.stem)
+      yield scenario
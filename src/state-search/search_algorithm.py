@@ -1,160 +1,932 @@
 import heapq
+import itertools
+import time as clock
 from collections import deque
 
-from constants import (
-  TIME_TO_CLEAN_BIG,
-  TIME_TO_CLEAN_SMALL,
-  TIME_TO_DELIVER,
-  TIME_TO_MAKE_COLD,
-  TIME_TO_MAKE_HOT,
-)
-
 
 def canonical_state(state):
-  """Converts the state to a consistent, hashable format."""
-
-  time, b_status, w_status, location, tray, inventory, orders, prepared, tables_to_clean = state
-
-  return (
-    b_status,
-    w_status,
-    location,
-    tray,
-    tuple(sorted(inventory)),
-    tuple(sorted(orders)),
-    tuple(sorted(prepared)),
-    tuple(sorted(tables_to_clean)),
-  )
+  """Returns the hashable key of a packed state: everything but the global time, and whether each
+  robot's finish time is still ahead of it.
 
+  An idle robot woken up by `Cafe.add_events` keeps its wake-up time as finish time, so a state
+  waiting for it and the state reached once it passed only differ by those flags.
+
+  The key is already one packed integer, so the canonical state is a slice hashed in C, and an
+  incremental (Zobrist) hash would have nothing left to save.
+  """
+
+  time, _, b_finish_time, w_finish_time = state[:4]
+
+  return (*state[1:], b_finish_time > time, w_finish_time > time)
+
+
+class SearchTree:
+  """Arena of search nodes, each one stored as a parent index and the step that reached it."""
+
+  __slots__ = ("parents", "steps")
+
+  def __init__(self):
+    self.parents = [-1]
+    self.steps = [None]
+
+  def __len__(self):
+    return len(self.parents)
+
+  def add(self, parent, step):
+    """Stores a new node and returns its index."""
+
+    self.parents.append(parent)
+    self.steps.append(step)
+
+    return len(self.parents) - 1
+
+  def path(self, node):
+    """Rebuilds the list of steps from the root to the given node."""
+
+    path = []
+
+    while node > 0:
+      path.append(self.steps[node])
+      node = self.parents[node]
+
+    path.reverse()
+
+    return path
+
+
+def search_counters(
+  tree, frontier, visited, expanded, generated, stale=0, reopened=0, peak_frontier=0
+):
+  """Returns the counters of a search so far.
+
+  Every generated successor either became a new node, was a reopening (a cheaper path to an
+  expanded state, not followed) or a duplicate of a state already reached at least as fast.
+  """
+
+  return {
+    "expanded": expanded,
+    "generated": generated,
+    "duplicates": generated - (len(tree) - 1) - reopened,
+    "stale": stale,
+    "reopened": reopened,
+    "peak_frontier": max(peak_frontier, len(frontier)),
+    "visited": len(visited),
+  }
+
+
+# Counters that a resumed search continues from
+RESUMED_COUNTERS = ("expanded", "generated", "stale", "reopened", "peak_frontier")
+
+
+def record_stats(stats, **counters):
+  """Stores the search counters in the caller's `stats` dict, if one was given."""
+
+  if stats is not None:
+    stats.update(counters)
 
-# A* Search ----------------------------------------------------------------------------------------
-def A_star(initial_state, goal, get_next_states):
-  """Finds the fastest plan using A* search."""
 
-  # Priority queue: (f = g + h, g = elapsed_time, state, path)
-  frontier = [(heuristic(initial_state), 0.0, initial_state, [])]
+def resume_search(checkpoint, initial_state, tree, canonical_state, root_priority):
+  """Restores a search from its `SearchCheckpoint`, or logs the root of a new one.
+
+  Returns None for a new search (or without checkpoint), else (visited, closed, open nodes as
+  (priority, node, state), counters).
+  """
+
+  if checkpoint is None:
+    return None
+
+  restored = checkpoint.restore(initial_state, tree, canonical_state)
+  if restored is None:
+    checkpoint.add(-1, None, initial_state, root_priority)
+
+  return restored
+
+
+# A* Search ----------------------------------------------------------------------------------------
+def A_star(
+  initial_state,
+  goal,
+  get_next_states,
+  heuristic,
+  stats=None,
+  canonical_state=canonical_state,
+  weight=1.0,
+  progress=None,
+  progress_every=10_000,
+  checkpoint=None,
+):
+  """Finds the fastest plan using A* search.
+
+  Each canonical state is expanded at most once: outdated heap entries are skipped when popped, and
+  cheaper paths to an already expanded state are only counted as reopenings. Ties on f go to the
+  entry with the largest g, then to the oldest node. `canonical_state` gives the duplicate
+  detection key, e.g. `Cafe.relative_state` to merge states that only differ by a time shift.
+  A `weight` above 1 gives weighted A* (f = g + weight * h), whose plans cost at most `weight`
+  times the optimum. `progress`, if given, is called with the `search_counters` every
+  `progress_every` expansions. With a `SearchCheckpoint`, the search is logged to its file and
+  resumes from it when the file already holds a search from the same initial state.
+  """
+
+  # Priority queue: (f = g + weight * h, -g, node, state)
+  tree = SearchTree()
+  frontier = [(weight * heuristic(initial_state), -0.0, 0, initial_state)]
   visited = {canonical_state(initial_state): 0.0}
+  closed = set()
+  expanded = generated = stale = reopened = peak_frontier = 0
+
+  restored = resume_search(checkpoint, initial_state, tree, canonical_state, frontier[0][0])
+  if restored is not None:
+    visited, closed, entries, restored_counters = restored
+    frontier = [(f, -state[0], node, state) for f, node, state in entries]
+    heapq.heapify(frontier)
+    expanded, generated, stale, reopened, peak_frontier = (
+      restored_counters[name] for name in RESUMED_COUNTERS
+    )
+
+  def counters():
+    return search_counters(
+      tree, frontier, visited, expanded, generated, stale, reopened, peak_frontier
+    )
 
   while frontier:
-    f, g, state, path = heapq.heappop(frontier)
+    if len(frontier) > peak_frontier:
+      peak_frontier = len(frontier)
+
+    f, neg_g, node, state = heapq.heappop(frontier)
+    canon_state = canonical_state(state)
+
+    if canon_state in closed:
+      stale += 1
+      continue
+
+    closed.add(canon_state)
+    expanded += 1
+
+    if progress is not None and expanded % progress_every == 0:
+      progress(counters())
 
     if goal(state):
-      return g, visited, path
+      record_stats(stats, **counters())
+      return -neg_g, visited, tree.path(node)
 
-    for next_state, next_path in get_next_states(state):
+    next_states = get_next_states(state)
+    generated += len(next_states)
+
+    for next_state, step in next_states:
       canon_next_state = canonical_state(next_state)
       next_time = next_state[0]
 
       if canon_next_state not in visited or visited[canon_next_state] > next_time:
+        if canon_next_state in closed:
+          reopened += 1
+          continue
+
         visited[canon_next_state] = next_time
-        h = heuristic(next_state)
-        heapq.heappush(frontier, (next_time + h, next_time, next_state, path + [next_path]))
+        f = next_time + weight * heuristic(next_state)
+        next_node = tree.add(node, step)
+        heapq.heappush(frontier, (f, -next_time, next_node, next_state))
+
+        if checkpoint is not None:
+          checkpoint.add(node, step, next_state, f)
 
+    if checkpoint is not None:
+      checkpoint.expand(node, expanded, counters)
+
+  record_stats(stats, **counters())
   return float("inf"), None, None
 
 
-def heuristic(state):
-  """Estimates the remaining time to reach the goal from the current state."""
+# Batch A* Search ----------------------------------------------------------------------------------
+def batch_A_star(
+  initial_state,
+  goal,
+  expand_batch,
+  heuristic,
+  stats=None,
+  canonical_state=canonical_state,
+  batch_size=256,
+  progress=None,
+  progress_every=10_000,
+):
+  """Finds the fastest plan using A* search, expanding blocks of states at once.
+
+  Every frontier entry tied on the lowest (f, g), up to `batch_size` of them, is popped and
+  expanded with one call to `expand_batch(states)`, which returns the parallel lists (parent
+  positions, successors, steps, heuristic values) of the whole block, e.g. a `BatchExpander`;
+  `heuristic` only scores the initial state. With a consistent heuristic the states tied on the
+  lowest f already have their optimal g, so the plan stays optimal and each canonical state is
+  still expanded once, as in `A_star`.
+
+  A block may hold states `A_star` never expands: once the first state of a block generates a
+  deeper one on the same f-plateau, `A_star` dives towards the goal, while its siblings in the
+  block are expanded anyway. Ties on g keep this to one depth of the plateau at a time (blocks
+  tied on f alone grew it by up to `batch_size` states per depth), so the expanded states stay
+  within a small factor of `A_star`'s, and larger blocks trade more of them for less time per
+  expansion.
+  """
+
+  # Priority queue: (f = g + h, -g, node, state)
+  tree = SearchTree()
+  frontier = [(heuristic(initial_state), -0.0, 0, initial_state)]
+  visited = {canonical_state(initial_state): 0.0}
+  closed = set()
+  expanded = generated = stale = reopened = peak_frontier = 0
 
-  time, b_status, w_status, location, tray, inventory, orders, prepared, tables_to_clean = state
+  def counters():
+    return search_counters(
+      tree, frontier, visited, expanded, generated, stale, reopened, peak_frontier
+    )
 
-  h = 0.0
+  while frontier:
+    if len(frontier) > peak_frontier:
+      peak_frontier = len(frontier)
 
-  # 1. Estimate prep time for pending orders
-  for _, kind in orders:
-    h += 3 if kind == "cold" else 5
+    # 1. Pop the block of states tied on the lowest (f, g) -----------------------
+    f_min, neg_g_min = frontier[0][:2]
+    nodes = []
+    states = []
 
-  # 2. Each dirty table cleaning cost
-  for table in tables_to_clean:
-    h += 4 if table == "table3" else 2
+    while frontier and frontier[0][:2] == (f_min, neg_g_min) and len(states) < batch_size:
+      f, neg_g, node, state = heapq.heappop(frontier)
+      canon_state = canonical_state(state)
 
-  # 3. If drinks left to deliver or prepare, assume we must move at least once
-  if (orders or prepared or inventory) and location != "bar":
-    h += 1
+      if canon_state in closed:
+        stale += 1
+        continue
 
-  return h
+      closed.add(canon_state)
+      expanded += 1
 
+      if progress is not None and expanded % progress_every == 0:
+        progress(counters())
 
-def heuristic2(state):
-  """Estimates the remaining time to reach the goal from the current state."""
-  time, b_status, w_status, location, tray, inventory, orders, prepared, tables_to_clean = state
+      if goal(state):
+        record_stats(stats, **counters())
+        return -neg_g, visited, tree.path(node)
 
-  h = len(inventory) + len(orders) + len(prepared) + len(tables_to_clean)
+      nodes.append(node)
+      states.append(state)
 
-  if (orders or prepared or inventory) and location != "bar":
-    h += 1
+    if not states:
+      continue
 
-  return h
+    # 2. Expand the whole block and push its successors ---------------------------
+    parents, next_states, steps, h_values = expand_batch(states)
+    generated += len(next_states)
 
+    for parent, next_state, step, h in zip(parents, next_states, steps, h_values, strict=True):
+      canon_next_state = canonical_state(next_state)
+      next_time = next_state[0]
 
-def heuristic3(state):
-  """Estimates the remaining time to reach the goal from the current state."""
+      if canon_next_state not in visited or visited[canon_next_state] > next_time:
+        if canon_next_state in closed:
+          reopened += 1
+          continue
 
-  time, b_status, w_status, location, tray, inventory, orders, prepared, tables_to_clean = state
+        visited[canon_next_state] = next_time
+        next_node = tree.add(nodes[parent], step)
+        heapq.heappush(frontier, (next_time + h, -next_time, next_node, next_state))
+
+  record_stats(stats, **counters())
+  return float("inf"), None, None
 
-  h = 0.0
 
-  # Drinks to make
-  if orders:
-    h += len(orders) * min(TIME_TO_MAKE_COLD, TIME_TO_MAKE_HOT)
+# Greedy Best-First Search ------------------------------------------------------------------------
+def GBFS(
+  initial_state,
+  goal,
+  get_next_states,
+  heuristic,
+  stats=None,
+  canonical_state=canonical_state,
+  progress=None,
+  progress_every=10_000,
+):
+  """Finds a plan quickly by always expanding the state with the lowest heuristic value.
+
+  The plan is usually not the fastest one.
+  """
+
+  # Priority queue: (h, g = elapsed_time, node, state)
+  tree = SearchTree()
+  frontier = [(heuristic(initial_state), 0.0, 0, initial_state)]
+  visited = {canonical_state(initial_state)}
+  expanded = generated = peak_frontier = 0
 
-  # Drinks to deliver (either already prepared or in inventory)
-  total_drinks = len(prepared) + len(inventory)
-  if total_drinks > 0:
-    h += total_drinks * TIME_TO_DELIVER
+  def counters():
+    return search_counters(
+      tree, frontier, visited, expanded, generated, peak_frontier=peak_frontier
+    )
 
-  # Tables to clean
-  if tables_to_clean:
-    # optimistic: assume all small tables
-    h += len(tables_to_clean) * min(TIME_TO_CLEAN_BIG, TIME_TO_CLEAN_SMALL)
+  while frontier:
+    if len(frontier) > peak_frontier:
+      peak_frontier = len(frontier)
 
-  return h
+    h, g, node, state = heapq.heappop(frontier)
+    expanded += 1
 
+    if progress is not None and expanded % progress_every == 0:
+      progress(counters())
 
-# Uniform-Cost Search ------------------------------------------------------------------------------
-def UCS(initial_state, goal, get_next_states):
-  """Finds the fastest plan using Uniform-Cost Search (UCS)."""
+    if goal(state):
+      record_stats(stats, **counters())
+      return g, visited, tree.path(node)
 
-  frontier = [(0.0, initial_state, [])]
+    next_states = get_next_states(state)
+    generated += len(next_states)
+
+    for next_state, step in next_states:
+      canon_next_state = canonical_state(next_state)
+
+      if canon_next_state not in visited:
+        visited.add(canon_next_state)
+        next_node = tree.add(node, step)
+        heapq.heappush(frontier, (heuristic(next_state), next_state[0], next_node, next_state))
+
+  record_stats(stats, **counters())
+  return float("inf"), None, None
+
+
+# Uniform-Cost Search ------------------------------------------------------------------------------
+def UCS(
+  initial_state,
+  goal,
+  get_next_states,
+  stats=None,
+  canonical_state=canonical_state,
+  progress=None,
+  progress_every=10_000,
+  checkpoint=None,
+):
+  """Finds the fastest plan using Uniform-Cost Search (UCS).
+
+  Each canonical state is expanded at most once, outdated heap entries are skipped when popped.
+  With a `SearchCheckpoint`, the search is logged and resumed as in `A_star`.
+  """
+
+  # Priority queue: (g = elapsed_time, node, state)
+  tree = SearchTree()
+  frontier = [(0.0, 0, initial_state)]
   visited = {canonical_state(initial_state): 0.0}
+  closed = set()
+  expanded = generated = stale = reopened = peak_frontier = 0
+
+  restored = resume_search(checkpoint, initial_state, tree, canonical_state, 0.0)
+  if restored is not None:
+    visited, closed, entries, restored_counters = restored
+    frontier = [(g, node, state) for g, node, state in entries]
+    heapq.heapify(frontier)
+    expanded, generated, stale, reopened, peak_frontier = (
+      restored_counters[name] for name in RESUMED_COUNTERS
+    )
+
+  def counters():
+    return search_counters(
+      tree, frontier, visited, expanded, generated, stale, reopened, peak_frontier
+    )
 
   while frontier:
-    total_time, state, path = heapq.heappop(frontier)
+    if len(frontier) > peak_frontier:
+      peak_frontier = len(frontier)
+
+    total_time, node, state = heapq.heappop(frontier)
+    canon_state = canonical_state(state)
+
+    if canon_state in closed:
+      stale += 1
+      continue
+
+    closed.add(canon_state)
+    expanded += 1
+
+    if progress is not None and expanded % progress_every == 0:
+      progress(counters())
 
     if goal(state):
-      return total_time, visited, path
+      record_stats(stats, **counters())
+      return total_time, visited, tree.path(node)
 
-    for next_state, next_path in get_next_states(state):
+    next_states = get_next_states(state)
+    generated += len(next_states)
+
+    for next_state, step in next_states:
       canon_next_state = canonical_state(next_state)
       next_time = next_state[0]
 
       if canon_next_state not in visited or visited[canon_next_state] > next_time:
+        if canon_next_state in closed:
+          reopened += 1
+          continue
+
         visited[canon_next_state] = next_time
-        heapq.heappush(frontier, (next_time, next_state, path + [next_path]))
+        next_node = tree.add(node, step)
+        heapq.heappush(frontier, (next_time, next_node, next_state))
+
+        if checkpoint is not None:
+          checkpoint.add(node, step, next_state, next_time)
+
+    if checkpoint is not None:
+      checkpoint.expand(node, expanded, counters)
 
+  record_stats(stats, **counters())
   return float("inf"), None, None
 
 
 # Breadth-First Search -----------------------------------------------------------------------------
-def BFS(initial_state, goal, get_next_states):
+def BFS(
+  initial_state,
+  goal,
+  get_next_states,
+  stats=None,
+  canonical_state=canonical_state,
+  progress=None,
+  progress_every=10_000,
+):
   """Finds the fewest action steps using Breadth-First Search (BFS)."""
 
+  tree = SearchTree()
   frontier = deque()
-  frontier.append((initial_state, []))
+  frontier.append((0, initial_state))
 
   visited = {canonical_state(initial_state)}
+  expanded = generated = peak_frontier = 0
+
+  def counters():
+    return search_counters(
+      tree, frontier, visited, expanded, generated, peak_frontier=peak_frontier
+    )
 
   while frontier:
-    state, path = frontier.popleft()
+    if len(frontier) > peak_frontier:
+      peak_frontier = len(frontier)
+
+    node, state = frontier.popleft()
+    expanded += 1
+
+    if progress is not None and expanded % progress_every == 0:
+      progress(counters())
 
     if goal(state):
-      return state[0], visited, path
+      record_stats(stats, **counters())
+      return state[0], visited, tree.path(node)
 
-    for next_state, next_path in get_next_states(state):
+    next_states = get_next_states(state)
+    generated += len(next_states)
+
+    for next_state, step in next_states:
       canon_next_state = canonical_state(next_state)
 
       if canon_next_state not in visited:
         visited.add(canon_next_state)
-        frontier.append((next_state, path + [next_path]))
+        frontier.append((tree.add(node, step), next_state))
 
+  record_stats(stats, **counters())
   return float("inf"), None, None
+
+
+# Iterative-Deepening A* Search --------------------------------------------------------------------
+def IDA_star(
+  initial_state,
+  goal,
+  get_next_states,
+  heuristic,
+  stats=None,
+  canonical_state=canonical_state,
+  table_size=1_000_000,
+  progress=None,
+  progress_every=10_000,
+):
+  """Finds the fastest plan using IDA* with a bounded transposition table.
+
+  Depth-first iterations are bounded by f = g + h, the next bound being the smallest f that
+  exceeded the current one, so memory only grows with the plan depth. The transposition table
+  keeps up to `table_size` canonical states with the g they were entered with in the current
+  iteration, to prune transpositions reached again at no lower cost; when full, the states written
+  least recently are evicted, which only costs repeated work. States on the current path are
+  always pruned, so zero-duration cycles (e.g. taking and returning the tray) cannot loop.
+  """
+
+  table = {}
+  expanded = generated = duplicates = evictions = iterations = 0
+  threshold = heuristic(initial_state)
+
+  def counters():
+    return {
+      "expanded": expanded,
+      "generated": generated,
+      "duplicates": duplicates,
+      "evictions": evictions,
+      "iterations": iterations,
+      "visited": len(table),
+    }
+
+  def store(canon_state, g):
+    nonlocal evictions
+
+    table.pop(canon_state, None)
+    table[canon_state] = (iterations, g)
+
+    if len(table) > table_size:
+      del table[next(iter(table))]
+      evictions += 1
+
+  def is_transposition(canon_state, g):
+    entry = table.get(canon_state)
+    return entry is not None and entry[0] == iterations and entry[1] <= g
+
+  def expand(state):
+    """Returns the successors within the threshold, the best one last."""
+
+    nonlocal expanded, generated, duplicates, next_threshold
+
+    expanded += 1
+    if progress is not None and expanded % progress_every == 0:
+      progress(counters())
+
+    next_states = get_next_states(state)
+    generated += len(next_states)
+    children = []
+
+    for i, (next_state, step) in enumerate(next_states):
+      canon_next_state = canonical_state(next_state)
+      g = next_state[0]
+
+      if canon_next_state in on_path or is_transposition(canon_next_state, g):
+        duplicates += 1
+        continue
+
+      f = g + heuristic(next_state)
+      if f > threshold:
+        next_threshold = min(next_threshold, f)
+        continue
+
+      children.append((f, -g, i, canon_next_state, next_state, step))
+
+    children.sort(reverse=True)
+    return children
+
+  if goal(initial_state):
+    record_stats(stats, **counters())
+    return initial_state[0], table, []
+
+  while threshold < float("inf"):
+    iterations += 1
+    next_threshold = float("inf")
+
+    root = canonical_state(initial_state)
+    store(root, initial_state[0])
+    path = [(root, None)]
+    on_path = {root}
+    stack = [expand(initial_state)]
+
+    while stack:
+      children = stack[-1]
+
+      # Every successor explored, backtrack
+      if not children:
+        stack.pop()
+        on_path.discard(path.pop()[0])
+        continue
+
+      _, _, _, canon_state, state, step = children.pop()
+
+      # A sibling subtree may have reached this state since it was generated
+      if is_transposition(canon_state, state[0]):
+        duplicates += 1
+        continue
+
+      store(canon_state, state[0])
+
+      if goal(state):
+        record_stats(stats, **counters())
+        return state[0], table, [step for _, step in path[1:]] + [step]
+
+      path.append((canon_state, step))
+      on_path.add(canon_state)
+      stack.append(expand(state))
+
+    threshold = next_threshold
+
+  record_stats(stats, **counters())
+  return float("inf"), None, None
+
+
+# Simplified Memory-Bounded A* Search --------------------------------------------------------------
+class SMANode:
+  """Search node of SMA*, kept in memory until it is forgotten."""
+
+  __slots__ = (
+    "state",
+    "canon_state",
+    "parent",
+    "step",
+    "depth",
+    "f",
+    "children",
+    "forgotten",
+    "version",
+    "alive",
+  )
+
+  def __init__(self, state, canon_state, parent, step, f):
+    self.state = state
+    self.canon_state = canon_state
+    self.parent = parent
+    self.step = step
+    self.depth = parent.depth + 1 if parent else 0
+    self.f = f
+    self.children = 0  # Children currently in memory
+    self.forgotten = float("inf")  # Lowest f among the forgotten children
+    self.version = 0
+    self.alive = True
+
+
+def SMA_star(
+  initial_state,
+  goal,
+  get_next_states,
+  heuristic,
+  stats=None,
+  canonical_state=canonical_state,
+  max_nodes=1_000_000,
+  progress=None,
+  progress_every=10_000,
+):
+  """Finds the fastest plan using SMA* with at most `max_nodes` search nodes in memory.
+
+  It behaves as A* until memory is full, then forgets the worst leaves (highest f, shallowest
+  first) and backs their f up into the parent, which regenerates its successors once that value
+  becomes the lowest on the frontier again. f values are made monotone along paths (pathmax), so
+  with an admissible heuristic the plan is optimal as long as the memory can hold the optimal
+  path plus the siblings along it; otherwise the search may end without a plan.
+  """
+
+  # Frontier: (f, -depth, counter, node, version), leaves: (-f, depth, counter, node, version).
+  # `in_memory` maps canonical states to their best node, superseded nodes stay until forgotten.
+  frontier = []
+  leaves = []
+  in_memory = {}
+  counter = itertools.count()
+  expanded = generated = duplicates = forgotten = regenerated = 0
+  n_nodes = peak_nodes = 1
+
+  def counters():
+    return {
+      "expanded": expanded,
+      "generated": generated,
+      "duplicates": duplicates,
+      "forgotten": forgotten,
+      "regenerated": regenerated,
+      "peak_nodes": peak_nodes,
+      "visited": n_nodes,
+    }
+
+  def schedule(node):
+    """Queues the node again after its f, children or forgotten value changed."""
+
+    node.version += 1
+    if node.children == 0:
+      heapq.heappush(frontier, (node.f, -node.depth, next(counter), node, node.version))
+      heapq.heappush(leaves, (-node.f, node.depth, next(counter), node, node.version))
+    elif node.forgotten < float("inf"):
+      heapq.heappush(frontier, (node.forgotten, -node.depth, next(counter), node, node.version))
+
+  def remove(node):
+    """Drops a leaf, its parent keeps its f and is a leaf again once it has no children."""
+
+    nonlocal n_nodes
+
+    node.alive = False
+    n_nodes -= 1
+    if in_memory.get(node.canon_state) is node:
+      del in_memory[node.canon_state]
+
+    parent = node.parent
+    parent.children -= 1
+    parent.forgotten = min(parent.forgotten, node.f)
+
+    if parent.children == 0:
+      parent.f = max(parent.f, parent.forgotten)
+      parent.forgotten = float("inf")
+
+    schedule(parent)
+
+  def add_children(node):
+    """Generates the successors of a node that are not in memory with a lower or equal g."""
+
+    nonlocal expanded, generated, duplicates, n_nodes
+
+    expanded += 1
+    if progress is not None and expanded % progress_every == 0:
+      progress(counters())
+
+    next_states = get_next_states(node.state)
+    generated += len(next_states)
+
+    for next_state, step in next_states:
+      canon_next_state = canonical_state(next_state)
+      other = in_memory.get(canon_next_state)
+
+      if other is not None and other.state[0] <= next_state[0]:
+        duplicates += 1
+        continue
+
+      f = max(next_state[0] + heuristic(next_state), node.f)
+      child = SMANode(next_state, canon_next_state, node, step, f)
+      in_memory[canon_next_state] = child
+      node.children += 1
+      n_nodes += 1
+      schedule(child)
+
+  root = SMANode(initial_state, canonical_state(initial_state), None, None, 0.0)
+  root.f = heuristic(initial_state)
+  in_memory[root.canon_state] = root
+  schedule(root)
+
+  while frontier:
+    _, _, _, node, version = heapq.heappop(frontier)
+
+    if not node.alive or node.version != version:
+      continue
+
+    # 1. A leaf: goal test or expansion ---------------------------------------------
+    if node.children == 0:
+      if goal(node.state):
+        total_time = node.state[0]
+        path = []
+        while node.parent is not None:
+          path.append(node.step)
+          node = node.parent
+        path.reverse()
+        record_stats(stats, **counters())
+        return total_time, in_memory, path
+
+      add_children(node)
+
+    # 2. An inner node whose forgotten successors are the best option again ----------
+    else:
+      node.forgotten = float("inf")
+      regenerated += 1
+      add_children(node)
+
+    # Dead end, nothing new below it
+    if node.children == 0:
+      node.f = float("inf")
+      if node.parent is None:
+        break
+      remove(node)
+    else:
+      schedule(node)
+
+    peak_nodes = max(peak_nodes, n_nodes)
+
+    # 3. Forget the worst leaves while over the memory cap ---------------------------
+    while n_nodes > max_nodes and leaves:
+      _, _, _, leaf, version = heapq.heappop(leaves)
+      if leaf.alive and leaf.version == version and leaf.children == 0 and leaf.parent:
+        remove(leaf)
+        forgotten += 1
+
+  record_stats(stats, **counters())
+  return float("inf"), None, None
+
+
+# Anytime Repairing A* Search ----------------------------------------------------------------------
+def ARA_star(
+  initial_state,
+  goal,
+  get_next_states,
+  heuristic,
+  stats=None,
+  canonical_state=canonical_state,
+  weights=(3.0, 2.0, 1.5, 1.25, 1.0),
+  time_budget=None,
+  report=None,
+):
+  """Finds a plan fast with an inflated heuristic, then improves it until the deadline (ARA*).
+
+  Each weight of `weights` runs a weighted A* pass that only expands states with
+  f = g + weight * h below the cost of the best plan so far. States improved after their expansion
+  are kept aside and reinserted for the next pass instead of being reopened, so every pass reuses
+  the g values of the previous ones. After each pass the suboptimality bound is the best cost over
+  the smallest g + h left on the frontier, both counted from the start time (capped by the
+  weight), and `report`, if given, is called with (total time, bound, path). The search stops when
+  the bound reaches 1, the last weight is done, or `time_budget` seconds have passed; it returns
+  the best plan found so far.
+  `stats` also receives a "solutions" list with the elapsed time, weight, cost and bound of each
+  pass.
+  """
+
+  time_start = clock.perf_counter()
+  deadline = time_start + time_budget if time_budget is not None else float("inf")
+
+  tree = SearchTree()
+  h0 = heuristic(initial_state)
+  t0 = initial_state[0]  # Costs are absolute end times, the bound compares durations from here
+  # Best known node, state and heuristic value of each canonical state
+  visited = {canonical_state(initial_state): (0, initial_state, h0)}
+  frontier = [(weights[0] * h0, -0.0, 0, initial_state)]
+  closed = set()
+  inconsistent = {}
+  best = (float("inf"), None)  # (total time, node)
+  solutions = []
+  bound = float("inf")
+  expanded = generated = stale = 0
+
+  def counters():
+    return {
+      "expanded": expanded,
+      "generated": generated,
+      "stale": stale,
+      "visited": len(visited),
+      "bound": bound,
+      "solutions": solutions,
+    }
+
+  def finish():
+    record_stats(stats, **counters())
+    if best[1] is None:
+      return float("inf"), None, None
+    g_values = {canon_state: entry[1][0] for canon_state, entry in visited.items()}
+    return best[0], g_values, tree.path(best[1])
+
+  i = 0
+  while True:
+    weight = weights[i]
+
+    # 1. Improve the plan with the current weight ----------------------------------------------
+    while frontier and frontier[0][0] < best[0]:
+      if expanded % 256 == 0 and clock.perf_counter() > deadline:
+        return finish()
+
+      _, neg_g, node, state = heapq.heappop(frontier)
+      canon_state = canonical_state(state)
+
+      if canon_state in closed or visited[canon_state][0] != node:
+        stale += 1
+        continue
+
+      closed.add(canon_state)
+      expanded += 1
+
+      if goal(state):
+        if -neg_g < best[0]:
+          best = (-neg_g, node)
+        continue
+
+      next_states = get_next_states(state)
+      generated += len(next_states)
+
+      for next_state, step in next_states:
+        canon_next_state = canonical_state(next_state)
+        next_time = next_state[0]
+        entry = visited.get(canon_next_state)
+
+        if entry is None or entry[1][0] > next_time:
+          h = heuristic(next_state) if entry is None else entry[2]
+          next_node = tree.add(node, step)
+          visited[canon_next_state] = (next_node, next_state, h)
+
+          if canon_next_state in closed:
+            inconsistent[canon_next_state] = next_state
+          else:
+            heapq.heappush(frontier, (next_time + weight * h, -next_time, next_node, next_state))
+
+    # 2. Suboptimality bound: the plan against the lowest g + h still open ----------------------
+    open_states = {canonical_state(entry[3]) for entry in frontier} - closed
+    open_states |= set(inconsistent)
+    lower_bound = min(
+      (state[0] + h for _, state, h in map(visited.get, open_states) if state[0] + h < best[0]),
+      default=best[0],
+    )
+    if best[1] is not None:
+      bound = min(weight, (best[0] - t0) / (lower_bound - t0)) if lower_bound > t0 else 1.0
+      solutions.append(
+        {
+          "elapsed": clock.perf_counter() - time_start,
+          "weight": weight,
+          "cost": best[0],
+          "bound": bound,
+        }
+      )
+      if report is not None:
+        report(best[0], bound, tree.path(best[1]))
+
+    if bound <= 1.0 or not open_states or i == len(weights) - 1:
+      break
+
+    # 3. Next pass: reinsert the inconsistent states and re-key the frontier --------------------
+    # Weights that cannot tighten the current bound are skipped
+    i += 1
+    while i < len(weights) - 1 and weights[i] >= bound:
+      i += 1
+    next_weight = weights[i]
+    frontier = [
+      (state[0] + next_weight * h, -state[0], node, state)
+      for node, state, h in (visited[canon_state] for canon_state in open_states)
+    ]
+    heapq.heapify(frontier)
+    inconsistent = {}
+    closed = set()
+
+  return finish()
@@ -0,0 +1,332 @@
+import argparse
+import json
+import math
+import sys
+from collections import namedtuple
+
+from cafe import (
+  CLEANING,
+  DELIVERING,
+  MOVING,
+  PICKING_UP,
+  RETURN_TRAY,
+  TAKE_TRAY,
+  TRAY_CAPACITY,
+  W_OPERATION_NAMES,
+  Cafe,
+)
+from deadlines import DeadlineCafe
+from layouts import read_layout
+from scenarios import build_instance, read_scenarios
+
+try:
+  import numpy as np
+except ImportError:  # Only the Monte-Carlo analysis needs NumPy
+  np = None
+
+# Task of an executed plan: robot ("barista"|"waiter"), action code, start time, duration, and the
+# index of the task that must finish first (the making of a picked up drink), -1 if none
+Task = namedtuple("Task", ["robot", "code", "start", "duration", "after"])
+
+# Finish times may differ from start + duration by the rounding of the search
+TOLERANCE = 1e-9
+
+
+# Plan replay --------------------------------------------------------------------------------------
+def parse_step(cafe, step):
+  """Returns the packed step of a readable `Cafe.describe_step` step, as found in batch results."""
+
+  time, (b_action, b_data, b_finish_time), (w_action, w_data, w_finish_time) = step
+
+  b_code = cafe.b_actions.index((b_action, tuple(b_data) if b_data else None))
+
+  operation = W_OPERATION_NAMES.index(w_action)
+  if operation in (MOVING, CLEANING):
+    w_data = cafe.location_index[w_data]
+  elif operation in (PICKING_UP, DELIVERING):
+    w_data = cafe.drink_index[tuple(w_data)]
+  w_code = cafe.w_codes[(operation, w_data)]
+
+  return (time, (b_code, b_finish_time), (w_code, w_finish_time))
+
+
+def simulate(cafe, initial_state, plan):
+  """Replays a plan of packed steps and returns its executed tasks and makespan.
+
+  Each robot keeps its task until it finishes, the effects of a task apply at its finish time, and
+  every new task must meet the preconditions of `Cafe.get_barista_actions` and
+  `Cafe.get_waiter_actions` (location, tray, inventory and tray capacity, prepared drinks, dirty
+  tables) and last the durations of the café. For a `DeadlineCafe`, hot drinks must also start being
+  delivered before they cool down. The plan must end with every drink delivered, every table clean
+  and the tray returned. Raises ValueError at the first step that breaks a rule.
+  """
+
+  time, key, b_finish_time, w_finish_time = initial_state[:4]
+  hot_time_limit = cafe.hot_time_limit if isinstance(cafe, DeadlineCafe) else None
+
+  orders = cafe.counts(key, cafe.orders_shifts)
+  prepared = cafe.counts(key, cafe.prepared_shifts)
+  inventory = cafe.counts(key, cafe.inventory_shifts)
+  location = (key >> cafe.location_shift) & cafe.location_mask
+  tray = bool(key & cafe.tray_bit)
+  dirty = {i for i, bit in enumerate(cafe.clean_bits) if key & bit}
+
+  tasks = []
+  made = [[] for _ in cafe.drinks]  # Making tasks of each drink, in order
+  picked = [0] * len(cafe.drinks)  # Drinks of each kind picked up so far
+  # Drinks already prepared in the initial state, picked up first and made by no task of the plan
+  preset = list(prepared)
+
+  # Times the drinks at the bar and in hand were made, the oldest one is picked up and delivered
+  ready = [[time] * count for count in prepared]
+  carried = [[time] * count for count in inventory]
+
+  # Current task of each robot: [code, finish time, applied], running tasks of the initial state
+  # are kept as they are
+  b_task = [key & cafe.b_mask, b_finish_time, False]
+  w_task = [(key >> cafe.w_shift) & cafe.w_mask, w_finish_time, False]
+  for robot, task in (("barista", b_task), ("waiter", w_task)):
+    if task[0]:
+      tasks.append(Task(robot, task[0], time, task[1] - time, -1))
+      if robot == "barista":
+        made[task[0] - 1].append(len(tasks) - 1)
+      elif cafe.w_actions[task[0]][0] == PICKING_UP:
+        picked[cafe.w_actions[task[0]][1]] += 1
+
+  def fail(i, message):
+    raise ValueError(f"Step {i} at {time}: {message}")
+
+  def finish_tasks(until):
+    nonlocal location, tray
+
+    # Barista finishes making a drink
+    code, finish_time, applied = b_task
+    if code and not applied and finish_time <= until:
+      orders[code - 1] -= 1
+      prepared[code - 1] += 1
+      ready[code - 1].append(finish_time)
+      b_task[2] = True
+
+    code, finish_time, applied = w_task
+    if not code or applied or finish_time > until:
+      return
+    w_task[2] = True
+
+    operation, argument = cafe.w_actions[code]
+    if operation == MOVING:
+      location = argument
+    elif operation == TAKE_TRAY:
+      tray = True
+    elif operation == RETURN_TRAY:
+      tray = False
+    elif operation == PICKING_UP:
+      prepared[argument] -= 1
+      inventory[argument] += 1
+      carried[argument].append(ready[argument].pop(0))
+    elif operation == DELIVERING:
+      inventory[argument] -= 1
+    elif operation == CLEANING:
+      dirty.discard(argument)
+
+  for i, (step_time, (b_code, b_finish), (w_code, w_finish)) in enumerate(plan):
+    if step_time < time:
+      fail(i, f"the plan goes back to {step_time}")
+    time = step_time
+
+    # 1. Apply the effects of the tasks that finished by now ---------------------
+    finish_tasks(time)
+
+    # 2. A busy robot keeps its task ---------------------------------------------
+    if b_task[1] > time and (b_code, b_finish) != tuple(b_task[:2]):
+      fail(i, "the barista changes task before finishing the current one")
+    if w_task[1] > time and (w_code, w_finish) != tuple(w_task[:2]):
+      fail(i, "the waiter changes task before finishing the current one")
+
+    # 3. The barista starts a new task -------------------------------------------
+    if b_task[1] <= time:
+      duration = cafe.make_cost[b_code - 1] if b_code else 0.0
+      if b_code and not orders[b_code - 1]:
+        fail(i, f"no order left for {cafe.drinks[b_code - 1]}")
+      if abs(b_finish - time - duration) > TOLERANCE:
+        fail(i, f"the barista finishes at {b_finish} instead of {time + duration}")
+
+      b_task[:] = [b_code, b_finish, False]
+      if b_code:
+        tasks.append(Task("barista", b_code, time, duration, -1))
+        made[b_code - 1].append(len(tasks) - 1)
+
+    # 4. The waiter starts a new task --------------------------------------------
+    if w_task[1] <= time:
+      operation, argument = cafe.w_actions[w_code]
+      inventory_size = sum(inventory)
+      duration = waiter_duration(cafe, w_code, location, tray)
+      after = -1
+
+      if operation in (TAKE_TRAY, RETURN_TRAY):
+        if location != 0 or inventory_size:
+          fail(i, "the tray is taken or returned away from the bar or with drinks in hand")
+        if tray == (operation == TAKE_TRAY):
+          fail(i, "the waiter already has the tray" if tray else "the waiter has no tray")
+      elif operation == PICKING_UP:
+        if location != 0 or not prepared[argument]:
+          fail(i, f"no {cafe.drinks[argument]} prepared at the waiter's location")
+        if inventory_size >= (TRAY_CAPACITY if tray else 1):
+          fail(i, "the waiter cannot carry another drink")
+        if picked[argument] >= preset[argument]:
+          after = made[argument][picked[argument] - preset[argument]]
+        picked[argument] += 1
+      elif operation == DELIVERING:
+        if not inventory[argument] or cafe.drink_location[argument] != location:
+          fail(i, f"the waiter cannot deliver {cafe.drinks[argument]} here")
+        ready_time = carried[argument].pop(0)
+        hot = hot_time_limit is not None and cafe.hot_drinks[argument]
+        if hot and time >= ready_time + hot_time_limit:
+          fail(i, f"{cafe.drinks[argument]} made at {ready_time} is no longer hot")
+      elif operation == CLEANING:
+        if argument != location or argument not in dirty:
+          fail(i, f"{cafe.locations[argument]} is not a dirty table at the waiter's location")
+        if tray or inventory_size:
+          fail(i, "the waiter cleans with the tray or drinks in hand")
+      elif operation == MOVING and argument == location:
+        fail(i, "the waiter moves to its own location")
+
+      if abs(w_finish - time - duration) > TOLERANCE:
+        fail(i, f"the waiter finishes at {w_finish} instead of {time + duration}")
+
+      w_task[:] = [w_code, w_finish, False]
+      if w_code:
+        tasks.append(Task("waiter", w_code, time, duration, after))
+
+  # 5. The plan must reach the goal ------------------------------------------------
+  time = max(time, b_task[1], w_task[1])
+  finish_tasks(time)
+
+  if any(orders) or any(prepared) or any(inventory) or dirty or tray:
+    raise ValueError(f"The plan ends at {time} without serving every order and cleaning up")
+
+  return tasks, time
+
+
+def waiter_duration(cafe, code, location, tray):
+  """Returns the duration of a waiter action started at a location."""
+
+  operation, argument = cafe.w_actions[code]
+
+  if operation == TAKE_TRAY:
+    return cafe.time_to_take_tray
+  if operation == RETURN_TRAY:
+    return cafe.time_to_return_tray
+  if operation == MOVING:
+    return cafe.travel_time[1 if tray else 0][location][argument]
+  if operation == PICKING_UP:
+    return cafe.time_to_pickup
+  if operation == DELIVERING:
+    return cafe.time_to_deliver
+  if operation == CLEANING:
+    return cafe.clean_cost[argument]
+
+  return 0.0
+
+
+# Monte-Carlo analysis -----------------------------------------------------------------------------
+def sample_makespans(tasks, start_time=0.0, samples=10_000, spread=0.1, seed=None):
+  """Returns the makespans of a plan's tasks under `samples` sampled durations at once.
+
+  Every duration is multiplied by a lognormal factor of mean 1 and relative standard deviation
+  `spread`. Each robot keeps the order of its tasks and starts them as soon as it is free, a pickup
+  also waits for the making of its drink. The loop runs over the tasks, every sample is computed
+  by the same array operations.
+  """
+
+  if np is None:
+    raise ImportError("The Monte-Carlo analysis needs NumPy")
+
+  rng = np.random.default_rng(seed)
+  sigma = math.sqrt(math.log1p(spread * spread))
+  nominal = np.array([task.duration for task in tasks])
+  durations = nominal * rng.lognormal(-sigma * sigma / 2, sigma, (samples, len(tasks)))
+
+  finish = np.empty((samples, len(tasks)))
+  free = {}
+
+  for i, task in enumerate(tasks):
+    start = free.get(task.robot, np.full(samples, start_time))
+    if task.after >= 0:
+      start = np.maximum(start, finish[:, task.after])
+    finish[:, i] = start + durations[:, i]
+    free[task.robot] = finish[:, i]
+
+  if not tasks:
+    return np.full(samples, start_time)
+
+  return finish.max(axis=1)
+
+
+def robustness(makespans, planned):
+  """Summarizes sampled makespans against the planned one."""
+
+  return {
+    "planned": planned,
+    "mean": float(makespans.mean()),
+    "std": float(makespans.std()),
+    "p50": float(np.percentile(makespans, 50)),
+    "p95": float(np.percentile(makespans, 95)),
+    "max": float(makespans.max()),
+    "late": float((makespans > planned + TOLERANCE).mean()),
+  }
+
+
+def evaluate(scenario, plan, samples=10_000, spread=0.1, seed=None):
+  """Validates the readable plan of a scenario and returns its robustness record."""
+
+  cafe, initial_state = build_instance(scenario)
+  if not isinstance(cafe, Cafe):
+    raise ValueError("Only single-robot plans can be simulated")
+
+  steps = [parse_step(cafe, step) for step in plan]
+  tasks, makespan = simulate(cafe, initial_state, steps)
+  makespans = sample_makespans(tasks, initial_state[0], samples, spread, seed)
+
+  return robustness(makespans, makespan)
+
+
+def main():
+  parser = argparse.ArgumentParser(
+    description="Validates the plans of batch results and scores their robustness to durations."
+  )
+  parser.add_argument("scenarios", help="scenarios given to batch.py (directory, file or -)")
+  parser.add_argument("results", help="JSONL results written by batch.py")
+  parser.add_argument("--samples", type=int, default=10_000, help="sampled durations per plan")
+  parser.add_argument("--spread", type=float, default=0.1, help="relative std of the durations")
+  parser.add_argument("--seed", type=int, default=0)
+  parser.add_argument("--layout", help="JSON layout file given to batch.py, if any")
+  args = parser.parse_args()
+
+  defaults = {"layout": read_layout(args.layout)} if args.layout else {}
+  scenarios = {
+    scenario.get("id"): {**defaults, **scenario} for scenario in read_scenarios(args.scenarios)
+  }
+
+  with open(args.results) as file:
+    for line in file:
+      if not line.strip():
+        continue
+
+      result = json.loads(line)
+      if result.get("status") != "solved":
+        continue
+
+      record = {"id": result["id"], "valid": True}
+      try:
+        record.update(
+          evaluate(scenarios[result["id"]], result["plan"], args.samples, args.spread, args.seed)
+        )
+      except (KeyError, ValueError) as error:
+        record.update(valid=False, error=f"{type(error).__name__}: {error}")
+
+      print(json.dumps(record))
+      sys.stdout.flush()
+
+
+if __name__ == "__main__":
+  main()